@@ -1,17 +1,44 @@
 from django.contrib import admin
-from .models import Parking, SearchHistory
+from .models import Parking, ParkingSpace, SearchHistory
 
 
 @admin.register(Parking)
 class ParkingAdmin(admin.ModelAdmin):
-    list_display = ('name', 'latitude', 'longitude', 'price_per_hour', 'is_available', 'capacity')
+    list_display = ('name', 'latitude', 'longitude', 'price_per_hour', 'is_available', 'capacity', 'occupied_spaces')
     list_filter = ('is_available',)
     search_fields = ('name',)
     list_editable = ('is_available',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if not change or {'latitude', 'longitude'} & set(form.changed_data):
+            self._notify_location_changed(obj.id, obj.latitude, obj.longitude)
+
+    def delete_model(self, request, obj):
+        parking_id = obj.id
+        super().delete_model(request, obj)
+        self._notify_location_changed(parking_id)
+
+    @staticmethod
+    def _notify_location_changed(parking_id, latitude=None, longitude=None):
+        # PATRÓN MEDIATOR: recarga el snapshot; las celdas de la tabla de tiempos se actualizan en segundo plano
+        from api.views import mediator
+        mediator.notify('admin', 'parking_location_changed', {
+            'parking_id': parking_id,
+            'latitude': latitude,
+            'longitude': longitude
+        })
+
 
 @admin.register(SearchHistory)
 class SearchHistoryAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'search_latitude', 'search_longitude', 'result_parking', 'timestamp')
     list_filter = ('timestamp',)
     date_hierarchy = 'timestamp'
+
+
+@admin.register(ParkingSpace)
+class ParkingSpaceAdmin(admin.ModelAdmin):
+    list_display = ('parking', 'label', 'held_until', 'version')
+    list_filter = ('parking',)
+    readonly_fields = ('held_by', 'held_until', 'version')
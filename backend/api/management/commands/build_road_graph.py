@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.services.road_network import RoadNetwork
+
+
+class Command(BaseCommand):
+    help = 'Convierte un extracto OSM XML (.osm) en el grafo vial compacto (.npz) usado para rutas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Extracto OpenStreetMap en formato XML (.osm)')
+        parser.add_argument('output', help='Archivo .npz de salida (ver ROAD_GRAPH_PATH en settings)')
+
+    def handle(self, *args, **options):
+        network = RoadNetwork.from_osm(options['source'])
+        network.save(options['output'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Grafo vial guardado en {options['output']}: "
+            f"{len(network)} nodos, {network.edge_count} aristas"
+        ))
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Parking
+from api.services.road_network import RoadNetwork
+from api.services.travel_time_grid import TravelTimeGrid
+
+
+class Command(BaseCommand):
+    help = (
+        'Precalcula, para cada celda de la ciudad, los K parqueaderos más cercanos '
+        'por tiempo de viaje sobre el grafo vial (ROAD_GRAPH_PATH)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Directorio de la tabla (ver TRAVEL_TIME_GRID_PATH en settings)')
+        parser.add_argument('--road-graph', default=getattr(settings, 'ROAD_GRAPH_PATH', None),
+                            help='Grafo vial .npz (por defecto ROAD_GRAPH_PATH)')
+        parser.add_argument('--cell-size', type=float, default=0.005, help='Tamaño de celda en grados (~550 m)')
+        parser.add_argument('--k', type=int, default=8, help='Parqueaderos guardados por celda')
+        parser.add_argument('--parking', type=int,
+                            help='Solo actualiza las celdas afectadas por este parqueadero')
+
+    def handle(self, *args, **options):
+        if not options['road_graph']:
+            raise CommandError('Se requiere un grafo vial: --road-graph o ROAD_GRAPH_PATH')
+        network = RoadNetwork.load(options['road_graph'])
+        parkings = list(Parking.objects.values_list('id', 'latitude', 'longitude'))
+
+        if options['parking'] is not None:
+            grid = TravelTimeGrid.load(options['output'], writable=True)
+            location = next((p for p in parkings if p[0] == options['parking']), None)
+            lat, lng = location[1:] if location else (None, None)
+            rebuilt = grid.update_parking(network, parkings, options['parking'], lat, lng)
+            self.stdout.write(self.style.SUCCESS(f"{rebuilt} celdas actualizadas"))
+            return
+
+        grid = TravelTimeGrid.create(
+            options['output'],
+            float(network.latitude.min()), float(network.longitude.min()),
+            float(network.latitude.max()), float(network.longitude.max()),
+            cell_size_deg=options['cell_size'], k=options['k']
+        )
+        grid.rebuild_cells(
+            network, parkings,
+            progress=lambda done, total: self.stdout.write(f"{done}/{total} celdas", ending='\r')
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"\nTabla de tiempos guardada en {options['output']}: {grid.rows}x{grid.cols} celdas, K={grid.k}"
+        ))
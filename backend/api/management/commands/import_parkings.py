@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.parking_import import import_parkings, open_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa el inventario de parqueaderos desde CSV, JSON, JSON Lines o GeoJSON '
+        'en streaming y por lotes (upsert por external_id)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo a importar')
+        parser.add_argument('--format', choices=['csv', 'json', 'jsonl', 'geojson'],
+                            help='Formato (por defecto se deduce de la extensión)')
+        parser.add_argument('--batch-size', type=int, default=2_000, help='Registros por transacción')
+        parser.add_argument('--max-errors', type=int,
+                            help='Detiene la importación si hay más registros inválidos')
+        parser.add_argument('--dry-run', action='store_true', help='Solo valida, no guarda')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+
+        def progress(result):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{result['read']} leídos, {result['imported']} guardados, {result['invalid']} inválidos "
+                f"({result['read'] / elapsed:,.0f} registros/s)",
+                ending='\r'
+            )
+            self.stdout.flush()
+
+        try:
+            source, records = open_records(options['path'], options['format'])
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        try:
+            with source:
+                result = import_parkings(
+                    records,
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                    max_errors=options['max_errors'],
+                    progress=progress
+                )
+        except ValueError as error:
+            raise CommandError(f"\n{error}")
+
+        self.stdout.write('')
+        for number, message in result['errors']:
+            self.stderr.write(f"Registro {number}: {message}")
+        if result['invalid'] > len(result['errors']):
+            self.stderr.write(f"... y {result['invalid'] - len(result['errors'])} registros inválidos más")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Validación: {result['imported']} válidos, {result['invalid']} inválidos"
+            ))
+            return
+
+        # PATRÓN MEDIATOR: snapshot, índice espacial y cachés se reconstruyen una sola vez
+        from api.views import mediator
+        mediator.notify('import', 'parking_inventory_imported', {
+            'imported': result['imported'],
+            'invalid': result['invalid'],
+        })
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['imported']} parqueaderos importados en {result['batches']} lotes, "
+            f"{result['invalid']} inválidos ({time.perf_counter() - started:.1f} s)"
+        ))
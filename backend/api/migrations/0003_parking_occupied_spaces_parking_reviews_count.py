@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_parking_availability_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parking',
+            name='occupied_spaces',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='parking',
+            name='reviews_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_parking_occupied_spaces_parking_reviews_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParkingSpace',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('label', models.CharField(max_length=10)),
+                ('held_by', models.CharField(blank=True, max_length=64, null=True)),
+                ('held_until', models.DateTimeField(blank=True, null=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('parking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spaces', to='api.parking')),
+            ],
+            options={
+                'verbose_name': 'Cupo',
+                'verbose_name_plural': 'Cupos',
+                'constraints': [models.UniqueConstraint(fields=('parking', 'number'), name='unique_parking_space_number')],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Índice R*Tree de SQLite con las coordenadas de Parking y los triggers que lo
+# mantienen sincronizado con api_parking. Si SQLite se compiló sin el módulo rtree o
+# SQLITE_RTREE es False, no se crea. La migración 0009 lo elimina
+CREATE_RTREE = [
+    "CREATE VIRTUAL TABLE api_parking_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    "INSERT INTO api_parking_rtree SELECT id, latitude, latitude, longitude, longitude FROM api_parking",
+    """CREATE TRIGGER IF NOT EXISTS api_parking_rtree_insert AFTER INSERT ON api_parking BEGIN
+        INSERT INTO api_parking_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS api_parking_rtree_update AFTER UPDATE OF latitude, longitude ON api_parking BEGIN
+        UPDATE api_parking_rtree SET min_lat = new.latitude, max_lat = new.latitude,
+            min_lng = new.longitude, max_lng = new.longitude WHERE id = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS api_parking_rtree_delete AFTER DELETE ON api_parking BEGIN
+        DELETE FROM api_parking_rtree WHERE id = old.id;
+    END""",
+]
+
+
+def create_parking_rtree(apps, schema_editor):
+    from django.db import OperationalError
+
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite' or not getattr(settings, 'SQLITE_RTREE', True):
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(CREATE_RTREE[0])
+        except OperationalError:
+            # SQLite sin el módulo rtree
+            return
+        for statement in CREATE_RTREE[1:]:
+            cursor.execute(statement)
+
+
+def drop_parking_rtree(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for suffix in ('insert', 'update', 'delete'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS api_parking_rtree_{suffix}")
+        cursor.execute("DROP TABLE IF EXISTS api_parking_rtree")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_parkingspace'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='parking',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['price_per_hour'], name='parking_available_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parking',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['latitude', 'longitude'], name='parking_available_geo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchhistory',
+            index=models.Index(fields=['user', '-timestamp'], name='history_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchhistory',
+            index=models.Index(fields=['-timestamp'], name='history_recent_idx'),
+        ),
+        migrations.RunPython(create_parking_rtree, drop_parking_rtree),
+    ]
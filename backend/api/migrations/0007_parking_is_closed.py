@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_parking_external_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parking',
+            name='is_closed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_parking_is_closed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parkingspace',
+            name='is_occupied',
+            field=models.BooleanField(default=False),
+        ),
+    ]
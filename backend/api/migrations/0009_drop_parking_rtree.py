@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 20:10
+
+from django.db import migrations
+
+# Las búsquedas por rectángulo leen el snapshot en memoria y nadie consultaba el
+# R*Tree de 0005; se eliminan la tabla y los triggers que quedaran (solo SQLite)
+
+
+def drop_parking_rtree(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for suffix in ('insert', 'update', 'delete'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS api_parking_rtree_{suffix}")
+        cursor.execute("DROP TABLE IF EXISTS api_parking_rtree")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_parkingspace_is_occupied'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_parking_rtree, migrations.RunPython.noop),
+    ]
@@ -2,13 +2,22 @@ from django.db import models
 from django.contrib.auth.models import User
 
 class Parking(models.Model):
+    # Identificador en el inventario de origen; clave del upsert de import_parkings
+    external_id = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=200)
     latitude = models.FloatField()
     longitude = models.FloatField()
     price_per_hour = models.DecimalField(max_digits=10, decimal_places=2)
     is_available = models.BooleanField(default=True)
+    # Cierre manual del operador (PATCH de disponibilidad); los contadores de cupos no lo reabren
+    is_closed = models.BooleanField(default=False)
     capacity = models.IntegerField()
+    # Cupos ocupados; el contador vivo está en memoria (OccupancyCounters) y se escribe por lotes
+    occupied_spaces = models.PositiveIntegerField(default=0)
+    reviews_count = models.PositiveIntegerField(default=0)
     features = models.JSONField(default=list)  # ['Techado', 'Vigilancia', etc.]
+    # Momento (del sensor o de la petición) del último cambio de disponibilidad aplicado
+    availability_updated_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -18,6 +27,44 @@ class Parking(models.Model):
     class Meta:
         verbose_name = "Parqueadero"
         verbose_name_plural = "Parqueaderos"
+        indexes = [
+            # Índices parciales: las búsquedas (get_all_parkings) solo miran los disponibles
+            models.Index(
+                fields=['price_per_hour'], name='parking_available_price_idx',
+                condition=models.Q(is_available=True)
+            ),
+            # Búsquedas por rectángulo (bounding box)
+            models.Index(
+                fields=['latitude', 'longitude'], name='parking_available_geo_idx',
+                condition=models.Q(is_available=True)
+            ),
+        ]
+
+
+class ParkingSpace(models.Model):
+    """
+    Cupo individual de un parqueadero. Una reserva lo retiene hasta held_until y al
+    confirmar la llegada queda ocupado (is_occupied, con el token en held_by) hasta la
+    salida. Cada cambio es un UPDATE condicionado al estado del cupo (libre, retenido
+    por el token o vencido); version cuenta los cambios aplicados
+    """
+    parking = models.ForeignKey(Parking, on_delete=models.CASCADE, related_name='spaces')
+    number = models.PositiveIntegerField()  # 0 .. capacity - 1
+    label = models.CharField(max_length=10)
+    held_by = models.CharField(max_length=64, null=True, blank=True)
+    held_until = models.DateTimeField(null=True, blank=True)
+    is_occupied = models.BooleanField(default=False)
+    version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Cupo"
+        verbose_name_plural = "Cupos"
+        constraints = [
+            models.UniqueConstraint(fields=['parking', 'number'], name='unique_parking_space_number'),
+        ]
+
+    def __str__(self):
+        return f"{self.parking_id} {self.label}"
 
 
 class SearchHistory(models.Model):
@@ -31,6 +78,11 @@ class SearchHistory(models.Model):
         verbose_name = "Historial de Búsqueda"
         verbose_name_plural = "Historial de Búsquedas"
         ordering = ['-timestamp']
+        indexes = [
+            # SearchHistoryView: historial del usuario, más recientes primero
+            models.Index(fields=['user', '-timestamp'], name='history_user_recent_idx'),
+            models.Index(fields=['-timestamp'], name='history_recent_idx'),
+        ]
 
     def __str__(self):
         return f"Búsqueda {self.id} - {self.timestamp}"
\ No newline at end of file
@@ -1,6 +1,11 @@
 from abc import ABC, abstractmethod
+import logging
 import math
 
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
 
 class IGPSService(ABC):
     """Interfaz estándar para servicios GPS"""
@@ -9,10 +14,27 @@ class IGPSService(ABC):
     def get_distance(self, lat1, lon1, lat2, lon2):
         pass
     
+    @abstractmethod
+    def get_distances(self, origin, lats, lngs):
+        """Distancias (km) desde origin a un arreglo de coordenadas, en un solo paso"""
+        pass
+
+    @abstractmethod
+    def get_distance_matrix(self, origins, lats, lngs):
+        """Matriz N×M de distancias (km) desde N orígenes a M coordenadas"""
+        pass
+
     @abstractmethod
     def calculate_route(self, origin, destination):
         pass
 
+    def travel_times(self, origin, destinations):
+        """
+        Minutos de viaje desde origin a cada destino, o None si el servicio
+        solo conoce distancias en línea recta
+        """
+        return None
+
 
 class GoogleMapsService:
     """Servicio externo de Google Maps (simulado)"""
@@ -27,6 +49,36 @@ class GoogleMapsService:
              math.sin(dlon / 2) ** 2)
         c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
         return R * c
+
+    def compute_distances_km(self, origin_lat, origin_lng, dest_lats, dest_lngs):
+        # Fórmula de Haversine vectorizada con NumPy
+        R = 6371  # Radio de la Tierra en km
+        dest_lats = np.asarray(dest_lats, dtype=np.float64)
+        dest_lngs = np.asarray(dest_lngs, dtype=np.float64)
+        dlat = np.radians(dest_lats - origin_lat)
+        dlon = np.radians(dest_lngs - origin_lng)
+        a = (np.sin(dlat / 2) ** 2 +
+             math.cos(math.radians(origin_lat)) * np.cos(np.radians(dest_lats)) *
+             np.sin(dlon / 2) ** 2)
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        return R * c
+
+    def compute_distance_matrix_km(self, origin_lats, origin_lngs, dest_lats, dest_lngs):
+        # Haversine por difusión NumPy: filas = orígenes, columnas = destinos.
+        # Mismas operaciones que compute_distances_km para obtener valores idénticos
+        R = 6371  # Radio de la Tierra en km
+        origin_lats = np.asarray(origin_lats, dtype=np.float64)[:, None]
+        origin_lngs = np.asarray(origin_lngs, dtype=np.float64)[:, None]
+        dest_lats = np.asarray(dest_lats, dtype=np.float64)[None, :]
+        dest_lngs = np.asarray(dest_lngs, dtype=np.float64)[None, :]
+        cos_origin = np.array([math.cos(math.radians(lat)) for lat in origin_lats[:, 0].tolist()])[:, None]
+        dlat = np.radians(dest_lats - origin_lats)
+        dlon = np.radians(dest_lngs - origin_lngs)
+        a = (np.sin(dlat / 2) ** 2 +
+             cos_origin * np.cos(np.radians(dest_lats)) *
+             np.sin(dlon / 2) ** 2)
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        return R * c
     
     def get_directions(self, start, end):
         # Simula respuesta de API externa
@@ -69,17 +121,30 @@ class GPSAdapter(IGPSService):
     
     def __init__(self, external_service=None):
         self.external_service = external_service or GoogleMapsService()
-        print("🔌 ADAPTER: GPSAdapter inicializado con servicio externo")
+        logger.debug("🔌 ADAPTER: GPSAdapter inicializado con servicio externo")
     
     def get_distance(self, lat1, lon1, lat2, lon2):
         """Adapta el método de Google Maps a nuestra interfaz"""
-        print(f"🔌 ADAPTER: Calculando distancia usando servicio externo")
         distance = self.external_service.compute_distance_km(lat1, lon1, lat2, lon2)
         return round(distance, 2)
+
+    def get_distances(self, origin, lats, lngs):
+        """Versión por lotes de get_distance: un arreglo NumPy de distancias en km"""
+        distances = self.external_service.compute_distances_km(
+            origin['lat'], origin['lng'], lats, lngs
+        )
+        return np.round(distances, 2)
+
+    def get_distance_matrix(self, origins, lats, lngs):
+        """Versión N×M de get_distances para búsquedas por lotes"""
+        distances = self.external_service.compute_distance_matrix_km(
+            [origin['lat'] for origin in origins], [origin['lng'] for origin in origins], lats, lngs
+        )
+        return np.round(distances, 2)
     
     def calculate_route(self, origin, destination):
         """Adapta el cálculo de ruta a nuestro formato"""
-        print(f"🔌 ADAPTER: Calculando ruta usando servicio externo")
+        logger.debug("🔌 ADAPTER: Calculando ruta usando servicio externo")
         result = self.external_service.get_directions(origin, destination)
         
         # Convierte el formato externo a nuestro formato interno
@@ -100,4 +165,65 @@ class GPSAdapter(IGPSService):
             lat = origin['lat'] + (destination['lat'] - origin['lat']) * ratio
             lng = origin['lng'] + (destination['lng'] - origin['lng']) * ratio
             waypoints.append({'lat': lat, 'lng': lng})
-        return waypoints
\ No newline at end of file
+        return waypoints
+
+
+class RoadNetworkGPSAdapter(GPSAdapter):
+    """
+    Implementación de IGPSService sobre un grafo vial local (RoadNetwork)
+    Las distancias de filtrado siguen siendo en línea recta; las rutas y los
+    tiempos de viaje se calculan sobre la red con A* y Dijkstra uno-a-muchos.
+    Si un punto no puede conectarse a la red se usa el servicio de respaldo
+    """
+
+    def __init__(self, road_network, fallback=None, access_speed_kmh=None):
+        from api.services.road_network import ACCESS_SPEED_KMH
+        super().__init__()
+        self.road_network = road_network
+        self.fallback = fallback or GPSAdapter()
+        self.access_mps = (access_speed_kmh or ACCESS_SPEED_KMH) / 3.6
+        logger.debug("🔌 ADAPTER: RoadNetworkGPSAdapter inicializado (%s nodos, %s aristas)",
+                     len(road_network), road_network.edge_count)
+
+    def _snap(self, point):
+        return self.road_network.nearest_node(point['lat'], point['lng'])
+
+    def calculate_route(self, origin, destination):
+        """Ruta más rápida sobre la red vial en nuestro formato estándar"""
+        source, source_m = self._snap(origin)
+        target, target_m = self._snap(destination)
+        if source is None or target is None:
+            return self.fallback.calculate_route(origin, destination)
+        found = self.road_network.shortest_path(source, target)
+        if found is None:
+            return self.fallback.calculate_route(origin, destination)
+
+        path, seconds, meters = found
+        network = self.road_network
+        # Tramos de acceso en línea recta entre los puntos pedidos y la red
+        seconds += (source_m + target_m) / self.access_mps
+        meters += source_m + target_m
+        waypoints = [origin]
+        waypoints.extend(
+            {'lat': lat, 'lng': lng}
+            for lat, lng in zip(network.latitude[path].tolist(), network.longitude[path].tolist())
+        )
+        waypoints.append(destination)
+        return {
+            'distance_km': round(meters / 1000, 3),
+            'duration_minutes': round(seconds / 60, 2),
+            'waypoints': waypoints
+        }
+
+    def travel_times(self, origin, destinations):
+        """Minutos desde origin a cada destino con una sola búsqueda sobre la red"""
+        source, source_m = self._snap(origin)
+        if source is None:
+            return None
+        snapped = [self._snap(destination) for destination in destinations]
+        nodes = [node for node, _ in snapped if node is not None]
+        seconds = dict(zip(nodes, self.road_network.travel_times(source, nodes)))
+        return [
+            (seconds[node] + (source_m + target_m) / self.access_mps) / 60 if node is not None else math.inf
+            for node, target_m in snapped
+        ]
@@ -1,4 +1,15 @@
 from abc import ABC, abstractmethod
+import logging
+
+import numpy as np
+from django.db.models import F, Q
+
+from api.services.spatial_index import bounding_box
+
+logger = logging.getLogger(__name__)
+
+# Margen para el redondeo a 2 decimales de GPSAdapter.get_distance
+DISTANCE_PRECISION_KM = 0.005
 
 
 class SearchCriteria(ABC):
@@ -32,6 +43,24 @@ class SearchCriteria(ABC):
     def matches(self, parking, user_location):
         pass
 
+    def compile_q(self, user_location):
+        """
+        Traduce el criterio a un filtro Q de Django
+        Retorna (q, residual): q preselecciona filas en la BD (None si no se puede
+        compilar) y residual es el criterio que aún debe evaluarse con matches()
+        sobre las filas obtenidas (None si q es exacto)
+        """
+        return None, self
+
+    def compile_mask(self, columns, user_location):
+        """
+        Traduce el criterio a una máscara booleana NumPy sobre columnas en memoria
+        (latitude, longitude, price_per_hour, is_available, capacity, occupied y
+        opcionalmente distance_km)
+        Retorna (mask, residual) con la misma semántica que compile_q
+        """
+        return None, self
+
 
 class AvailabilityCriteria(SearchCriteria):
     """Criterio: Parqueadero disponible"""
@@ -39,6 +68,12 @@ class AvailabilityCriteria(SearchCriteria):
     def matches(self, parking, user_location):
         return parking.is_available
 
+    def compile_q(self, user_location):
+        return Q(is_available=True), None
+
+    def compile_mask(self, columns, user_location):
+        return np.asarray(columns['is_available'], dtype=bool), None
+
 
 class DistanceCriteria(SearchCriteria):
     """Criterio: Distancia máxima"""
@@ -48,11 +83,36 @@ class DistanceCriteria(SearchCriteria):
         self.gps_adapter = gps_adapter
     
     def matches(self, parking, user_location):
-        distance = self.gps_adapter.get_distance(
+        # Reutiliza la distancia precalculada por lotes en la fachada si existe
+        distance = getattr(parking, 'distance_km', None)
+        if distance is None:
+            distance = self.gps_adapter.get_distance(
+                user_location['lat'], user_location['lng'],
+                parking.latitude, parking.longitude
+            )
+        return distance <= self.max_distance_km
+
+    def compile_q(self, user_location):
+        # Prefiltro por caja envolvente; la distancia exacta se verifica con matches()
+        min_lat, max_lat, lng_ranges = bounding_box(
             user_location['lat'], user_location['lng'],
-            parking.latitude, parking.longitude
+            float(self.max_distance_km) + DISTANCE_PRECISION_KM
         )
-        return distance <= self.max_distance_km
+        q = Q(latitude__gte=min_lat, latitude__lte=max_lat)
+        if lng_ranges is not None:
+            lng_q = Q()
+            for min_lng, max_lng in lng_ranges:
+                lng_q |= Q(longitude__gte=min_lng, longitude__lte=max_lng)
+            q &= lng_q
+        return q, self
+
+    def compile_mask(self, columns, user_location):
+        distances = columns.get('distance_km')
+        if distances is None:
+            distances = self.gps_adapter.get_distances(
+                user_location, columns['latitude'], columns['longitude']
+            )
+        return np.asarray(distances) <= float(self.max_distance_km), None
 
 
 class PriceCriteria(SearchCriteria):
@@ -64,6 +124,30 @@ class PriceCriteria(SearchCriteria):
     def matches(self, parking, user_location):
         return parking.price_per_hour <= self.max_price
 
+    def compile_q(self, user_location):
+        return Q(price_per_hour__lte=self.max_price), None
+
+    def compile_mask(self, columns, user_location):
+        prices = np.asarray(columns['price_per_hour'], dtype=np.float64)
+        return prices <= float(self.max_price), None
+
+
+class MinFreeSpacesCriteria(SearchCriteria):
+    """Criterio: Cupos libres mínimos (capacidad - ocupados)"""
+
+    def __init__(self, min_free_spaces):
+        self.min_free_spaces = int(min_free_spaces)
+
+    def matches(self, parking, user_location):
+        return parking.capacity - parking.occupied_spaces >= self.min_free_spaces
+
+    def compile_q(self, user_location):
+        return Q(capacity__gte=F('occupied_spaces') + self.min_free_spaces), None
+
+    def compile_mask(self, columns, user_location):
+        free = np.asarray(columns['capacity'], dtype=np.int64) - np.asarray(columns['occupied'], dtype=np.int64)
+        return free >= self.min_free_spaces, None
+
 
 class CompositeCriteria(SearchCriteria):
     """
@@ -74,12 +158,12 @@ class CompositeCriteria(SearchCriteria):
     def __init__(self, operation='AND'):
         self.criteria = []
         self.operation = operation  # 'AND' o 'OR'
-        print(f"🌳 COMPOSITE: Criterio compuesto creado ({operation})")
+        logger.debug("🌳 COMPOSITE: Criterio compuesto creado (%s)", operation)
     
     def add(self, criteria: SearchCriteria):
         """Añade un criterio al compuesto"""
         self.criteria.append(criteria)
-        print(f"🌳 COMPOSITE: Criterio añadido (Total: {len(self.criteria)})")
+        logger.debug("🌳 COMPOSITE: Criterio añadido (Total: %s)", len(self.criteria))
     
     def matches(self, parking, user_location):
         """Evalúa si el parking cumple con los criterios compuestos"""
@@ -89,4 +173,73 @@ class CompositeCriteria(SearchCriteria):
         if self.operation == 'AND':
             return all(c.matches(parking, user_location) for c in self.criteria)
         else:  # OR
-            return any(c.matches(parking, user_location) for c in self.criteria)
\ No newline at end of file
+            return any(c.matches(parking, user_location) for c in self.criteria)
+
+    def compile_q(self, user_location):
+        """Combina los Q de los hijos respetando la semántica AND/OR"""
+        if not self.criteria:
+            return Q(), None
+
+        compiled = [c.compile_q(user_location) for c in self.criteria]
+
+        if self.operation == 'AND':
+            # Los hijos no compilables no restringen la consulta y quedan como residuo
+            q = Q()
+            residuals = []
+            for child_q, residual in compiled:
+                if child_q is not None:
+                    q &= child_q
+                if residual is not None:
+                    residuals.append(residual)
+            return q, self._and_residual(residuals)
+
+        # OR: una rama siempre verdadera hace verdadero todo el OR
+        if any(child_q is not None and not child_q and residual is None
+               for child_q, residual in compiled):
+            return Q(), None
+        if any(child_q is None or not child_q for child_q, _ in compiled):
+            return None, self
+
+        q = Q()
+        for child_q, _ in compiled:
+            q |= child_q
+        exact = all(residual is None for _, residual in compiled)
+        return q, None if exact else self
+
+    def compile_mask(self, columns, user_location):
+        """Combina las máscaras de los hijos respetando la semántica AND/OR"""
+        size = len(columns['latitude'])
+        if not self.criteria:
+            return np.ones(size, dtype=bool), None
+
+        compiled = [c.compile_mask(columns, user_location) for c in self.criteria]
+
+        if self.operation == 'AND':
+            mask = np.ones(size, dtype=bool)
+            residuals = []
+            for child_mask, residual in compiled:
+                if child_mask is not None:
+                    mask &= child_mask
+                if residual is not None:
+                    residuals.append(residual)
+            return mask, self._and_residual(residuals)
+
+        # OR: solo se compila si todas las ramas son exactas
+        if any(child_mask is None or residual is not None for child_mask, residual in compiled):
+            return None, self
+        mask = np.zeros(size, dtype=bool)
+        for child_mask, _ in compiled:
+            mask |= child_mask
+        return mask, None
+
+    @staticmethod
+    def _and_residual(residuals):
+        if not residuals:
+            return None
+        if len(residuals) == 1:
+            return residuals[0]
+        residual = CompositeCriteria('AND')
+        for criteria in residuals:
+            residual.add(criteria)
+        return residual
+
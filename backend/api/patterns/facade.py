@@ -1,10 +1,23 @@
+import asyncio
+import contextvars
+import heapq
+import logging
+
+import numpy as np
+
 from api.patterns.singleton import ParkingDataManager
 from api.patterns.adapter import GPSAdapter
 from api.patterns.observer import ParkingAvailabilityObserver
 from api.patterns.composite import (
     CompositeCriteria, AvailabilityCriteria,
-    DistanceCriteria, PriceCriteria
+    DistanceCriteria, PriceCriteria, MinFreeSpacesCriteria,
+    DISTANCE_PRECISION_KM
 )
+from api.services.payloads import SearchPayload
+from api.services.route_cache import RouteCache
+from api.services.tracing import tracer
+
+logger = logging.getLogger(__name__)
 
 
 class ParkingSearchFacade:
@@ -50,93 +63,383 @@ class ParkingSearchFacade:
     def __init__(self):
         self.data_manager = ParkingDataManager()
         self.gps_adapter = GPSAdapter()
+        # Candidatos más cercanos en línea recta que se reordenan por tiempo de viaje
+        # cuando el servicio GPS lo soporta (1: se elige por línea recta)
+        self.travel_time_candidates = 1
+        # Tabla precalculada de tiempos de viaje por celda (TravelTimeGrid), opcional
+        self.travel_time_grid = None
+        # Rutas por (celda del origen, parqueadero destino); se invalidan al mover el parqueadero
+        self.route_cache = RouteCache()
         self.observer = ParkingAvailabilityObserver()
-        print("🏛️ FACADE: ParkingSearchFacade inicializado")
+        logger.debug("🏛️ FACADE: ParkingSearchFacade inicializado")
+
+    def set_gps_service(self, gps_service, travel_time_candidates=1):
+        """
+        Conecta otra implementación de IGPSService (p. ej. RoadNetworkGPSAdapter)
+        Con travel_time_candidates > 1 el más cercano se elige por tiempo de viaje
+        entre esa cantidad de candidatos más cercanos en línea recta
+        """
+        self.gps_adapter = gps_service
+        self.travel_time_candidates = travel_time_candidates
+        self.route_cache.clear()
+
+    def set_travel_time_grid(self, grid):
+        """Conecta una TravelTimeGrid: el más cercano se elige por consulta a la tabla"""
+        self.travel_time_grid = grid
+
+    @property
+    def ranks_by_travel_time(self):
+        return self.travel_time_candidates > 1 or self.travel_time_grid is not None
+
+    def update_parking_location(self, parking_id, latitude=None, longitude=None):
+        """
+        Un parqueadero se agregó, movió (nuevas coordenadas) o eliminó: se recarga el
+        snapshot y se descartan sus rutas. La tabla de tiempos se actualiza aparte con
+        update_travel_times(), fuera de la petición; mientras tanto las búsquedas leen
+        la tabla anterior, filtrada con el snapshot ya actualizado
+        """
+        self.data_manager.invalidate()
+        self.route_cache.invalidate_parking(parking_id)
+
+    def update_travel_times(self, parking_id, latitude=None, longitude=None):
+        """Actualiza solo las celdas de la tabla de tiempos afectadas por el cambio del parqueadero"""
+        grid = self.travel_time_grid
+        network = getattr(self.gps_adapter, 'road_network', None)
+        if grid is None or network is None:
+            return 0
+        snapshot = self.data_manager.get_snapshot()
+        parkings = zip(snapshot.ids.tolist(), snapshot.latitude.tolist(), snapshot.longitude.tolist())
+        updated = grid.update_parking(network, parkings, parking_id, latitude, longitude)
+        logger.debug("🏛️ FACADE: %s celdas de tiempos de viaje actualizadas para parking %s", updated, parking_id)
+        return updated
+
+    def reload_inventory(self):
+        """
+        Tras una importación masiva: recarga el snapshot y el índice espacial una
+        sola vez, descarta las rutas en caché y recalcula toda la tabla de tiempos
+        """
+        self.data_manager.invalidate()
+        self.route_cache.clear()
+        snapshot, index = self.data_manager.get_snapshot_and_index()
+        grid = self.travel_time_grid
+        network = getattr(self.gps_adapter, 'road_network', None)
+        if grid is not None and network is not None:
+            grid.rebuild_cells(
+                network, zip(snapshot.ids.tolist(), snapshot.latitude.tolist(), snapshot.longitude.tolist())
+            )
+        logger.debug("🏛️ FACADE: Inventario recargado (%s parqueaderos, %s disponibles)", len(snapshot), len(index))
+        return len(snapshot)
 
     def find_nearest_parking(self, user_location, filters=None):
         """Método simplificado para encontrar el parqueadero más cercano"""
-        print("🏛️ FACADE: Iniciando búsqueda de parqueadero más cercano")
+        logger.debug("🏛️ FACADE: Iniciando búsqueda de parqueadero más cercano")
 
-        # 1. Obtener todos los parqueaderos disponibles
-        parkings = self.data_manager.get_all_parkings()
-        try:
-            count_text = f"{parkings.count()}"
-        except Exception:
-            # parkings puede ser una lista en algunos contextos
-            count_text = f"{len(parkings)}"
-        print(f"🏛️ FACADE: {count_text} parqueaderos encontrados en BD")
+        nearest = self._nearest_candidates(user_location, filters)
+        if not nearest:
+            return None
+        if len(nearest) > 1:
+            nearest = self._rank_by_travel_time(user_location, nearest)
+        distance, _, parking = nearest[0]
+        logger.debug("🏛️ FACADE: Parqueadero más cercano: %s (%s km)", parking.name, distance)
 
-        # 2. PATRÓN COMPOSITE: Aplicar filtros compuestos
+        # 6. Calcular ruta usando GPS Adapter
+        with tracer.span('routing'):
+            route = self._route_to(user_location, parking.id, parking.latitude, parking.longitude)
+
+        with tracer.span('enrichment'):
+            enriched_data = self._enrich_parking_data(parking, distance, route)
+
+        return enriched_data
+
+    async def afind_nearest_parking(self, user_location, filters=None, executor=None):
+        """
+        Versión asíncrona de find_nearest_parking para vistas ASGI: la búsqueda sobre
+        el snapshot (CPU), el orden por tiempo de viaje y la ruta corren en executor,
+        sin ocupar el event loop mientras responde el servicio GPS
+        """
+        loop = asyncio.get_running_loop()
+
+        def run(func, *args):
+            # run_in_executor no propaga los contextvars: la traza en curso se copia al hilo
+            return loop.run_in_executor(executor, contextvars.copy_context().run, func, *args)
+
+        nearest = await run(self._nearest_candidates, user_location, filters)
+        if not nearest:
+            return None
+        if len(nearest) > 1:
+            # Mismo criterio que find_nearest_parking: sin tiempos de viaje se queda el más cercano
+            nearest = await run(self._rank_by_travel_time, user_location, nearest)
+        distance, _, parking = nearest[0]
+        logger.debug("🏛️ FACADE: Parqueadero más cercano (async): %s (%s km)", parking.name, distance)
+
+        with tracer.span('routing'):
+            route = await run(self._route_to, user_location, parking.id, parking.latitude, parking.longitude)
+
+        with tracer.span('enrichment'):
+            return self._enrich_parking_data(parking, distance, route)
+
+    # Tamaño máximo (orígenes × parqueaderos) de cada bloque de la matriz de distancias
+    BATCH_MATRIX_CELLS = 2_000_000
+
+    def find_nearest_batch(self, searches):
+        """
+        Versión por lotes de find_nearest_parking para N búsquedas (ubicación, filtros)
+        Lee el snapshot una sola vez y resuelve cada grupo de búsquedas con los mismos
+        filtros con una matriz de distancias N×M; retorna los resultados en el mismo orden
+        """
+        logger.debug("🏛️ FACADE: Búsqueda por lotes de %s orígenes", len(searches))
+        if self.ranks_by_travel_time:
+            # El orden por tiempo de viaje no se puede resolver con la matriz en línea recta
+            return [self.find_nearest_parking(user_location, filters) for user_location, filters in searches]
+        with tracer.span('data_fetch'):
+            snapshot = self.data_manager.get_snapshot()
+
+        groups = {}
+        for position, (user_location, filters) in enumerate(searches):
+            key = str(sorted(filters.items())) if filters else ""
+            groups.setdefault(key, []).append(position)
+
+        results = [None] * len(searches)
+        for positions in groups.values():
+            filters = searches[positions[0]][1]
+            for position, (distance, row) in zip(
+                positions, self._nearest_rows_batch(snapshot, [searches[p][0] for p in positions], filters)
+            ):
+                if row is None:
+                    continue
+                parking = snapshot.payload(row)
+                user_location = searches[position][0]
+                with tracer.span('routing'):
+                    route = self._route_to(user_location, parking.id, parking.latitude, parking.longitude)
+                with tracer.span('enrichment'):
+                    results[position] = self._enrich_parking_data(parking, distance, route)
+        return results
+
+    def _nearest_rows_batch(self, snapshot, locations, filters):
+        """(distancia, fila) del más cercano para cada ubicación con los mismos filtros"""
+        # Los criterios que no dependen del origen se compilan una sola vez sobre todo el snapshot
+        static_filters = {key: value for key, value in (filters or {}).items() if key != 'max_distance'}
+        with tracer.span('filtering'):
+            criteria, _ = self._build_criteria(static_filters)
+            columns = snapshot.columns()
+            mask, leftover = criteria.compile_mask(columns, locations[0] if locations else None)
+        if leftover is not None:
+            # Criterios no compilables: se resuelve cada origen por separado
+            nearest = [self._k_nearest(location, 1, filters) for location in locations]
+            return [
+                (found[0][0], snapshot.row_of(found[0][1])) if found else (None, None)
+                for found in nearest
+            ]
+
+        # Filas candidatas en orden de id: argmin desempata por el menor id como la búsqueda individual
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return [(None, None)] * len(locations)
+        max_distance = float(filters['max_distance']) if filters and 'max_distance' in filters else None
+        lats, lngs = columns['latitude'][rows], columns['longitude'][rows]
+
+        nearest = []
+        chunk = max(1, self.BATCH_MATRIX_CELLS // len(rows))
+        for start in range(0, len(locations), chunk):
+            with tracer.span('distance'):
+                matrix = self.gps_adapter.get_distance_matrix(locations[start:start + chunk], lats, lngs)
+            if max_distance is not None:
+                matrix[matrix > max_distance] = np.inf
+            best = np.argmin(matrix, axis=1)
+            distances = matrix[np.arange(len(best)), best]
+            for column, distance in zip(best.tolist(), distances.tolist()):
+                nearest.append((distance, int(rows[column])) if np.isfinite(distance) else (None, None))
+        return nearest
+
+    def find_k_nearest(self, user_location, k, filters=None, after=None):
+        """
+        Los k parqueaderos más cercanos que cumplen los filtros, ordenados por
+        (distancia, id). after=(distancia, id) pagina por cursor: solo se retornan
+        resultados posteriores a esa posición. Las rutas no se calculan aquí;
+        el cliente las pide con get_route() solo para los resultados que expande
+        """
+        logger.debug("🏛️ FACADE: Buscando los %s parqueaderos más cercanos", k)
+        nearest = self._k_nearest(user_location, k, filters, after)
+        with tracer.span('enrichment'):
+            return [self._enrich_parking_data(parking, distance, None) for distance, _, parking in nearest]
+
+    def get_route(self, user_location, parking_id):
+        """Ruta desde el usuario a un parqueadero del snapshot (None si no existe)"""
+        snapshot = self.data_manager.get_snapshot()
+        row = snapshot.row_of(parking_id)
+        if row is None:
+            return None
+        return self._route_to(
+            user_location, parking_id, float(snapshot.latitude[row]), float(snapshot.longitude[row])
+        )
+
+    def _route_to(self, user_location, parking_id, latitude, longitude):
+        """Ruta hacia el parqueadero, reutilizando la de otro origen en la misma celda"""
+        return self.route_cache.get_or_compute(
+            user_location, parking_id,
+            lambda: self.gps_adapter.calculate_route(user_location, {'lat': latitude, 'lng': longitude})
+        )
+
+    def _build_criteria(self, filters):
+        """PATRÓN COMPOSITE: criterios compuestos para los filtros; retorna (criterios, distancia máxima)"""
         criteria = CompositeCriteria('AND')
         criteria.add(AvailabilityCriteria())
 
+        max_distance = None
         if filters:
             if 'max_distance' in filters:
+                max_distance = float(filters['max_distance'])
                 criteria.add(DistanceCriteria(filters['max_distance'], self.gps_adapter))
             if 'max_price' in filters:
                 criteria.add(PriceCriteria(filters['max_price']))
+            if 'min_free_spaces' in filters:
+                criteria.add(MinFreeSpacesCriteria(filters['min_free_spaces']))
+        return criteria, max_distance
+
+    def _k_nearest(self, user_location, k, filters=None, after=None):
+        """
+        Retorna hasta k tuplas (distancia, id, PayloadFragment) ordenadas por (distancia, id)
+        Mantiene un heap acotado a k elementos en lugar de ordenar todos los candidatos
+        """
+        # 1. Snapshot en memoria e índice espacial de parqueaderos disponibles
+        with tracer.span('data_fetch'):
+            snapshot, index = self.data_manager.get_snapshot_and_index()
+        logger.debug("🏛️ FACADE: Snapshot v%s: %s parqueaderos disponibles", snapshot.version, len(index))
 
-        filtered_parkings = [
-            p for p in parkings
-            if criteria.matches(p, user_location)
+        # 2. PATRÓN COMPOSITE: Aplicar filtros compuestos
+        criteria, max_distance = self._build_criteria(filters)
+
+        # 3. Recorrer candidatos por anillos alrededor del usuario; Haversine y
+        #    criterios se evalúan por lotes sobre las columnas del snapshot, sin I/O de BD
+        heap = []  # max-heap por (distancia, id) con claves negadas: (-distancia, -id, fila)
+        evaluated = 0
+        for ids, min_distance in index.iter_candidates(user_location['lat'], user_location['lng']):
+            # Ningún parqueadero restante puede mejorar el k-ésimo actual
+            if len(heap) == k and min_distance > -heap[0][0] + DISTANCE_PRECISION_KM:
+                break
+            if max_distance is not None and min_distance > max_distance:
+                break
+            if not ids:
+                continue
+
+            rows = snapshot.rows_of(ids)
+            if not len(rows):
+                continue
+            columns = snapshot.columns(rows)
+            with tracer.span('distance'):
+                columns['distance_km'] = self.gps_adapter.get_distances(
+                    user_location, columns['latitude'], columns['longitude']
+                )
+            evaluated += len(rows)
+
+            # 4. Criterios compilados a máscara; los no compilables se evalúan por fila
+            with tracer.span('filtering'):
+                mask, leftover = criteria.compile_mask(columns, user_location)
+                selected = np.flatnonzero(mask) if mask is not None else np.arange(len(rows))
+                if leftover is not None:
+                    selected = np.array([
+                        i for i in selected
+                        if self._matches_row(leftover, snapshot, rows[i], columns['distance_km'][i], user_location)
+                    ], dtype=np.intp)
+                distances = columns['distance_km'][selected]
+                if after is not None and len(selected):
+                    # Cursor: solo posiciones estrictamente posteriores a (distancia, id)
+                    keep = (distances > after[0]) | ((distances == after[0]) & (columns['id'][selected] > after[1]))
+                    selected, distances = selected[keep], distances[keep]
+            if not len(selected):
+                continue
+
+            # 5. Solo los k más cercanos del anillo (y sus empates) pueden entrar al heap
+            if len(selected) > k:
+                kth = np.partition(distances, k - 1)[k - 1]
+                keep = distances <= kth
+                selected, distances = selected[keep], distances[keep]
+            for i, distance in zip(selected.tolist(), distances.tolist()):
+                item = (-distance, -int(columns['id'][i]), int(rows[i]))
+                if len(heap) < k:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
+
+        logger.debug("🏛️ FACADE: %s candidatos evaluados cerca del usuario", evaluated)
+
+        return [
+            (-neg_distance, -neg_id, snapshot.payload(row))
+            for neg_distance, neg_id, row in sorted(heap, reverse=True)
         ]
-        print(f"🏛️ FACADE: {len(filtered_parkings)} parqueaderos después de filtros")
 
-        if not filtered_parkings:
-            return None
+    def _nearest_candidates(self, user_location, filters):
+        """
+        Candidatos (distancia, id, PayloadFragment) al más cercano: el primero de la
+        tabla de tiempos o los travel_time_candidates más cercanos en línea recta
+        """
+        nearest = self._nearest_from_grid(user_location, filters) if self.travel_time_grid else None
+        if not nearest:
+            nearest = self._k_nearest(user_location, self.travel_time_candidates, filters)
+        return nearest
+
+    def _nearest_from_grid(self, user_location, filters):
+        """
+        Primer parqueadero de la celda del usuario (ya ordenados por tiempo de viaje)
+        que está disponible y cumple los filtros; [] si ninguno de los K sirve
+        """
+        with tracer.span('routing'):
+            candidates = self.travel_time_grid.lookup(user_location['lat'], user_location['lng'])
+        if not candidates:
+            return []
+        with tracer.span('data_fetch'):
+            snapshot = self.data_manager.get_snapshot()
+        rows = [snapshot.row_of(parking_id) for parking_id, _ in candidates]
+        rows = np.array([row for row in rows if row is not None], dtype=np.intp)
+        if not len(rows):
+            return []
 
-        # 3. Calcular distancias y encontrar el más cercano
-        parking_with_distance = []
-        for parking in filtered_parkings:
-            distance = self.gps_adapter.get_distance(
-                user_location['lat'], user_location['lng'],
-                parking.latitude, parking.longitude
+        with tracer.span('distance'):
+            columns = snapshot.columns(rows)
+            columns['distance_km'] = self.gps_adapter.get_distances(
+                user_location, columns['latitude'], columns['longitude']
             )
-            parking_with_distance.append({
-                'parking': parking,
-                'distance': distance
-            })
-
-        # 4. Ordenar por distancia
-        nearest = min(parking_with_distance, key=lambda x: x['distance'])
-        print(f"🏛️ FACADE: Parqueadero más cercano: {nearest['parking'].name} ({nearest['distance']} km)")
-
-        # 5. Calcular ruta usando GPS Adapter
-        route = self.gps_adapter.calculate_route(
-            user_location,
-            {'lat': nearest['parking'].latitude, 'lng': nearest['parking'].longitude}
-        )
+        with tracer.span('filtering'):
+            criteria, _ = self._build_criteria(filters)
+            mask, leftover = criteria.compile_mask(columns, user_location)
+            for i in (np.flatnonzero(mask) if mask is not None else range(len(rows))):
+                if leftover is None or self._matches_row(
+                        leftover, snapshot, rows[i], columns['distance_km'][i], user_location):
+                    return [(float(columns['distance_km'][i]), int(columns['id'][i]), snapshot.payload(rows[i]))]
+        return []
 
-        enriched_data = self._enrich_parking_data(nearest['parking'], nearest['distance'], route)
+    def _rank_by_travel_time(self, user_location, nearest):
+        """Reordena candidatos (distancia, id, PayloadFragment) por tiempo de viaje real"""
+        with tracer.span('routing'):
+            minutes = self.gps_adapter.travel_times(
+                user_location,
+                [{'lat': parking.latitude, 'lng': parking.longitude} for _, _, parking in nearest]
+            )
+        if minutes is None:
+            return nearest
+        ranked = sorted(zip(minutes, nearest), key=lambda item: (item[0], item[1][0], item[1][1]))
+        return [candidate for _, candidate in ranked]
 
-        return enriched_data
+    @staticmethod
+    def _matches_row(criteria, snapshot, row, distance, user_location):
+        """Evalúa con matches() una fila del snapshot reutilizando su distancia"""
+        parking = snapshot.get_parking(row)
+        parking.distance_km = float(distance)
+        return criteria.matches(parking, user_location)
 
-    def _enrich_parking_data(self, parking, distance, route):
-
-        # Generar espacio aleatorio
-        import random
-        letters = ['A', 'B', 'C', 'D']
-        space = f"{random.choice(letters)}-{random.randint(1, 25):02d}"
-
-        return {
-            'id': parking.id,
-            'name': parking.name,
-            'latitude': parking.latitude,  # Directo en nivel superior
-            'longitude': parking.longitude,  # Directo en nivel superior
-            'location': {  # También mantener para compatibilidad
-                'lat': parking.latitude,
-                'lng': parking.longitude
-            },
+    @staticmethod
+    def _enrich_parking_data(fragment, distance, route):
+        """
+        Resultado de búsqueda: la parte fija viene precompilada en el PayloadFragment
+        del snapshot (incluido su JSON) y aquí solo se agregan los campos por petición
+        """
+        occupied = fragment.occupied_spaces
+        return SearchPayload(fragment, {
             'distance_km': distance,
-            'price_per_hour': float(parking.price_per_hour),
-            'is_available': parking.is_available,
-            'features': parking.features,
             'route': route,
-            'space': space,
-            # Información adicional calculada 
+            # El cupo concreto se asigna al reservar (SpaceReservationEngine)
+            'space': None,
             'estimated_time_minutes': route['duration_minutes'] if route else None,
-            'estimated_cost': float(parking.price_per_hour) * 2,
-            'rating': round(4 + (hash(parking.name) % 10) / 10, 1),
-            'capacity': parking.capacity,
-            'reviews_count': 124
-        }
\ No newline at end of file
+            'occupied_spaces': occupied,
+            'free_spaces': max(0, fragment.capacity - occupied),
+        })
\ No newline at end of file
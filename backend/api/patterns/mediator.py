@@ -1,4 +1,9 @@
-from typing import Any
+from typing import Any, Callable
+import logging
+
+from api.services.event_bus import EventBus
+
+logger = logging.getLogger(__name__)
 
 
 class SearchMediator:
@@ -34,33 +39,127 @@ class SearchMediator:
             usuario final.
         """
 
-        def __init__(self):
+        def __init__(self, event_bus: EventBus = None):
                 self.components = {}
-                print("📡 MEDIATOR: SearchMediator inicializado")
+                # Los suscriptores (observer, webhooks, analytics) reciben los eventos en
+                # segundo plano; solo el estado en memoria se actualiza dentro de la petición
+                self.event_bus = event_bus or EventBus()
+                logger.debug("📡 MEDIATOR: SearchMediator inicializado")
 
         def register_component(self, name: str, component):
                 """Registra un componente en el mediador"""
                 self.components[name] = component
-                print(f"📡 MEDIATOR: Componente '{name}' registrado")
+                if name == 'observer':
+                        self.event_bus.subscribe(
+                                'parking_availability_changed', self._notify_observer, name='observer'
+                        )
+                elif name == 'facade':
+                        # Las celdas de la tabla de tiempos se recalculan fuera de la petición
+                        self.event_bus.subscribe(
+                                'parking_location_changed', self._update_travel_times, name='travel_time_grid'
+                        )
+                logger.debug("📡 MEDIATOR: Componente '%s' registrado", name)
+
+        def subscribe(self, event: str, handler: Callable, name: str = None, shards: int = 1):
+                """Suscribe handler(data) a un evento; se ejecuta fuera de la petición"""
+                return self.event_bus.subscribe(event, handler, name, shards)
+
+        def _notify_observer(self, data):
+                self.components['observer'].notify(
+                        data['parking_id'],
+                        data['is_available'],
+                        location=data.get('location')
+                )
+
+        def _update_travel_times(self, data):
+                updated = self.components['facade'].update_travel_times(
+                        data['parking_id'],
+                        data.get('latitude'),
+                        data.get('longitude')
+                )
+                # Resultados guardados entre el cambio y la actualización usaron la tabla anterior
+                if updated and 'proxy' in self.components:
+                        self.components['proxy'].invalidate_cache()
 
         def notify(self, sender: str, event: str, data: Any = None):
                 """Maneja eventos y coordina la comunicación entre componentes"""
-                print(f"📡 MEDIATOR: Evento '{event}' recibido de '{sender}'")
+                logger.debug("📡 MEDIATOR: Evento '%s' recibido de '%s'", event, sender)
 
                 if event == 'parking_availability_changed':
-                        # Notificar al observer
-                        if 'observer' in self.components:
-                                self.components['observer'].notify(
+                        # Parchear el snapshot y el índice espacial del gestor de datos
+                        if 'data_manager' in self.components:
+                                self.components['data_manager'].update_parking_availability(
+                                        data['parking_id'],
+                                        data['is_available'],
+                                        is_closed=data.get('is_closed')
+                                )
+
+                        # Invalidar solo las entradas afectadas del caché del proxy
+                        if 'proxy' in self.components:
+                                self.components['proxy'].invalidate_cache(
                                         data['parking_id'],
-                                        data['is_available']
+                                        is_available=data['is_available'],
+                                        location=data.get('location')
+                                )
+
+                elif event == 'parking_availability_batch_changed':
+                        # Lote de sensores: un solo parche del snapshot y una sola invalidación
+                        changes = data['changes']
+                        if 'data_manager' in self.components:
+                                self.components['data_manager'].update_parking_availability_many(
+                                        [(change['parking_id'], change['is_available']) for change in changes]
                                 )
 
-                        # Invalidar caché del proxy
                         if 'proxy' in self.components:
-                                self.components['proxy'].invalidate_cache(data['parking_id'])
+                                self.components['proxy'].invalidate_cache_many(changes)
+                                # Parqueaderos cuyo contador de cupos cambió sin cambiar la disponibilidad
+                                for parking_id in data.get('occupancy_changed', ()):
+                                        self.components['proxy'].invalidate_occupancy(parking_id)
+
+                        # Los suscriptores por parqueadero reciben cada cambio en su orden
+                        for change in changes:
+                                self.event_bus.publish(
+                                        'parking_availability_changed', change, key=change['parking_id']
+                                )
+
+                elif event == 'parking_occupancy_changed':
+                        if data['availability_changed']:
+                                # Se llenó o se liberó: mismo flujo que un cambio de disponibilidad
+                                self.notify(sender, 'parking_availability_changed', {
+                                        'parking_id': data['parking_id'],
+                                        'is_available': data['occupied_spaces'] < data['capacity'],
+                                        'previous_status': data['occupied_spaces'] >= data['capacity'],
+                                        'location': data.get('location')
+                                })
+                        elif 'proxy' in self.components:
+                                self.components['proxy'].invalidate_occupancy(data['parking_id'])
+
+                elif event == 'parking_location_changed':
+                        # Parqueadero agregado, movido o eliminado: snapshot y rutas; las celdas
+                        # afectadas de la tabla de tiempos las actualiza el suscriptor travel_time_grid
+                        if 'facade' in self.components:
+                                self.components['facade'].update_parking_location(
+                                        data['parking_id'],
+                                        data.get('latitude'),
+                                        data.get('longitude')
+                                )
+
+                        if 'proxy' in self.components:
+                                self.components['proxy'].invalidate_cache()
+
+                elif event == 'parking_inventory_imported':
+                        # Importación masiva: una sola recarga al final y no una por parqueadero
+                        if 'facade' in self.components:
+                                self.components['facade'].reload_inventory()
+
+                        if 'proxy' in self.components:
+                                self.components['proxy'].invalidate_cache()
+
+                # Suscriptores del evento (observer incluido), en orden por parqueadero
+                self.event_bus.publish(event, data, key=data.get('parking_id') if isinstance(data, dict) else None)
 
-                elif event == 'search_requested':
-                        print(f"📡 MEDIATOR: Coordinando búsqueda para usuario {data.get('user_id')}")
+                if event == 'search_requested':
+                        logger.debug("📡 MEDIATOR: Coordinando búsqueda para usuario %s", data.get('user_id'))
 
                 elif event == 'route_calculated':
-                        print(f"📡 MEDIATOR: Ruta calculada, distancia: {data.get('distance')} km")
\ No newline at end of file
+                        logger.debug("📡 MEDIATOR: Ruta calculada, distancia: %s km", data.get('distance'))
\ No newline at end of file
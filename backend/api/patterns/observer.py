@@ -1,6 +1,9 @@
 from typing import List, Callable
+import logging
 import threading
 
+logger = logging.getLogger(__name__)
+
 
 class ParkingAvailabilityObserver:
     """
@@ -46,23 +49,23 @@ class ParkingAvailabilityObserver:
     def __init__(self):
         if not hasattr(self, 'subscribers'):
             self.subscribers: List[Callable] = []
-            print("👁️ OBSERVER: Sistema de observadores inicializado")
+            logger.debug("👁️ OBSERVER: Sistema de observadores inicializado")
 
     def subscribe(self, callback: Callable):
         """Suscribe un callback para recibir notificaciones"""
         if callback not in self.subscribers:
             self.subscribers.append(callback)
-            print(f"👁️ OBSERVER: Nuevo suscriptor registrado (Total: {len(self.subscribers)})")
+            logger.debug("👁️ OBSERVER: Nuevo suscriptor registrado (Total: %s)", len(self.subscribers))
 
     def unsubscribe(self, callback: Callable):
         """Cancela la suscripción"""
         if callback in self.subscribers:
             self.subscribers.remove(callback)
-            print(f"👁️ OBSERVER: Suscriptor removido (Total: {len(self.subscribers)})")
+            logger.debug("👁️ OBSERVER: Suscriptor removido (Total: %s)", len(self.subscribers))
 
     def notify(self, parking_id: int, is_available: bool, **kwargs):
         """Notifica a todos los suscriptores sobre cambios de disponibilidad"""
-        print(f"👁️ OBSERVER: Notificando cambio - Parking {parking_id}: {'Disponible' if is_available else 'Ocupado'}")
+        logger.debug("👁️ OBSERVER: Notificando cambio - Parking %s: %s", parking_id, 'Disponible' if is_available else 'Ocupado')
         data = {
             'parking_id': parking_id,
             'is_available': is_available,
@@ -72,4 +75,4 @@ class ParkingAvailabilityObserver:
             try:
                 callback(data)
             except Exception as e:
-                print(f"👁️ OBSERVER: Error al notificar suscriptor: {e}")
\ No newline at end of file
+                logger.warning("👁️ OBSERVER: Error al notificar suscriptor: %s", e)
\ No newline at end of file
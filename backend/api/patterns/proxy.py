@@ -1,5 +1,19 @@
-import time
-from typing import Optional, Dict, Any
+import asyncio
+import logging
+import math
+import threading
+
+from api.patterns.adapter import GoogleMapsService
+from api.patterns.composite import DISTANCE_PRECISION_KM
+from api.services.cache import LRUCache
+from api.services.rate_limit import TokenBucketRateLimiter
+from api.services.singleflight import SingleFlight
+from api.services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# La clave de caché redondea la ubicación a 4 decimales (~11 m por eje)
+CACHE_KEY_PRECISION_KM = 0.02
 
 
 class ParkingSearchProxy:
@@ -32,13 +46,22 @@ class ParkingSearchProxy:
       experiencia por sobrecarga o errores temporales.
     """
 
-    def __init__(self, real_search_service):
+    def __init__(self, real_search_service, rate_limiter=None):
         self.real_service = real_search_service
-        self.cache: Dict[str, Dict[str, Any]] = {}
         self.cache_duration = 30  # 30 segundos
-        self.last_request_time = {}
-        self.rate_limit_seconds = 2  # Mínimo 2 segundos entre búsquedas
-        print("🛡️ PROXY: ParkingSearchProxy inicializado")
+        self.cache_max_entries = 1024
+        self.cache = LRUCache(max_entries=self.cache_max_entries, ttl_seconds=self.cache_duration)
+        self.distance_service = GoogleMapsService()
+        self.single_flight = SingleFlight()
+        self._invalidation_generation = 0
+        # Protege la comparación de generación + cache.set frente a una invalidación concurrente
+        self._generation_lock = threading.Lock()
+        # Ráfagas de hasta 5 búsquedas y luego una cada 2 segundos por usuario o IP
+        # Un limitador sin claves tiene len() == 0: se compara con None y no por su valor de verdad
+        self.rate_limiter = (
+            rate_limiter if rate_limiter is not None else TokenBucketRateLimiter(capacity=5, refill_per_second=0.5)
+        )
+        logger.debug("🛡️ PROXY: ParkingSearchProxy inicializado")
 
     def _generate_cache_key(self, user_location, filters):
         """Genera una clave única para el caché"""
@@ -47,60 +70,292 @@ class ParkingSearchProxy:
         filter_str = str(sorted(filters.items())) if filters else ""
         return f"{lat}_{lng}_{filter_str}"
 
-    def _is_rate_limited(self, user_id):
-        """Verifica si el usuario está haciendo demasiadas peticiones"""
-        current_time = time.time()
-        if user_id in self.last_request_time:
-            time_diff = current_time - self.last_request_time[user_id]
-            if time_diff < self.rate_limit_seconds:
-                print(f"🛡️ PROXY: Rate limit aplicado para usuario {user_id}")
-                return True
-        return False
-
-    def find_nearest_parking(self, user_location, filters=None, user_id=None):
-        """Busca el parqueadero más cercano con caché y rate limiting"""
-        # Rate limiting
-        if user_id and self._is_rate_limited(user_id):
+    @staticmethod
+    def _is_cacheable(filters):
+        """Los filtros por cupos libres dependen de contadores que cambian a cada entrada/salida"""
+        return not filters or 'min_free_spaces' not in filters
+
+    @staticmethod
+    def _rate_limit_key(user_id, client_ip):
+        """Los usuarios autenticados se limitan por id; los anónimos por IP"""
+        if user_id:
+            return f"user:{user_id}"
+        if client_ip:
+            return f"ip:{client_ip}"
+        return None
+
+    def _is_rate_limited(self, rate_key):
+        """Consume una ficha del bucket; retorna los segundos a esperar (0 si se permite)"""
+        if rate_key is None:
+            return 0
+        wait = self.rate_limiter.acquire(rate_key)
+        if wait:
+            logger.debug("🛡️ PROXY: Rate limit aplicado para %s", rate_key)
+        return wait
+
+    def _rate_limit_error(self, user_id, client_ip):
+        """Respuesta de error si la petición supera el rate limit (None si se permite)"""
+        retry_after = self._is_rate_limited(self._rate_limit_key(user_id, client_ip))
+        if retry_after:
             return {
                 'error': 'Rate limit exceeded',
-                'retry_after': self.rate_limit_seconds
+                'retry_after': math.ceil(retry_after)
             }
+        return None
+
+    def find_nearest_parking(self, user_location, filters=None, user_id=None, client_ip=None):
+        """Busca el parqueadero más cercano con caché y rate limiting"""
+        # Rate limiting: se rechaza en O(1) antes de cualquier trabajo de búsqueda
+        error = self._rate_limit_error(user_id, client_ip)
+        if error:
+            return error
+
+        if not self._is_cacheable(filters):
+            return self.real_service.find_nearest_parking(user_location, filters)
 
-        # Verificar caché
         cache_key = self._generate_cache_key(user_location, filters)
-        current_time = time.time()
+        return self._cached_search(
+            cache_key, user_location,
+            lambda: self.real_service.find_nearest_parking(user_location, filters),
+            ranked=lambda result: [result] if result else [],
+            limit=self._nearest_limit()
+        )
+
+    async def afind_nearest_parking(self, user_location, filters=None, user_id=None, client_ip=None,
+                                    executor=None):
+        """
+        Versión asíncrona de find_nearest_parking (vistas ASGI): mismo caché, rate
+        limiting y single-flight por clave; el rate limit (que puede consultar SQLite)
+        corre en executor para no bloquear el event loop
+        """
+        loop = asyncio.get_running_loop()
+        error = await loop.run_in_executor(executor, self._rate_limit_error, user_id, client_ip)
+        if error:
+            return error
+
+        if not self._is_cacheable(filters):
+            return await self.real_service.afind_nearest_parking(user_location, filters, executor)
+
+        cache_key = self._generate_cache_key(user_location, filters)
+        with tracer.span('proxy_lookup') as span:
+            cached = self.cache.get(cache_key)
+            span.set(cache_hit=cached is not None)
+        if cached is not None:
+            logger.debug("🛡️ PROXY: ✅ Retornando desde caché")
+            return cached['result']
+
+        # Las tareas concurrentes con la misma clave esperan la misma búsqueda sin bloquear el loop
+        return await self.single_flight.do_async(
+            cache_key, self._asearch_and_cache, cache_key, user_location, filters, executor
+        )
+
+    async def _asearch_and_cache(self, cache_key, user_location, filters, executor):
+        """Versión asíncrona de _search_and_cache para afind_nearest_parking"""
+        cached = self.cache.get(cache_key, count=False)
+        if cached is not None:
+            return cached['result']
+
+        generation = self._invalidation_generation
+        logger.debug("🛡️ PROXY: 🔍 Delegando búsqueda asíncrona al servicio real")
+        result = await self.real_service.afind_nearest_parking(user_location, filters, executor)
+        self._store(
+            cache_key, user_location, result,
+            ranked=lambda result: [result] if result else [],
+            limit=self._nearest_limit(),
+            generation=generation
+        )
+        return result
+
+    def find_nearest_batch(self, searches, user_id=None, client_ip=None):
+        """
+        Busca el más cercano para N pares (ubicación, filtros) pagando una sola vez
+        el rate limiting; los aciertos se sirven del caché y los fallos se resuelven
+        juntos en el servicio real. Retorna los resultados en el mismo orden
+        """
+        error = self._rate_limit_error(user_id, client_ip)
+        if error:
+            return error
+
+        results = [None] * len(searches)
+        keys = [self._generate_cache_key(location, filters) for location, filters in searches]
+        misses = []
+        with tracer.span('proxy_lookup'):
+            for position, cache_key in enumerate(keys):
+                cached = self.cache.get(cache_key) if self._is_cacheable(searches[position][1]) else None
+                if cached is not None:
+                    results[position] = cached['result']
+                else:
+                    misses.append(position)
+        logger.debug("🛡️ PROXY: Lote de %s búsquedas, %s desde caché", len(searches), len(searches) - len(misses))
+        if not misses:
+            return results
+
+        generation = self._invalidation_generation
+        found = self.real_service.find_nearest_batch([searches[position] for position in misses])
+        limit = self._nearest_limit()
+        for position, result in zip(misses, found):
+            results[position] = result
+            if self._is_cacheable(searches[position][1]):
+                self._store(
+                    keys[position], searches[position][0], result,
+                    ranked=lambda result: [result] if result else [],
+                    limit=limit,
+                    generation=generation
+                )
+        return results
+
+    def find_k_nearest(self, user_location, k, filters=None, after=None, user_id=None, client_ip=None):
+        """Página de los k parqueaderos más cercanos (posteriores al cursor after) con caché y rate limiting"""
+        error = self._rate_limit_error(user_id, client_ip)
+        if error:
+            return error
+
+        if not self._is_cacheable(filters):
+            return self.real_service.find_k_nearest(user_location, k, filters, after)
+
+        cache_key = f"knn_{k}_{after}_{self._generate_cache_key(user_location, filters)}"
+        return self._cached_search(
+            cache_key, user_location,
+            lambda: self.real_service.find_k_nearest(user_location, k, filters, after),
+            ranked=lambda results: results,
+            limit=k
+        )
+
+    def _nearest_limit(self):
+        """
+        Resultados que definen el alcance de un "más cercano" en caché: con orden por
+        tiempo de viaje, cualquier parqueadero que se libere puede cambiarlo
+        """
+        return math.inf if getattr(self.real_service, 'ranks_by_travel_time', False) else 1
+
+    def _cached_search(self, cache_key, user_location, search, ranked, limit):
+        """
+        Sirve la búsqueda desde caché o la ejecuta una sola vez por clave
+        ranked(result) da la lista de parqueaderos del resultado, ordenada por distancia
+        """
+        with tracer.span('proxy_lookup') as span:
+            cached = self.cache.get(cache_key)
+            span.set(cache_hit=cached is not None)
+        if cached is not None:
+            logger.debug("🛡️ PROXY: ✅ Retornando desde caché")
+            return cached['result']
 
-        if cache_key in self.cache:
-            cached_data = self.cache[cache_key]
-            cache_age = current_time - cached_data['timestamp']
+        # Realizar búsqueda real: las peticiones concurrentes con la misma clave
+        # esperan y comparten una única búsqueda (single-flight)
+        return self.single_flight.do(
+            cache_key, self._search_and_cache, cache_key, user_location, search, ranked, limit
+        )
 
-            if cache_age < self.cache_duration:
-                print(f"🛡️ PROXY: ✅ Retornando desde caché (edad: {cache_age:.1f}s)")
-                return cached_data['result']
-            else:
-                print(f"🛡️ PROXY: ⏰ Caché expirado, realizando nueva búsqueda")
+    def _search_and_cache(self, cache_key, user_location, search, ranked, limit):
+        """Ejecuta la búsqueda real y guarda el resultado (una vez por clave en curso)"""
+        # Otra búsqueda con la misma clave pudo terminar justo antes
+        cached = self.cache.get(cache_key, count=False)
+        if cached is not None:
+            return cached['result']
 
-        # Realizar búsqueda real
-        print(f"🛡️ PROXY: 🔍 Delegando búsqueda al servicio real")
-        result = self.real_service.find_nearest_parking(user_location, filters)
+        generation = self._invalidation_generation
+        logger.debug("🛡️ PROXY: 🔍 Delegando búsqueda al servicio real")
+        result = search()
+        self._store(cache_key, user_location, result, ranked, limit, generation)
+        return result
 
-        # Guardar en caché
-        self.cache[cache_key] = {
+    def _store(self, cache_key, user_location, result, ranked, limit, generation):
+        """Guarda el resultado de una búsqueda iniciada en la generación de invalidación indicada"""
+        # Guardar en caché, indexado por los parqueaderos incluidos en el resultado.
+        # reach_km: distancia del último resultado si la página está completa; un
+        # parqueadero que se libere más lejos no puede cambiarla (None: cualquiera puede)
+        parkings = ranked(result)
+        entry = {
             'result': result,
-            'timestamp': current_time
+            'origin': user_location,
+            'reach_km': parkings[-1]['distance_km'] if len(parkings) >= limit else None
         }
+        # Con el lock de la generación, una invalidación ocurre antes de la comparación
+        # (y el resultado se descarta) o después del set (y lo expulsa)
+        with self._generation_lock:
+            # Si hubo una invalidación durante la búsqueda el resultado puede estar obsoleto
+            if generation != self._invalidation_generation:
+                return
+            self.cache.set(cache_key, entry, tags=[parking['id'] for parking in parkings])
+        logger.debug("🛡️ PROXY: 💾 Resultado almacenado en caché")
 
-        # Actualizar rate limiting
-        if user_id:
-            self.last_request_time[user_id] = current_time
+    def _next_generation(self):
+        """Descarta los resultados de las búsquedas en curso (se llama antes de expulsar entradas)"""
+        with self._generation_lock:
+            self._invalidation_generation += 1
 
-        print(f"🛡️ PROXY: 💾 Resultado almacenado en caché")
-        return result
+    def invalidate_cache(self, parking_id=None, is_available=None, location=None):
+        """
+        Invalida solo los resultados afectados por un cambio de disponibilidad:
+        - Si el parqueadero deja de estar disponible, los resultados que lo incluían
+        - Si pasa a estar disponible, los resultados que ahora podría mejorar
+          (sin resultado o con un parqueadero más lejano que él)
+        Sin parking_id se invalida todo el caché
+        """
+        self._next_generation()
+        if parking_id is None:
+            logger.debug("🛡️ PROXY: 🗑️ Invalidando todo el caché")
+            self.cache.clear()
+            return
+
+        removed = self.cache.invalidate_tag(parking_id)
+        if is_available and location is not None:
+            removed += self.cache.invalidate_where(
+                lambda key, entry: self._could_improve(entry, location)
+            )
+        elif is_available and location is None:
+            self.cache.clear()
+        logger.debug("🛡️ PROXY: 🗑️ Invalidando caché para parking %s (%s entradas)", parking_id, removed)
+
+    def invalidate_cache_many(self, changes):
+        """
+        Versión por lotes de invalidate_cache para [{'parking_id', 'is_available', 'location'}]:
+        una sola pasada sobre el caché para todos los parqueaderos que pasan a estar disponibles
+        """
+        self._next_generation()
+        removed = 0
+        locations = []
+        for change in changes:
+            removed += self.cache.invalidate_tag(change['parking_id'])
+            if change['is_available']:
+                if change.get('location') is None:
+                    self.cache.clear()
+                    return
+                locations.append(change['location'])
+        if locations:
+            removed += self.cache.invalidate_where(
+                lambda key, entry: any(self._could_improve(entry, location) for location in locations)
+            )
+        logger.debug("🛡️ PROXY: 🗑️ Invalidando caché para %s parkings (%s entradas)", len(changes), removed)
+
+    def invalidate_occupancy(self, parking_id):
+        """
+        Cambió el contador de cupos de un parqueadero sin cambiar su disponibilidad:
+        solo se expulsan los resultados que muestran sus cupos. Las búsquedas con
+        min_free_spaces no se cachean, así que el conjunto de parqueaderos que
+        cumplen los filtros cacheados no cambia y no hace falta invalidar las que están en curso
+        """
+        return self.cache.invalidate_tag(parking_id)
+
+    def _could_improve(self, entry, location):
+        """Indica si un parqueadero en location podría reemplazar el resultado en caché"""
+        reach = entry['reach_km']
+        if reach is None:
+            return True
+        origin = entry['origin']
+        distance = self.distance_service.compute_distance_km(
+            origin['lat'], origin['lng'], location['lat'], location['lng']
+        )
+        return distance <= reach + DISTANCE_PRECISION_KM + CACHE_KEY_PRECISION_KM
+
+    def get_cache_stats(self):
+        """Contadores de aciertos, fallos y expulsiones del caché"""
+        return self.cache.stats()
+
+    def get_rate_limit_stats(self):
+        """Contadores de peticiones permitidas y rechazadas por el rate limiter"""
+        return self.rate_limiter.stats()
 
-    def invalidate_cache(self, parking_id=None):
-        """Invalida el caché cuando cambia la disponibilidad"""
-        if parking_id:
-            print(f"🛡️ PROXY: 🗑️ Invalidando caché para parking {parking_id}")
-        else:
-            print(f"🛡️ PROXY: 🗑️ Invalidando todo el caché")
-        self.cache.clear()
\ No newline at end of file
+    def get_coalescing_stats(self):
+        """Contadores de búsquedas ejecutadas y peticiones fusionadas por single-flight"""
+        return self.single_flight.stats()
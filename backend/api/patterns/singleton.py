@@ -1,3 +1,13 @@
+import logging
+import threading
+import time
+
+from api.services.snapshot import ParkingSnapshot
+from api.services.spatial_index import GridSpatialIndex
+
+logger = logging.getLogger(__name__)
+
+
 class ParkingDataManager:
     """
     PATRÓN SINGLETON
@@ -30,6 +40,7 @@ class ParkingDataManager:
 
     _instance = None
     _initialized = False
+    _lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
@@ -38,14 +49,158 @@ class ParkingDataManager:
 
     def __init__(self):
         if not self._initialized:
-            self.cache = {}
-            self.cache_timeout = 300  # 5 minutos
+            self.cache_timeout = 300  # 5 minutos: antigüedad máxima del snapshot
+            self.snapshot = None
+            self.spatial_index = None
+            self.spatial_index_factory = GridSpatialIndex
+            # Contadores de ocupación (OccupancyCounters) cuyos deltas aún no están en la BD
+            self.occupancy = None
+            # SharedSnapshotStore opcional: un worker publica el snapshot y los demás lo abren con mmap
+            self.shared_store = None
+            # Generación compartida vigente cuando se invalidó el snapshot: esa (o una anterior)
+            # ya no refleja la BD y hay que publicar otra (None: no hay invalidación pendiente)
+            self._stale_generation = None
+            # Con snapshot compartido el índice incluye todos los parqueaderos: los cambios
+            # de disponibilidad solo parchean la columna, no el índice
+            self._index_has_all = False
+            # Generación compartida a la que ya se aplicaron los deltas de ocupación pendientes
+            self._pending_generation = None
             self._initialized = True
-            print("🔒 SINGLETON: Nueva instancia de ParkingDataManager creada")
+            logger.debug("🔒 SINGLETON: Nueva instancia de ParkingDataManager creada")
         else:
-            print("🔒 SINGLETON: Reutilizando instancia existente")
+            logger.debug("🔒 SINGLETON: Reutilizando instancia existente")
 
     def get_all_parkings(self):
         """Obtiene todos los parqueaderos desde la BD"""
         from api.models import Parking
         return Parking.objects.filter(is_available=True)
+
+    def set_spatial_index_factory(self, factory):
+        """Conecta otra implementación de SpatialIndex (se reconstruye en la próxima búsqueda)"""
+        with self._lock:
+            self.spatial_index_factory = factory
+            self.snapshot = None
+
+    def set_shared_store(self, store):
+        """Conecta un SharedSnapshotStore (se abre en la próxima búsqueda)"""
+        with self._lock:
+            self.shared_store = store
+            self.snapshot = None
+            self._pending_generation = None
+
+    def _is_stale(self, snapshot):
+        if snapshot is None or time.time() - snapshot.loaded_at > self.cache_timeout:
+            return True
+        # Otro worker publicó una generación nueva del snapshot compartido
+        store = self.shared_store
+        return store is not None and store.generation != snapshot.generation
+
+    def _load_snapshot(self):
+        """
+        (snapshot, índice) desde la BD o, con snapshot compartido, de la generación vigente;
+        se publica una nueva (una sola vez entre todos los workers) si no hay, venció o se
+        invalidó. El índice es None cuando hay que construirlo con spatial_index_factory
+        """
+        store = self.shared_store
+        if store is None:
+            return ParkingSnapshot.load(), None
+        with store.publishing():
+            stale = self._stale_generation
+            # Una generación publicada después de la invalidación ya incluye el cambio
+            attached = store.attach() if stale is None or store.generation > stale else None
+            if attached is None or time.time() - attached[0].loaded_at > self.cache_timeout:
+                store.publish(ParkingSnapshot.load())
+                attached = store.attach()
+            self._stale_generation = None
+        snapshot, index = attached
+        # El índice publicado es GridSpatialIndex en arreglos; otra implementación se construye aquí
+        return snapshot, index if self.spatial_index_factory is GridSpatialIndex else None
+
+    def _mark_stale(self):
+        store = self.shared_store
+        self._stale_generation = store.generation if store is not None else None
+
+    def get_snapshot_and_index(self):
+        """
+        Obtiene el snapshot en memoria y su índice espacial (solo disponibles; todos
+        con snapshot compartido, cuya disponibilidad parchean también los demás workers)
+        Se recargan desde la BD la primera vez o cuando superan cache_timeout
+        """
+        snapshot, index = self.snapshot, self.spatial_index
+        if self._is_stale(snapshot):
+            with self._lock:
+                if self._is_stale(self.snapshot):
+                    snapshot, index = self._load_snapshot()
+                    prebuilt = index is not None
+                    if not prebuilt:
+                        index = self.spatial_index_factory()
+                    has_all = snapshot.generation is not None
+                    points = snapshot.points if has_all else snapshot.available_points
+                    occupancy = self.occupancy
+                    if occupancy is None:
+                        if not prebuilt:
+                            index.bulk_load(points())
+                        self.snapshot, self.spatial_index = snapshot, index
+                    else:
+                        with occupancy.lock:
+                            # Las columnas compartidas ya tienen los deltas si este worker abrió antes esta generación
+                            if snapshot.generation is None or snapshot.generation != self._pending_generation:
+                                occupancy.apply_pending(snapshot)
+                                self._pending_generation = snapshot.generation
+                            if not prebuilt:
+                                index.bulk_load(points())
+                            self.snapshot, self.spatial_index = snapshot, index
+                    self._index_has_all = has_all
+                    logger.debug("🔒 SINGLETON: Snapshot v%s cargado (%s parqueaderos, %s en el índice)",
+                                 snapshot.version, len(snapshot), len(index))
+                snapshot, index = self.snapshot, self.spatial_index
+        return snapshot, index
+
+    def get_snapshot(self):
+        return self.get_snapshot_and_index()[0]
+
+    def get_spatial_index(self):
+        return self.get_snapshot_and_index()[1]
+
+    @property
+    def snapshot_version(self):
+        """Versión actual del snapshot (avanza con cada recarga o parche)"""
+        return self.get_snapshot().version
+
+    def invalidate(self):
+        """Descarta el snapshot; se recarga (y se vuelve a publicar si es compartido) en la próxima búsqueda"""
+        with self._lock:
+            self.snapshot = None
+            self.spatial_index = None
+            self._mark_stale()
+
+    def update_parking_availability(self, parking_id, is_available, is_closed=None):
+        """Parchea en sitio el snapshot y el índice espacial sin recargar desde la BD"""
+        self.update_parking_availability_many([(parking_id, is_available)], is_closed)
+
+    def update_parking_availability_many(self, changes, is_closed=None):
+        """
+        Versión por lotes: aplica [(parking_id, is_available)] tomando el lock una sola vez
+        is_closed (cierre manual del operador) se aplica a todos si se indica
+        """
+        if self.shared_store is not None:
+            # Con snapshot compartido el parche debe caer en la generación vigente, la que leen los demás
+            self.get_snapshot_and_index()
+        with self._lock:
+            snapshot, index = self.snapshot, self.spatial_index
+            if snapshot is None:
+                return
+            for parking_id, is_available in changes:
+                row = snapshot.row_of(parking_id)
+                if row is None:
+                    # Parqueadero creado después de la carga: se recarga en la próxima búsqueda
+                    self.snapshot = None
+                    self._mark_stale()
+                    return
+                snapshot.set_availability(parking_id, is_available, is_closed)
+                if self._index_has_all:
+                    continue
+                if is_available:
+                    index.insert(parking_id, float(snapshot.latitude[row]), float(snapshot.longitude[row]))
+                else:
+                    index.remove(parking_id)
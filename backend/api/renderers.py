@@ -0,0 +1,18 @@
+from rest_framework.renderers import JSONRenderer
+
+from api.services import payloads
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer que copia el JSON precompilado de los resultados de búsqueda
+    (SearchPayload) y solo codifica sus campos por petición; cualquier otra
+    respuesta, o una con indentación pedida, se delega en JSONRenderer
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or not payloads.has_payload(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return payloads.render(data)
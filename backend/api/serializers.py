@@ -6,7 +6,7 @@ class ParkingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Parking
         fields = ['id', 'name', 'latitude', 'longitude', 'price_per_hour', 
-                  'is_available', 'capacity', 'features', 'created_at']
+                  'is_available', 'capacity', 'occupied_spaces', 'features', 'created_at']
 
 
 class SearchHistorySerializer(serializers.ModelSerializer):
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import math
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de celda (grados) del índice de suscripciones por área (~1.1 km)
+BBOX_CELL_SIZE_DEG = 0.01
+# Áreas que cubren más celdas se revisan en una lista aparte en lugar de indexarse
+MAX_BBOX_CELLS = 400
+
+
+class StreamSubscription:
+    """
+    Suscripción de un cliente al stream de disponibilidad (ids y/o área)
+    Los cambios pendientes se guardan por parking_id, así una ráfaga de cambios
+    del mismo parqueadero ocupa una sola entrada y solo se entrega el último
+    estado; si ese estado es el que el cliente ya conoce no se envía nada.
+    Si el cliente acumula más de max_pending parqueaderos sin leer se considera
+    lento y se desconecta (recibe un evento 'resync' para volver a consultar)
+    """
+
+    def __init__(self, parking_ids=None, bbox=None, max_pending=256, loop=None):
+        self.parking_ids = frozenset(parking_ids or ())
+        self.bbox = bbox  # (min_lat, min_lng, max_lat, max_lng)
+        self.max_pending = max_pending
+        self.loop = loop
+        self.ready = asyncio.Event()
+        self.pending = {}  # parking_id -> evento más reciente
+        self.known = {}  # parking_id -> último estado entregado al cliente
+        self.overflowed = False
+        self.closed = False
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def matches(self, parking_id, location):
+        if parking_id in self.parking_ids:
+            return True
+        if self.bbox is None or location is None:
+            return False
+        min_lat, min_lng, max_lat, max_lng = self.bbox
+        return min_lat <= location['lat'] <= max_lat and min_lng <= location['lng'] <= max_lng
+
+    def offer(self, event):
+        """Encola un cambio (desde cualquier hilo); retorna False si el cliente quedó desbordado"""
+        with self._lock:
+            if self.closed:
+                return True
+            wake = not self.pending
+            if event['parking_id'] in self.pending:
+                self.coalesced += 1
+            self.pending[event['parking_id']] = event
+            if len(self.pending) > self.max_pending:
+                self.overflowed = True
+                self.pending.clear()
+                wake = True
+        if wake:
+            self._wake()
+        return not self.overflowed
+
+    def _wake(self):
+        # Solo se despierta al cliente cuando su buffer pasa de vacío a no vacío
+        if self.loop is None:
+            self.ready.set()
+        else:
+            try:
+                self.loop.call_soon_threadsafe(self.ready.set)
+            except RuntimeError:
+                # El loop del cliente ya se cerró
+                self.closed = True
+
+    def drain(self):
+        """Cambios pendientes que el cliente aún no conoce, en orden de llegada"""
+        with self._lock:
+            self.ready.clear()
+            pending, self.pending = self.pending, {}
+        events = []
+        for parking_id, event in pending.items():
+            if self.known.get(parking_id) == event['is_available']:
+                self.coalesced += 1
+                continue
+            self.known[parking_id] = event['is_available']
+            events.append(event)
+        return events
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+
+class AvailabilityBroadcaster:
+    """
+    Reparte los cambios de disponibilidad del ParkingAvailabilityObserver a los
+    clientes conectados al stream. Las suscripciones por id se indexan por
+    parking_id y las de área por celdas de BBOX_CELL_SIZE_DEG, así publicar un
+    cambio solo toca a los clientes interesados. Publicar nunca bloquea: cada
+    cliente tiene su propio buffer acotado y coalescido (StreamSubscription)
+    """
+
+    def __init__(self, max_pending=256, locate=None):
+        self.max_pending = max_pending
+        # locate(parking_id) -> {'lat', 'lng'} cuando el evento no trae la ubicación
+        self.locate = locate
+        self._by_parking = {}
+        self._by_cell = {}
+        self._wide = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.coalesced = 0  # de clientes ya desconectados
+        self.dropped_clients = 0
+
+    @staticmethod
+    def _cell(lat, lng):
+        return math.floor(lat / BBOX_CELL_SIZE_DEG), math.floor(lng / BBOX_CELL_SIZE_DEG)
+
+    def _bbox_cells(self, bbox):
+        min_row, min_col = self._cell(bbox[0], bbox[1])
+        max_row, max_col = self._cell(bbox[2], bbox[3])
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > MAX_BBOX_CELLS:
+            return None
+        return [(row, col) for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)]
+
+    def subscribe(self, parking_ids=None, bbox=None, loop=None):
+        subscription = StreamSubscription(parking_ids, bbox, self.max_pending, loop)
+        with self._lock:
+            for parking_id in subscription.parking_ids:
+                self._by_parking.setdefault(parking_id, set()).add(subscription)
+            if bbox is not None:
+                cells = self._bbox_cells(bbox)
+                if cells is None:
+                    self._wide.add(subscription)
+                else:
+                    for cell in cells:
+                        self._by_cell.setdefault(cell, set()).add(subscription)
+        logger.debug("📶 STREAM: Cliente suscrito (%s ids, área: %s)", len(subscription.parking_ids), bbox)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            self.coalesced += subscription.coalesced
+            subscription.coalesced = 0
+            for parking_id in subscription.parking_ids:
+                subscribers = self._by_parking.get(parking_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_parking[parking_id]
+            if subscription.bbox is not None:
+                self._wide.discard(subscription)
+                for cell in self._bbox_cells(subscription.bbox) or ():
+                    subscribers = self._by_cell.get(cell)
+                    if subscribers is not None:
+                        subscribers.discard(subscription)
+                        if not subscribers:
+                            del self._by_cell[cell]
+
+    def publish(self, data):
+        """Callback del observer: {'parking_id', 'is_available', 'location'?}"""
+        parking_id = data['parking_id']
+        location = data.get('location')
+        event = {'parking_id': parking_id, 'is_available': bool(data['is_available'])}
+
+        if location is None and self.locate is not None and (self._by_cell or self._wide):
+            location = self.locate(parking_id)
+        with self._lock:
+            targets = set(self._by_parking.get(parking_id, ()))
+            if location is not None:
+                targets.update(self._by_cell.get(self._cell(location['lat'], location['lng']), ()))
+                targets.update(self._wide)
+
+        self.published += 1
+        for subscription in targets:
+            if subscription.matches(parking_id, location) and not subscription.offer(event):
+                self.dropped_clients += 1
+                logger.warning("📶 STREAM: Cliente lento desconectado (más de %s cambios sin leer)", self.max_pending)
+                self.unsubscribe(subscription)
+        return len(targets)
+
+    async def events(self, subscription, heartbeat_seconds=15.0):
+        """
+        Generador asíncrono de lotes de cambios para un cliente; retorna None
+        como latido si no hubo cambios en heartbeat_seconds
+        """
+        while not subscription.closed:
+            try:
+                await asyncio.wait_for(subscription.ready.wait(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if subscription.overflowed:
+                return
+            events = subscription.drain()
+            if events:
+                self.delivered += len(events)
+                yield events
+
+    def _subscriptions(self):
+        with self._lock:
+            subscriptions = set(self._wide)
+            for subscribers in self._by_parking.values():
+                subscriptions.update(subscribers)
+            for subscribers in self._by_cell.values():
+                subscriptions.update(subscribers)
+        return subscriptions
+
+    def stats(self):
+        """Clientes conectados y contadores de eventos publicados/entregados"""
+        subscriptions = self._subscriptions()
+        return {
+            'subscribers': len(subscriptions),
+            'published': self.published,
+            'delivered': self.delivered,
+            'coalesced': self.coalesced + sum(subscription.coalesced for subscription in subscriptions),
+            'dropped_clients': self.dropped_clients,
+        }
+
+
+def format_sse(event, data):
+    """Mensaje Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,93 @@
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+def parse_timestamp(value):
+    """Epoch en segundos o ISO 8601 -> datetime con zona horaria (ValueError si no es válido)"""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    parsed = parse_datetime(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise ValueError(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def apply_availability_updates(updates, batch_size=500):
+    """
+    Aplica en una sola transacción lecturas de sensores
+    [(parking_id, is_available, occupied_count, timestamp)] donde is_available u
+    occupied_count puede ser None (con occupied_count se guardan los cupos ocupados
+    y está disponible si hay cupo). Un parqueadero cerrado por el operador
+    (is_closed) sigue no disponible aunque el sensor reporte cupo.
+
+    - Por parqueadero solo cuenta la lectura más reciente del lote
+    - Las lecturas anteriores a la última aplicada (availability_updated_at) se descartan
+    - Se guarda con un único bulk_update
+
+    Retorna un dict con los contadores, los cambios efectivos de disponibilidad
+    ({'parking_id', 'is_available', 'previous_status', 'location'}) para notificar
+    y los cupos ocupados guardados ([(parking_id, ocupados)])
+    """
+    from api.models import Parking
+
+    latest = {}
+    for parking_id, is_available, occupied_count, timestamp in updates:
+        current = latest.get(parking_id)
+        if current is None or timestamp >= current[2]:
+            latest[parking_id] = (is_available, occupied_count, timestamp)
+
+    changes = []
+    occupancy = []
+    to_save = []
+    found = set()
+    stale = 0
+    now = timezone.now()
+    with transaction.atomic():
+        parkings = (
+            Parking.objects.select_for_update()
+            .filter(id__in=list(latest))
+            .only('id', 'latitude', 'longitude', 'capacity', 'occupied_spaces',
+                  'is_available', 'is_closed', 'availability_updated_at')
+        )
+        for parking in parkings:
+            found.add(parking.id)
+            is_available, occupied_count, timestamp = latest[parking.id]
+            if parking.availability_updated_at is not None and timestamp <= parking.availability_updated_at:
+                stale += 1
+                continue
+            if is_available is None:
+                parking.occupied_spaces = min(parking.capacity, max(0, occupied_count))
+                occupancy.append((parking.id, parking.occupied_spaces))
+                is_available = parking.occupied_spaces < parking.capacity
+            is_available = is_available and not parking.is_closed
+            if is_available != parking.is_available:
+                changes.append({
+                    'parking_id': parking.id,
+                    'is_available': is_available,
+                    'previous_status': parking.is_available,
+                    'location': {'lat': parking.latitude, 'lng': parking.longitude}
+                })
+            parking.is_available = is_available
+            parking.availability_updated_at = timestamp
+            parking.updated_at = now
+            to_save.append(parking)
+        Parking.objects.bulk_update(
+            to_save, ['is_available', 'occupied_spaces', 'availability_updated_at', 'updated_at'],
+            batch_size=batch_size
+        )
+
+    return {
+        'applied': len(to_save),
+        'changed': changes,
+        'occupancy': occupancy,
+        'stale': stale,
+        'superseded': len(updates) - len(latest),
+        'not_found': sorted(set(latest) - found),
+    }
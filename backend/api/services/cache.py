@@ -0,0 +1,117 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class LRUCache:
+    """
+    Caché acotado con expulsión LRU, expiración por TTL e índice inverso
+    de etiquetas (p. ej. ids de parqueadero) para invalidaciones precisas
+    Con max_bytes también se acota la memoria según el tamaño declarado en set();
+    ttl_seconds=None desactiva la expiración
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=30, clock=time.monotonic, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (value, expires_at, tags, size)
+        self._keys_by_tag = {}
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, count=False) is not None
+
+    def get(self, key, default=None, count=True):
+        """Retorna el valor vigente para key y lo marca como usado recientemente"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= self.clock():
+                self._discard(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                if count:
+                    self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, tags=(), size=0):
+        """Guarda value bajo key asociado a las etiquetas indicadas (size: bytes aproximados)"""
+        tags = frozenset(tags)
+        expires_at = self.clock() + self.ttl_seconds if self.ttl_seconds is not None else float('inf')
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (value, expires_at, tags, size)
+            self.total_bytes += size
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self.total_bytes > self.max_bytes and len(self._entries) > 1):
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _discard(self, key):
+        _, _, tags, size = self._entries.pop(key)
+        self.total_bytes -= size
+        for tag in tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def invalidate_tag(self, tag):
+        """Expulsa solo las entradas asociadas a la etiqueta; retorna cuántas"""
+        with self._lock:
+            keys = list(self._keys_by_tag.get(tag, ()))
+            for key in keys:
+                self._discard(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def invalidate_where(self, predicate):
+        """Expulsa las entradas para las que predicate(key, value) es verdadero"""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if predicate(key, entry[0])]
+            for key in keys:
+                self._discard(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._keys_by_tag.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """Contadores de uso del caché"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+        }
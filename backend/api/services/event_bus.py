@@ -0,0 +1,185 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _Subscriber:
+    """Un handler con sus colas acotadas (una por shard) y sus hilos de entrega"""
+
+    def __init__(self, bus, name, event, handler, shards):
+        self.bus = bus
+        self.name = name
+        self.event = event
+        self.handler = handler
+        self.queues = [queue.Queue(maxsize=bus.max_queue) for _ in range(shards)]
+        self.workers = []
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self.dropped = 0
+        self._start_lock = threading.Lock()
+
+    def offer(self, key, data):
+        # El mismo key siempre cae en el mismo shard: sus eventos se entregan en orden
+        shard = self.queues[hash(key) % len(self.queues)] if key is not None else self.queues[0]
+        if not self.workers:
+            self._start()
+        try:
+            shard.put_nowait(data)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _start(self):
+        with self._start_lock:
+            if not self.workers:
+                workers = [
+                    threading.Thread(
+                        target=self._run, args=(shard,), name=f'event-bus-{self.name}-{i}', daemon=True
+                    )
+                    for i, shard in enumerate(self.queues)
+                ]
+                for worker in workers:
+                    worker.start()
+                self.workers = workers
+
+    def _run(self, shard):
+        while True:
+            data = shard.get()
+            try:
+                if data is _STOP:
+                    return
+                self.deliver(data)
+            finally:
+                shard.task_done()
+
+    def deliver(self, data):
+        """Llama al handler reintentando con backoff exponencial; nunca propaga el error"""
+        for attempt in range(self.bus.max_retries + 1):
+            try:
+                self.handler(data)
+                self.delivered += 1
+                return True
+            except Exception:
+                if attempt == self.bus.max_retries:
+                    self.failed += 1
+                    logger.exception(
+                        "🚌 EVENT BUS: '%s' falló tras %s intentos (evento '%s')",
+                        self.name, attempt + 1, self.event
+                    )
+                    return False
+                self.retried += 1
+                time.sleep(self.bus.retry_backoff * (2 ** attempt))
+
+    def stats(self):
+        return {
+            'event': self.event,
+            'pending': sum(shard.qsize() for shard in self.queues),
+            'delivered': self.delivered,
+            'retried': self.retried,
+            'failed': self.failed,
+            'dropped': self.dropped,
+        }
+
+
+class EventBus:
+    """
+    Bus de eventos en proceso para el SearchMediator
+    publish() solo encola el evento en la cola acotada de cada suscriptor y
+    retorna; hilos en segundo plano llaman a los handlers, así un suscriptor
+    lento (webhook, analytics) no suma latencia a la petición.
+
+    - Cada suscriptor tiene sus propias colas: uno lento no retrasa a los demás
+    - Los eventos con el mismo key (parking_id) se entregan en orden de publicación
+    - Los errores se reintentan max_retries veces con backoff exponencial
+    - Con la cola llena el evento se descarta para ese suscriptor (se cuenta)
+    - synchronous=True entrega dentro de publish() (tests, scripts)
+    """
+
+    def __init__(self, max_queue=10_000, max_retries=3, retry_backoff=0.1, synchronous=False):
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.synchronous = synchronous
+        self._subscribers = {}  # evento -> [_Subscriber]
+        self._lock = threading.Lock()
+        self._closed = False
+        self.published = 0
+        atexit.register(self.close)
+
+    def subscribe(self, event, handler, name=None, shards=1):
+        """
+        Registra handler(data) para el evento
+        shards > 1 entrega en paralelo eventos de distintos keys (mismo key, mismo orden)
+        """
+        subscriber = _Subscriber(self, name or getattr(handler, '__name__', 'handler'), event, handler, shards)
+        with self._lock:
+            # Copia al escribir: publish() recorre la lista sin tomar el lock
+            self._subscribers[event] = self._subscribers.get(event, []) + [subscriber]
+        logger.debug("🚌 EVENT BUS: '%s' suscrito a '%s'", subscriber.name, event)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            remaining = [s for s in self._subscribers.get(subscriber.event, []) if s is not subscriber]
+            self._subscribers[subscriber.event] = remaining
+        self._stop(subscriber)
+
+    def publish(self, event, data=None, key=None):
+        """Encola el evento para sus suscriptores; retorna a cuántos se encoló"""
+        self.published += 1
+        accepted = 0
+        for subscriber in self._subscribers.get(event, ()):
+            if self.synchronous or self._closed:
+                subscriber.deliver(data)
+                accepted += 1
+            elif subscriber.offer(key, data):
+                accepted += 1
+        return accepted
+
+    def flush(self):
+        """Espera a que se entreguen los eventos encolados hasta ahora"""
+        with self._lock:
+            subscribers = [s for subscribers in self._subscribers.values() for s in subscribers]
+        for subscriber in subscribers:
+            for shard in subscriber.queues:
+                shard.join()
+
+    @staticmethod
+    def _stop(subscriber, timeout=5):
+        for shard in subscriber.queues:
+            try:
+                shard.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+        for worker in subscriber.workers:
+            worker.join(timeout)
+
+    def close(self, timeout=5):
+        """Entrega lo pendiente y detiene los hilos (se llama al salir del proceso)"""
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            subscribers = [s for subscribers in self._subscribers.values() for s in subscribers]
+        for subscriber in subscribers:
+            if subscriber.workers:
+                self._stop(subscriber, timeout)
+
+    def stats(self):
+        """Contadores por suscriptor (pendientes, entregados, reintentos, fallos, descartes)"""
+        with self._lock:
+            subscribers = [s for subscribers in self._subscribers.values() for s in subscribers]
+        return {
+            'synchronous': self.synchronous,
+            'published': self.published,
+            'subscribers': {subscriber.name: subscriber.stats() for subscriber in subscribers},
+        }
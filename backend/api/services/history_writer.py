@@ -0,0 +1,194 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+
+DROP_NEWEST = 'drop_newest'
+DROP_OLDEST = 'drop_oldest'
+BLOCK = 'block'
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class SearchHistoryWriter:
+    """
+    Escritura diferida (write-behind) del historial de búsquedas
+    Las peticiones encolan registros en un buffer acotado y un hilo en segundo
+    plano los guarda con bulk_create al juntar batch_size registros o al pasar
+    flush_interval segundos, así la latencia de búsqueda no depende del I/O de BD.
+
+    Con el buffer lleno se aplica drop_policy:
+    - drop_newest: se descarta el registro nuevo
+    - drop_oldest: se descarta el registro más antiguo aún no guardado
+    - block: la petición espera hasta block_timeout y luego descarta el nuevo
+
+    El timestamp (auto_now_add) se asigna al guardar, hasta flush_interval después
+    de la búsqueda; el orden de los registros se conserva
+    """
+
+    def __init__(self, max_pending=10_000, batch_size=200, flush_interval=1.0,
+                 drop_policy=DROP_NEWEST, block_timeout=0.05, synchronous=False):
+        if drop_policy not in (DROP_NEWEST, DROP_OLDEST, BLOCK):
+            raise ValueError(f"drop_policy inválida: {drop_policy}")
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+        self.synchronous = synchronous
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._pending = []
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._worker = None
+        self._closed = False
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def record(self, user_id, search_latitude, search_longitude, result_parking_id):
+        """Encola un registro de historial; retorna False si se descartó"""
+        return self.record_many([(user_id, search_latitude, search_longitude, result_parking_id)]) == 1
+
+    def record_many(self, records):
+        """Encola tuplas (user_id, lat, lng, parking_id); retorna cuántas se aceptaron"""
+        if self.synchronous or self._closed:
+            self._write(list(records))
+            return len(records)
+
+        self._ensure_worker()
+        accepted = 0
+        for record in records:
+            if self._offer(record):
+                accepted += 1
+        self.enqueued += accepted
+        return accepted
+
+    def _offer(self, record):
+        try:
+            if self.drop_policy == BLOCK:
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            pass
+
+        if self.drop_policy == DROP_OLDEST:
+            try:
+                self._queue.get_nowait()
+                self.dropped += 1
+                self._queue.put_nowait(record)
+                return True
+            except (queue.Empty, queue.Full):
+                pass
+        self.dropped += 1
+        return False
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(
+                    target=self._run, name='search-history-writer', daemon=True
+                )
+                self._worker.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        from django.db import connection
+
+        deadline = None
+        try:
+            while True:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    record = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    record = None
+                if record is _STOP:
+                    break
+
+                with self._write_lock:
+                    if record is not None:
+                        self._pending.append(record)
+                        if deadline is None:
+                            deadline = time.monotonic() + self.flush_interval
+                    if self._pending and (len(self._pending) >= self.batch_size
+                                          or time.monotonic() >= deadline):
+                        self._write_pending()
+                    if not self._pending:
+                        deadline = None
+        finally:
+            connection.close()
+
+    def _write_pending(self):
+        batch, self._pending = self._pending, []
+        self._write(batch)
+
+    def _write(self, batch):
+        if not batch:
+            return
+        from api.models import SearchHistory
+        try:
+            SearchHistory.objects.bulk_create([
+                SearchHistory(
+                    user_id=user_id,
+                    search_latitude=latitude,
+                    search_longitude=longitude,
+                    result_parking_id=parking_id
+                )
+                for user_id, latitude, longitude, parking_id in batch
+            ], batch_size=self.batch_size)
+            self.written += len(batch)
+            self.flushes += 1
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("📝 HISTORY: Error al guardar %s registros", len(batch))
+
+    def flush(self):
+        """Guarda en el hilo actual todo lo encolado hasta ahora"""
+        with self._write_lock:
+            while True:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    self._queue.put_nowait(_STOP)
+                    break
+                self._pending.append(record)
+            self._write_pending()
+
+    def close(self, timeout=5):
+        """Detiene el hilo y guarda los registros pendientes (se llama al salir del proceso)"""
+        if self._closed:
+            return
+        self._closed = True
+        worker = self._worker
+        if worker is not None:
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+            except queue.Full:
+                pass
+            worker.join(timeout)
+        self.flush()
+
+    def stats(self):
+        """Contadores del buffer de historial"""
+        return {
+            'pending': self._queue.qsize() + len(self._pending),
+            'max_pending': self.max_pending,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'flushes': self.flushes,
+        }
@@ -0,0 +1,208 @@
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Cupos por nivel/letra en la etiqueta de un cupo (A-01 ... A-25, B-01, ...)
+SPACES_PER_LEVEL = 25
+
+
+def space_label(index):
+    """Etiqueta legible del cupo número index (desde 0)"""
+    level, number = divmod(index, SPACES_PER_LEVEL)
+    return f"{chr(ord('A') + level % 26)}-{number + 1:02d}"
+
+
+class OccupancyCounters:
+    """
+    Contadores vivos de cupos ocupados por parqueadero
+    Las entradas y salidas ajustan en memoria la columna occupied del snapshot del
+    ParkingDataManager (O(1) bajo un lock) y acumulan un delta por parqueadero que
+    un hilo en segundo plano escribe cada flush_interval segundos con UPDATE
+    occupied_spaces = occupied_spaces + delta. Al escribir deltas y no valores
+    absolutos, varios workers pueden contar el mismo parqueadero sin pisarse: el
+    delta se acumula sin acotar (la copia local del worker puede estar atrasada) y
+    solo el valor resultante se acota a [0, capacidad], en memoria y en la BD.
+
+    La disponibilidad se deriva de ocupados < capacidad salvo que el operador haya
+    cerrado el parqueadero (is_closed), que los contadores nunca reabren.
+    on_change(parking_id, occupied, capacity, availability_changed) se llama
+    después de cada ajuste que cambia los ocupados
+    """
+
+    def __init__(self, data_manager, on_change=None, flush_interval=1.0, synchronous=False):
+        self.data_manager = data_manager
+        self.on_change = on_change
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.lock = threading.Lock()
+        self._deltas = {}
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._closed = False
+        self.events = 0
+        self.flushes = 0
+        self.failed = 0
+        data_manager.occupancy = self
+
+    def enter(self, parking_id, count=1):
+        return self.adjust(parking_id, count)
+
+    def exit(self, parking_id, count=1):
+        return self.adjust(parking_id, -count)
+
+    def adjust(self, parking_id, delta):
+        """
+        Suma delta a los ocupados (el valor en memoria se acota a [0, capacidad];
+        a la BD va el delta completo)
+        Retorna (ocupados, capacidad) o None si el parqueadero no existe
+        """
+        snapshot = self.data_manager.get_snapshot()
+        with self.lock:
+            # El snapshot pudo recargarse mientras se esperaba el lock
+            snapshot = self.data_manager.snapshot or snapshot
+            row = snapshot.row_of(parking_id)
+            if row is None:
+                return None
+            capacity = int(snapshot.capacity[row])
+            closed = bool(snapshot.is_closed[row])
+            before = int(snapshot.occupied[row])
+            occupied = min(capacity, max(0, before + delta))
+            snapshot.occupied[row] = occupied
+            if delta:
+                self._deltas[parking_id] = self._deltas.get(parking_id, 0) + delta
+            self.events += 1
+        if delta:
+            self._after_change(parking_id, before, occupied, capacity, closed)
+        return occupied, capacity
+
+    def set(self, parking_id, occupied):
+        """
+        Fija los ocupados de un parqueadero ya guardados en la BD (lectura absoluta
+        de un sensor): descarta el delta pendiente y parchea el snapshot. No llama a
+        on_change: quien guardó la lectura notifica el cambio
+        """
+        snapshot = self.data_manager.get_snapshot()
+        with self.lock:
+            snapshot = self.data_manager.snapshot or snapshot
+            row = snapshot.row_of(parking_id)
+            if row is None:
+                return None
+            capacity = int(snapshot.capacity[row])
+            occupied = min(capacity, max(0, occupied))
+            snapshot.occupied[row] = occupied
+            self._deltas.pop(parking_id, None)
+        return occupied, capacity
+
+    def _after_change(self, parking_id, before, occupied, capacity, closed):
+        # Aunque la copia local no cambie (ya acotada), el delta debe llegar a la BD
+        if self.synchronous:
+            self.flush()
+        else:
+            self._ensure_worker()
+        if self.on_change is not None and occupied != before:
+            availability_changed = not closed and (before < capacity) != (occupied < capacity)
+            self.on_change(parking_id, occupied, capacity, availability_changed)
+
+    def apply_pending(self, snapshot):
+        """
+        Aplica a un snapshot recién cargado los deltas aún no escritos en la BD
+        (el ParkingDataManager lo llama al recargar, con self.lock tomado)
+        Retorna [(parking_id, is_available)] de los que cambiaron de disponibilidad
+        """
+        changed = []
+        for parking_id, delta in self._deltas.items():
+            row = snapshot.row_of(parking_id)
+            if row is not None:
+                capacity = int(snapshot.capacity[row])
+                occupied = min(capacity, max(0, int(snapshot.occupied[row]) + delta))
+                snapshot.occupied[row] = occupied
+                is_available = occupied < capacity and not snapshot.is_closed[row]
+                if bool(snapshot.is_available[row]) != is_available:
+                    changed.append((parking_id, is_available))
+                snapshot.is_available[row] = is_available
+        return changed
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='occupancy-writer', daemon=True)
+                self._worker.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        from django.db import connection
+
+        try:
+            while not self._closed:
+                self._wakeup.wait(self.flush_interval)
+                self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Escribe en la BD los deltas acumulados (un UPDATE por valor de delta distinto)"""
+        from django.db import transaction
+        from django.db.models import Case, F, Q, Value, When
+        from django.db.models.functions import Greatest, Least
+        from django.utils import timezone
+        from api.models import Parking
+
+        with self._flush_lock:
+            with self.lock:
+                deltas, self._deltas = self._deltas, {}
+            by_delta = {}
+            for parking_id, delta in deltas.items():
+                if delta:
+                    by_delta.setdefault(delta, []).append(parking_id)
+            if not by_delta:
+                return 0
+            now = timezone.now()
+            try:
+                with transaction.atomic():
+                    for delta, parking_ids in by_delta.items():
+                        # Las expresiones del SET usan los valores previos de la fila; un
+                        # parqueadero cerrado por el operador sigue no disponible
+                        Parking.objects.filter(id__in=parking_ids).update(
+                            occupied_spaces=Greatest(Value(0), Least(F('capacity'), F('occupied_spaces') + delta)),
+                            is_available=Case(
+                                When(Q(is_closed=False, occupied_spaces__lt=F('capacity') - delta), then=Value(True)),
+                                default=Value(False)
+                            ),
+                            updated_at=now
+                        )
+                self.flushes += 1
+            except Exception:
+                self.failed += len(deltas)
+                logger.exception("🚗 OCCUPANCY: Error al guardar %s contadores", len(deltas))
+                with self.lock:
+                    for parking_id, delta in deltas.items():
+                        self._deltas[parking_id] = self._deltas.get(parking_id, 0) + delta
+                return 0
+            return len(deltas)
+
+    def close(self):
+        """Detiene el hilo y escribe los deltas pendientes (se llama al salir del proceso)"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join(5)
+        self.flush()
+
+    def stats(self):
+        """Eventos de entrada/salida y escrituras a la BD"""
+        with self.lock:
+            pending = len(self._deltas)
+        return {
+            'events': self.events,
+            'pending_parkings': pending,
+            'flushes': self.flushes,
+            'failed': self.failed,
+        }
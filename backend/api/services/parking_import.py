@@ -0,0 +1,267 @@
+import csv
+from decimal import Decimal, InvalidOperation
+import hashlib
+import json
+import os
+
+# Campos del archivo -> campo de Parking (se aceptan nombres alternativos comunes)
+ALIASES = {
+    'external_id': ('external_id', 'id', 'code', 'codigo'),
+    'name': ('name', 'nombre'),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lng', 'lon'),
+    'price_per_hour': ('price_per_hour', 'price', 'precio'),
+    'capacity': ('capacity', 'capacidad'),
+    'occupied_spaces': ('occupied_spaces', 'occupied', 'ocupados'),
+    'is_available': ('is_available', 'available', 'disponible'),
+    'features': ('features', 'caracteristicas'),
+}
+# Campos que un reimporte sobrescribe (created_at se conserva)
+UPDATE_FIELDS = [
+    'name', 'latitude', 'longitude', 'price_per_hour', 'capacity',
+    'occupied_spaces', 'is_available', 'features', 'updated_at'
+]
+# Errores de validación que se guardan en el resultado (el resto solo se cuenta)
+MAX_REPORTED_ERRORS = 100
+
+_READ_SIZE = 64 * 1024
+_TRUE = {'1', 'true', 't', 'yes', 'y', 'si', 'sí'}
+_FALSE = {'0', 'false', 'f', 'no', 'n'}
+
+
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    return {
+        '.csv': 'csv', '.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl',
+        '.geojson': 'geojson', '.geojsonl': 'jsonl',
+    }.get(extension)
+
+
+def _iter_json_array(source, buffer=''):
+    """
+    Recorre un arreglo JSON elemento por elemento leyendo bloques de _READ_SIZE:
+    en memoria solo queda el elemento actual, sin importar el tamaño del archivo
+    """
+    decoder = json.JSONDecoder()
+    position = 0
+    started = False
+    while True:
+        # Saltar espacios, la apertura del arreglo y las comas entre elementos
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,' + ('' if started else '['):
+                if buffer[position] == '[':
+                    started = True
+                position += 1
+            if position < len(buffer):
+                break
+            chunk = source.read(_READ_SIZE)
+            if not chunk:
+                raise ValueError('JSON incompleto: falta el cierre del arreglo')
+            buffer, position = chunk, 0
+        if not started:
+            raise ValueError('Se esperaba un arreglo JSON')
+        if buffer[position] == ']':
+            return
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                chunk = source.read(_READ_SIZE)
+                if not chunk:
+                    raise
+                buffer, position = buffer[position:] + chunk, 0
+        yield value
+        position = end
+
+
+def _iter_geojson_features(source):
+    """Features de un FeatureCollection sin cargar el archivo completo"""
+    buffer = ''
+    while True:
+        index = buffer.find('"features"')
+        if index >= 0:
+            colon = buffer.find(':', index)
+            if colon >= 0:
+                yield from _iter_json_array(source, buffer[colon + 1:])
+                return
+        chunk = source.read(_READ_SIZE)
+        if not chunk:
+            raise ValueError('GeoJSON sin "features"')
+        # Se conserva el final por si la clave quedó partida entre dos bloques
+        buffer = buffer[-16:] + chunk
+
+
+def iter_records(source, file_format):
+    """
+    Registros (número, dict) de un archivo abierto en modo texto, en streaming
+    - csv: una fila por registro (features separadas por ';' o '|')
+    - json: arreglo de objetos; jsonl: un objeto por línea
+    - geojson: FeatureCollection de puntos (properties + coordinates [lng, lat])
+    """
+    if file_format == 'csv':
+        for number, row in enumerate(csv.DictReader(source), start=1):
+            yield number, row
+    elif file_format == 'jsonl':
+        for number, line in enumerate(source, start=1):
+            if line.strip():
+                yield number, json.loads(line)
+    elif file_format == 'json':
+        yield from enumerate(_iter_json_array(source), start=1)
+    elif file_format == 'geojson':
+        yield from enumerate(_iter_geojson_features(source), start=1)
+    else:
+        raise ValueError(f'Formato no soportado: {file_format}')
+
+
+def _field(record, field):
+    for alias in ALIASES[field]:
+        value = record.get(alias)
+        if value is not None and value != '':
+            return value
+    return None
+
+
+def _flatten(record):
+    """Un Feature GeoJSON (también en jsonl) se convierte en un registro plano"""
+    if record.get('type') != 'Feature':
+        return record
+    flat = dict(record.get('properties') or {})
+    geometry = record.get('geometry') or {}
+    if geometry.get('type') != 'Point':
+        raise ValueError('La geometría debe ser un Point')
+    flat['longitude'], flat['latitude'] = geometry['coordinates'][:2]
+    if 'id' in record and _field(flat, 'external_id') is None:
+        flat['external_id'] = record['id']
+    return flat
+
+
+def _number(value, field, cast, minimum=None, maximum=None):
+    try:
+        number = cast(value)
+    except (TypeError, ValueError, InvalidOperation):
+        raise ValueError(f'{field} no es numérico: {value!r}')
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        raise ValueError(f'{field} fuera de rango: {value!r}')
+    return number
+
+
+def normalize(record):
+    """Registro del archivo -> kwargs de Parking; ValueError con el motivo si no es válido"""
+    if not isinstance(record, dict):
+        raise ValueError('El registro no es un objeto')
+    record = _flatten(record)
+
+    name = str(_field(record, 'name') or '').strip()
+    if not name or len(name) > 200:
+        raise ValueError('name es obligatorio (máximo 200 caracteres)')
+    for required in ('latitude', 'longitude', 'price_per_hour', 'capacity'):
+        if _field(record, required) is None:
+            raise ValueError(f'Falta {required}')
+    latitude = _number(_field(record, 'latitude'), 'latitude', float, -90, 90)
+    longitude = _number(_field(record, 'longitude'), 'longitude', float, -180, 180)
+    price = _number(str(_field(record, 'price_per_hour')), 'price_per_hour', Decimal, 0, Decimal('99999999.99'))
+    if price.as_tuple().exponent < -2:
+        raise ValueError('price_per_hour admite máximo 2 decimales')
+    capacity = _number(_field(record, 'capacity'), 'capacity', int, 0)
+    occupied = _field(record, 'occupied_spaces')
+    occupied = _number(occupied, 'occupied_spaces', int, 0, capacity) if occupied is not None else 0
+
+    is_available = _field(record, 'is_available')
+    if is_available is None:
+        is_available = occupied < capacity
+    elif not isinstance(is_available, bool):
+        text = str(is_available).strip().lower()
+        if text not in _TRUE | _FALSE:
+            raise ValueError(f'is_available no es booleano: {is_available!r}')
+        is_available = text in _TRUE
+
+    features = _field(record, 'features') or []
+    if isinstance(features, str):
+        features = [feature.strip() for feature in features.replace('|', ';').split(';') if feature.strip()]
+    if not isinstance(features, list) or not all(isinstance(feature, str) for feature in features):
+        raise ValueError('features debe ser una lista de textos')
+
+    # Sin identificador de origen se usa nombre + coordenadas: reimportar el mismo archivo no duplica
+    external_id = _field(record, 'external_id')
+    if external_id is None:
+        key = f'{name}@{latitude:.6f},{longitude:.6f}'.encode()
+        external_id = 'auto:' + hashlib.sha1(key).hexdigest()
+    external_id = str(external_id)
+    if len(external_id) > 64:
+        raise ValueError('external_id admite máximo 64 caracteres')
+
+    return {
+        'external_id': external_id,
+        'name': name,
+        'latitude': latitude,
+        'longitude': longitude,
+        'price_per_hour': price,
+        'capacity': capacity,
+        'occupied_spaces': occupied,
+        'is_available': bool(is_available),
+        'features': features,
+    }
+
+
+def _upsert(batch):
+    from django.db import transaction
+    from api.models import Parking
+
+    # Un mismo external_id dos veces en el lote: gana el último (ON CONFLICT no admite repetidos)
+    unique = list({data['external_id']: data for data in batch}.values())
+    with transaction.atomic():
+        Parking.objects.bulk_create(
+            [Parking(**data) for data in unique],
+            update_conflicts=True,
+            unique_fields=['external_id'],
+            update_fields=UPDATE_FIELDS
+        )
+    return len(unique)
+
+
+def import_parkings(records, batch_size=2_000, dry_run=False, max_errors=None, progress=None):
+    """
+    Valida y guarda (upsert por external_id) registros [(número, dict)] por lotes de
+    batch_size, cada uno en su transacción; la memoria depende del lote y no del total.
+    progress(resultado) se llama después de cada lote.
+    Retorna {'read', 'imported', 'invalid', 'batches', 'errors': [(número, motivo)]}
+    """
+    result = {'read': 0, 'imported': 0, 'invalid': 0, 'batches': 0, 'errors': []}
+    batch = []
+
+    def flush():
+        if batch and not dry_run:
+            result['imported'] += _upsert(batch)
+        elif batch:
+            result['imported'] += len(batch)
+        result['batches'] += 1
+        batch.clear()
+        if progress is not None:
+            progress(result)
+
+    for number, record in records:
+        result['read'] += 1
+        try:
+            batch.append(normalize(record))
+        except (ValueError, KeyError, IndexError, TypeError) as error:
+            result['invalid'] += 1
+            if len(result['errors']) < MAX_REPORTED_ERRORS:
+                result['errors'].append((number, str(error)))
+            if max_errors is not None and result['invalid'] > max_errors:
+                raise ValueError(f'Más de {max_errors} registros inválidos; importación detenida en {number}')
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return result
+
+
+def open_records(path, file_format=None):
+    """Abre el archivo y retorna (archivo, iterador de registros)"""
+    file_format = file_format or detect_format(path)
+    if file_format is None:
+        raise ValueError('No se pudo deducir el formato; use --format')
+    source = open(path, encoding='utf-8-sig', newline='')
+    return source, iter_records(source, file_format)
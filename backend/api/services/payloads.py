@@ -0,0 +1,121 @@
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+# Campos calculados en cada búsqueda; el resto del resultado es fijo por parqueadero
+DYNAMIC_FIELDS = (
+    'distance_km', 'route', 'space', 'estimated_time_minutes', 'occupied_spaces', 'free_spaces'
+)
+
+
+def dumps(data):
+    """JSON compacto y UTF-8 igual al de JSONRenderer de DRF (COMPACT_JSON, UNICODE_JSON, STRICT_JSON)"""
+    text = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+    # Separadores de línea de Unicode no válidos en JavaScript (igual que DRF)
+    return text.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+class PayloadFragment:
+    """
+    Parte fija del resultado de búsqueda de un parqueadero, precompilada una vez
+    por fila del snapshot: el dict (data) y su JSON ya codificado (sin llaves)
+    """
+
+    __slots__ = ('id', 'name', 'latitude', 'longitude', 'capacity', 'data', 'json', '_occupied', '_row')
+
+    def __init__(self, parking_id, name, latitude, longitude, price_per_hour, is_available,
+                 capacity, features, reviews_count, occupied=None, row=None):
+        self.id = parking_id
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.capacity = capacity
+        self.data = {
+            'id': parking_id,
+            'name': name,
+            'latitude': latitude,
+            'longitude': longitude,
+            'location': {'lat': latitude, 'lng': longitude},
+            'price_per_hour': price_per_hour,
+            'is_available': is_available,
+            'features': features,
+            'estimated_cost': price_per_hour * 2,
+            'rating': round(4 + (hash(name) % 10) / 10, 1),
+            'capacity': capacity,
+            'reviews_count': reviews_count,
+        }
+        self.json = dumps(self.data)[1:-1]
+        # Los cupos ocupados cambian sin nueva versión del snapshot: se leen en vivo de su columna
+        self._occupied = occupied
+        self._row = row
+
+    @property
+    def occupied_spaces(self):
+        return int(self._occupied[self._row]) if self._occupied is not None else 0
+
+    @classmethod
+    def from_snapshot(cls, snapshot, row):
+        return cls(
+            int(snapshot.ids[row]),
+            snapshot.names[row],
+            float(snapshot.latitude[row]),
+            float(snapshot.longitude[row]),
+            round(float(snapshot.price_per_hour[row]), 2),
+            bool(snapshot.is_available[row]),
+            int(snapshot.capacity[row]),
+            snapshot.features[row],
+            int(snapshot.reviews_count[row]),
+            occupied=snapshot.occupied,
+            row=row,
+        )
+
+
+class SearchPayload(dict):
+    """
+    Resultado de búsqueda: un dict normal para el resto del código (proxy, vistas)
+    que además conserva su PayloadFragment, así FastJSONRenderer solo codifica
+    los DYNAMIC_FIELDS y copia el JSON precompilado de la parte fija
+    """
+
+    __slots__ = ('fragment',)
+
+    def __init__(self, fragment, dynamic):
+        super().__init__(fragment.data)
+        self.update(dynamic)
+        self.fragment = fragment
+
+    def is_pristine(self):
+        """Los campos fijos no se modificaron después de crear el resultado"""
+        static = self.fragment.data
+        if len(self) != len(static) + len(DYNAMIC_FIELDS):
+            return False
+        return all(self.get(key) is value for key, value in static.items())
+
+    def to_json(self):
+        if not self.is_pristine():
+            return dumps(dict(self))
+        return b'{' + self.fragment.json + b',' + dumps({key: self[key] for key in DYNAMIC_FIELDS})[1:]
+
+
+def has_payload(data, depth=3):
+    """data es un SearchPayload o los contiene (en listas o dicts anidados hasta depth niveles)"""
+    if isinstance(data, SearchPayload):
+        return True
+    if depth == 0:
+        return False
+    if isinstance(data, dict):
+        data = data.values()
+    elif not isinstance(data, list):
+        return False
+    return any(has_payload(item, depth - 1) for item in data)
+
+
+def render(data):
+    """JSON de data usando los fragmentos precompilados de los SearchPayload que contenga"""
+    if isinstance(data, SearchPayload):
+        return data.to_json()
+    if isinstance(data, list):
+        return b'[' + b','.join(render(item) for item in data) + b']'
+    if isinstance(data, dict):
+        return b'{' + b','.join(dumps(str(key)) + b':' + render(value) for key, value in data.items()) + b'}'
+    return dumps(data)
@@ -0,0 +1,51 @@
+"""
+Codificación de polilíneas de Google (Encoded Polyline Algorithm Format)
+Una lista de puntos lat/lng se guarda como texto ASCII compacto con 5 decimales
+de precisión (~1 m): cada coordenada es un delta respecto al punto anterior
+"""
+
+PRECISION = 1e5
+
+
+def _encode_value(value, chunks):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+
+
+def encode(points):
+    """[{'lat', 'lng'}] -> polilínea codificada"""
+    chunks = []
+    prev_lat = prev_lng = 0
+    for point in points:
+        lat = round(point['lat'] * PRECISION)
+        lng = round(point['lng'] * PRECISION)
+        _encode_value(lat - prev_lat, chunks)
+        _encode_value(lng - prev_lng, chunks)
+        prev_lat, prev_lng = lat, lng
+    return ''.join(chunks)
+
+
+def decode(polyline):
+    """Polilínea codificada -> [{'lat', 'lng'}]"""
+    points = []
+    index = lat = lng = 0
+    length = len(polyline)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(polyline[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append({'lat': lat / PRECISION, 'lng': lng / PRECISION})
+    return points
@@ -0,0 +1,202 @@
+from collections import OrderedDict
+import sqlite3
+import threading
+import time
+
+
+class TokenBucketRateLimiter:
+    """
+    Rate limiting por token bucket, indexado por usuario o IP del cliente
+    Cada clave tiene `capacity` fichas que se recargan a `refill_per_second`;
+    cada petición consume una. La verificación es O(1) y segura entre hilos.
+
+    La memoria está acotada: las claves inactivas (cuyo bucket ya estaría lleno)
+    se descartan sin cambiar el comportamiento y, si aun así se supera max_keys,
+    se expulsa la clave usada menos recientemente
+    """
+
+    def __init__(self, capacity=5, refill_per_second=0.5, max_keys=100_000, clock=time.monotonic):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.max_keys = max_keys
+        self.clock = clock
+        # Tiempo tras el cual un bucket sin uso vuelve a estar lleno
+        self.idle_seconds = self.capacity / self.refill_per_second
+        self._buckets = OrderedDict()  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.throttled = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, key):
+        """
+        Consume una ficha para key
+        Retorna 0 si la petición se permite o los segundos a esperar si se rechaza
+        """
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = self.capacity
+            else:
+                tokens = min(self.capacity, bucket[0] + (now - bucket[1]) * self.refill_per_second)
+                self._buckets.move_to_end(key)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+                self.allowed += 1
+            else:
+                wait = (1 - tokens) / self.refill_per_second
+                self.throttled += 1
+
+            if bucket is None:
+                self._buckets[key] = [tokens, now]
+            else:
+                bucket[0], bucket[1] = tokens, now
+            self._prune(now)
+            return wait
+
+    def _prune(self, now):
+        # Las claves están ordenadas por último uso: basta revisar el inicio
+        buckets = self._buckets
+        while buckets:
+            key, (_, updated_at) = next(iter(buckets.items()))
+            if now - updated_at >= self.idle_seconds:
+                del buckets[key]
+                self.expired += 1
+            elif len(buckets) > self.max_keys:
+                del buckets[key]
+                self.evictions += 1
+            else:
+                break
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(key, None)
+
+    def stats(self):
+        """Contadores de peticiones permitidas, rechazadas y claves activas"""
+        return {
+            'backend': 'memory',
+            'keys': len(self._buckets),
+            'max_keys': self.max_keys,
+            'allowed': self.allowed,
+            'throttled': self.throttled,
+            'expired': self.expired,
+            'evictions': self.evictions,
+        }
+
+
+class SQLiteTokenBucketRateLimiter(TokenBucketRateLimiter):
+    """
+    Token bucket compartido entre procesos (p. ej. workers de gunicorn) mediante
+    un archivo SQLite local. Cada verificación es una transacción BEGIN IMMEDIATE
+    sobre una fila indexada por clave, por lo que los workers aplican un único límite
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, capacity=5, refill_per_second=0.5, max_keys=100_000, clock=time.time):
+        # Entre procesos se necesita un reloj de pared común, no monotonic()
+        super().__init__(capacity, refill_per_second, max_keys, clock)
+        self.path = str(path)
+        self._local = threading.local()
+        self._calls = 0
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_bucket ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS rate_limit_bucket_updated_at '
+                'ON rate_limit_bucket (updated_at)'
+            )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM rate_limit_bucket').fetchone()[0]
+
+    def acquire(self, key):
+        key = str(key)
+        now = self.clock()
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT tokens, updated_at FROM rate_limit_bucket WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                tokens = self.capacity
+            else:
+                elapsed = max(0.0, now - row[1])
+                tokens = min(self.capacity, row[0] + elapsed * self.refill_per_second)
+
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) / self.refill_per_second
+
+            connection.execute(
+                'INSERT INTO rate_limit_bucket (key, tokens, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+                (key, tokens, now)
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        with self._lock:
+            if wait:
+                self.throttled += 1
+            else:
+                self.allowed += 1
+            self._calls += 1
+            prune = self._calls % self.PRUNE_EVERY == 0
+        if prune:
+            self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        """Descarta claves inactivas y, si se supera max_keys, las menos recientes"""
+        connection = self._connection()
+        expired = connection.execute(
+            'DELETE FROM rate_limit_bucket WHERE updated_at <= ?', (now - self.idle_seconds,)
+        ).rowcount
+        evicted = connection.execute(
+            'DELETE FROM rate_limit_bucket WHERE key IN ('
+            'SELECT key FROM rate_limit_bucket ORDER BY updated_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_keys,)
+        ).rowcount
+        with self._lock:
+            self.expired += expired
+            self.evictions += evicted
+
+    def reset(self, key=None):
+        connection = self._connection()
+        if key is None:
+            connection.execute('DELETE FROM rate_limit_bucket')
+        else:
+            connection.execute('DELETE FROM rate_limit_bucket WHERE key = ?', (str(key),))
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(backend='sqlite', path=self.path, keys=len(self))
+        return stats
@@ -0,0 +1,389 @@
+from collections import deque
+from datetime import datetime, timezone as dt_timezone
+import heapq
+import logging
+import secrets
+import threading
+import time
+
+from api.services.occupancy import space_label
+
+logger = logging.getLogger(__name__)
+
+
+class _LotSpaces:
+    """Estado en memoria de los cupos de un parqueadero"""
+
+    __slots__ = ('capacity', 'lock', 'free', 'holds', 'parked', 'expiry')
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.free = deque(range(capacity))  # cupos libres, O(1) al tomar y al devolver
+        self.holds = {}  # número -> (token, expira, local); local False: retenido por otro proceso
+        self.parked = {}  # número -> (token, local): reservas confirmadas, ocupados hasta la salida
+        self.expiry = []  # heap (expira, número, token)
+
+
+class SpaceReservationEngine:
+    """
+    Reservas de cupos con retención temporal (TTL)
+    Cada parqueadero tiene una free-list de números de cupo: asignar y liberar son
+    O(1) bajo un lock por parqueadero, así las reservas de distintos parqueaderos no
+    compiten. Las retenciones vencidas vuelven a la free-list de forma perezosa (heap
+    por vencimiento) en la siguiente operación sobre el parqueadero.
+
+    Con persist=True cada retención se confirma en la BD con concurrencia optimista:
+    UPDATE ... WHERE el cupo está libre o vencido. Si otro proceso (worker) lo tomó
+    antes, el UPDATE no afecta filas y se intenta con el siguiente cupo, por lo que
+    un cupo nunca queda reservado dos veces. El token incluye parqueadero y cupo para
+    que cualquier worker pueda liberarlo o confirmarlo.
+
+    Al confirmar la llegada el cupo pasa a ocupado (en memoria y en ParkingSpace) y
+    no vuelve a la free-list hasta que vacate() registra la salida del conductor.
+
+    Los cupos reservables son capacidad - ocupados (OccupancyCounters) - retenidos
+    """
+
+    def __init__(self, data_manager, ttl_seconds=300, occupancy=None, persist=True, clock=time.time):
+        self.data_manager = data_manager
+        self.ttl_seconds = ttl_seconds
+        self.occupancy = occupancy
+        self.persist = persist
+        # Reloj de pared: los vencimientos se comparten con otros procesos vía BD
+        self.clock = clock
+        self._lots = {}
+        self._lots_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.held = 0
+        self.released = 0
+        self.expired = 0
+        self.confirmed = 0
+        self.vacated = 0
+        self.conflicts = 0
+        self.rejected = 0
+
+    # --- API pública ---------------------------------------------------------
+
+    def hold(self, parking_id, ttl_seconds=None):
+        """
+        Retiene un cupo libre por ttl_seconds
+        Retorna {'token', 'parking_id', 'space', 'number', 'expires_at'} o None si no hay cupo
+        """
+        lot = self._lot(parking_id)
+        if lot is None:
+            return None
+        now = self.clock()
+        expires_at = now + (ttl_seconds or self.ttl_seconds)
+        refreshed = False
+        while True:
+            with lot.lock:
+                self._expire(lot, now)
+                full = not lot.free or len(lot.holds) + self._occupied(parking_id) >= lot.capacity
+                if full:
+                    foreign = [number for number, (_, _, local) in lot.holds.items() if not local]
+                    foreign.extend(number for number, (_, local) in lot.parked.items() if not local)
+                else:
+                    number = lot.free.popleft()
+                    token = f"{parking_id}.{number}.{secrets.token_urlsafe(12)}"
+                    lot.holds[number] = (token, expires_at, True)
+                    heapq.heappush(lot.expiry, (expires_at, number, token))
+
+            if full:
+                # Sin cupos en memoria: los retenidos por otros procesos pudieron liberarse
+                if self.persist and foreign and not refreshed:
+                    refreshed = True
+                    self._refresh_foreign(parking_id, lot, foreign, now)
+                    continue
+                self._count('rejected')
+                return None
+
+            if not self.persist or self._commit_hold(parking_id, number, token, now, expires_at):
+                self._count('held')
+                return {
+                    'token': token,
+                    'parking_id': parking_id,
+                    'space': space_label(number),
+                    'number': number,
+                    'expires_at': datetime.fromtimestamp(expires_at, tz=dt_timezone.utc).isoformat(),
+                }
+
+            # Otro proceso lo retuvo u ocupó primero: se registra su estado y se prueba otro cupo
+            self._count('conflicts')
+            state = self._db_hold(parking_id, number)
+            with lot.lock:
+                if lot.holds.get(number, (None,))[0] == token:
+                    del lot.holds[number]
+                    self._track(lot, number, state, now)
+
+    def release(self, token):
+        """Libera una retención vigente; retorna False si el token no existe o ya venció"""
+        parsed = self._parse_token(token)
+        if parsed is None:
+            return False
+        parking_id, number = parsed
+        now = self.clock()
+        released = False
+        # Primero la BD: el cupo no vuelve a la free-list mientras la BD lo muestre retenido
+        if self.persist:
+            released = self._commit_release(parking_id, number, token, now)
+        lot = self._lots.get(parking_id)
+        if lot is not None:
+            with lot.lock:
+                current = lot.holds.get(number)
+                if current is not None and current[0] == token:
+                    released = released or current[1] > now
+                    del lot.holds[number]
+                    lot.free.append(number)
+        if released:
+            self._count('released')
+        return released
+
+    def confirm(self, token):
+        """
+        El conductor llegó: la retención pasa a ocupar el cupo hasta vacate(token)
+        Retorna (ocupados, capacidad) con OccupancyCounters, True sin ellos o None
+        si el token no existe o ya venció
+        """
+        parsed = self._parse_token(token)
+        if parsed is None:
+            return None
+        parking_id, number = parsed
+        now = self.clock()
+        confirmed = False
+        if self.persist:
+            confirmed = self._commit_confirm(parking_id, number, token, now)
+        lot = self._lots.get(parking_id)
+        if lot is not None:
+            with lot.lock:
+                current = lot.holds.get(number)
+                if current is not None and current[0] == token:
+                    confirmed = confirmed or (not self.persist and current[1] > now)
+                    if confirmed:
+                        del lot.holds[number]
+                        lot.parked[number] = (token, True)
+        if not confirmed:
+            return None
+        self._count('confirmed')
+        if self.occupancy is not None:
+            return self.occupancy.enter(parking_id)
+        return True
+
+    def vacate(self, token):
+        """
+        El conductor de una reserva confirmada salió: el cupo vuelve a la free-list
+        Retorna (ocupados, capacidad) con OccupancyCounters, True sin ellos o None
+        si el token no corresponde a un cupo ocupado
+        """
+        parsed = self._parse_token(token)
+        if parsed is None:
+            return None
+        parking_id, number = parsed
+        vacated = False
+        # Primero la BD, igual que release(): el cupo no se reasigna mientras la BD lo muestre ocupado
+        if self.persist:
+            vacated = self._commit_vacate(parking_id, number, token)
+        lot = self._lots.get(parking_id)
+        if lot is not None:
+            with lot.lock:
+                current = lot.parked.get(number)
+                if current is not None and current[0] == token:
+                    vacated = vacated or not self.persist
+                    del lot.parked[number]
+                    lot.free.append(number)
+        if not vacated:
+            return None
+        self._count('vacated')
+        if self.occupancy is not None:
+            return self.occupancy.exit(parking_id)
+        return True
+
+    def stats(self):
+        """Retenciones activas y contadores de reservas, conflictos y rechazos"""
+        with self._lots_lock:
+            lots = list(self._lots.values())
+        return {
+            'lots': len(lots),
+            'active_holds': sum(len(lot.holds) for lot in lots),
+            'occupied_spaces': sum(len(lot.parked) for lot in lots),
+            'held': self.held,
+            'released': self.released,
+            'expired': self.expired,
+            'confirmed': self.confirmed,
+            'vacated': self.vacated,
+            'conflicts': self.conflicts,
+            'rejected': self.rejected,
+        }
+
+    # --- Estado en memoria ---------------------------------------------------
+
+    def _count(self, counter, amount=1):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    @staticmethod
+    def _parse_token(token):
+        try:
+            parking_id, number, _ = str(token).split('.', 2)
+            return int(parking_id), int(number)
+        except ValueError:
+            return None
+
+    def _occupied(self, parking_id):
+        snapshot = self.data_manager.snapshot
+        row = snapshot.row_of(parking_id) if snapshot is not None else None
+        return int(snapshot.occupied[row]) if row is not None else 0
+
+    def _lot(self, parking_id):
+        lot = self._lots.get(parking_id)
+        if lot is not None:
+            return lot
+        snapshot = self.data_manager.get_snapshot()
+        row = snapshot.row_of(parking_id)
+        if row is None:
+            return None
+        with self._lots_lock:
+            lot = self._lots.get(parking_id)
+            if lot is None:
+                lot = _LotSpaces(int(snapshot.capacity[row]))
+                if self.persist:
+                    self._load(parking_id, lot)
+                self._lots[parking_id] = lot
+        return lot
+
+    @staticmethod
+    def _track(lot, number, state, now):
+        """
+        Registra el estado (token, vencimiento, ocupado) que la BD tiene para un cupo
+        que no está en holds ni en parked (con lot.lock tomado)
+        """
+        held_by, held_until, occupied = state
+        if occupied:
+            lot.parked[number] = (held_by, False)
+        elif held_until is not None and held_until > now:
+            lot.holds[number] = (held_by, held_until, False)
+            heapq.heappush(lot.expiry, (held_until, number, held_by))
+        else:
+            lot.free.append(number)
+
+    def _expire(self, lot, now):
+        """Devuelve a la free-list las retenciones vencidas (con lot.lock tomado)"""
+        expiry, holds = lot.expiry, lot.holds
+        expired = 0
+        while expiry and expiry[0][0] <= now:
+            expires_at, number, token = heapq.heappop(expiry)
+            current = holds.get(number)
+            if current is not None and current[:2] == (token, expires_at):
+                del holds[number]
+                lot.free.append(number)
+                expired += 1
+        if expired:
+            self._count('expired', expired)
+
+    # --- BD ------------------------------------------------------------------
+
+    @staticmethod
+    def _to_datetime(timestamp):
+        return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+    def _load(self, parking_id, lot):
+        """Crea las filas de cupos que falten y carga las retenciones y ocupaciones de otros procesos"""
+        from django.db.models import Q
+        from api.models import ParkingSpace
+
+        ParkingSpace.objects.bulk_create(
+            [ParkingSpace(parking_id=parking_id, number=number, label=space_label(number))
+             for number in range(lot.capacity)],
+            ignore_conflicts=True
+        )
+        now = self.clock()
+        taken = ParkingSpace.objects.filter(parking_id=parking_id, number__lt=lot.capacity).filter(
+            Q(is_occupied=True) | Q(held_until__gt=self._to_datetime(now))
+        ).values_list('number', 'held_by', 'held_until', 'is_occupied')
+        numbers = set()
+        for number, token, held_until, occupied in taken:
+            if occupied:
+                lot.parked[number] = (token, False)
+            else:
+                expires_at = held_until.timestamp()
+                lot.holds[number] = (token, expires_at, False)
+                heapq.heappush(lot.expiry, (expires_at, number, token))
+            numbers.add(number)
+        if numbers:
+            lot.free = deque(number for number in lot.free if number not in numbers)
+
+    def _commit_hold(self, parking_id, number, token, now, expires_at):
+        from django.db.models import F, Q
+        from api.models import ParkingSpace
+
+        updated = ParkingSpace.objects.filter(parking_id=parking_id, number=number, is_occupied=False).filter(
+            Q(held_until__isnull=True) | Q(held_until__lte=self._to_datetime(now))
+        ).update(held_by=token, held_until=self._to_datetime(expires_at), version=F('version') + 1)
+        return updated == 1
+
+    def _commit_release(self, parking_id, number, token, now):
+        from django.db.models import F
+        from api.models import ParkingSpace
+
+        updated = ParkingSpace.objects.filter(
+            parking_id=parking_id, number=number, held_by=token, held_until__gt=self._to_datetime(now)
+        ).update(held_by=None, held_until=None, version=F('version') + 1)
+        return updated == 1
+
+    def _commit_confirm(self, parking_id, number, token, now):
+        from django.db.models import F
+        from api.models import ParkingSpace
+
+        updated = ParkingSpace.objects.filter(
+            parking_id=parking_id, number=number, held_by=token, held_until__gt=self._to_datetime(now)
+        ).update(held_until=None, is_occupied=True, version=F('version') + 1)
+        return updated == 1
+
+    def _commit_vacate(self, parking_id, number, token):
+        from django.db.models import F
+        from api.models import ParkingSpace
+
+        updated = ParkingSpace.objects.filter(
+            parking_id=parking_id, number=number, held_by=token, is_occupied=True
+        ).update(held_by=None, is_occupied=False, version=F('version') + 1)
+        return updated == 1
+
+    def _db_hold(self, parking_id, number):
+        """(token, vencimiento, ocupado) del cupo según la BD"""
+        from api.models import ParkingSpace
+
+        row = ParkingSpace.objects.filter(
+            parking_id=parking_id, number=number
+        ).values_list('held_by', 'held_until', 'is_occupied').first()
+        if row is None:
+            return None, None, False
+        held_by, held_until, occupied = row
+        return held_by, held_until.timestamp() if held_until is not None else None, occupied
+
+    def _refresh_foreign(self, parking_id, lot, numbers, now):
+        """
+        Relee de la BD los cupos retenidos u ocupados por otros procesos: libera los que
+        ya no lo están y pasa a ocupados las retenciones que el otro proceso confirmó
+        """
+        from django.db.models import Q
+        from api.models import ParkingSpace
+
+        taken = {
+            number: (held_by, held_until.timestamp() if held_until is not None else None, occupied)
+            for number, held_by, held_until, occupied in ParkingSpace.objects.filter(
+                parking_id=parking_id, number__in=numbers
+            ).filter(
+                Q(is_occupied=True) | Q(held_until__gt=self._to_datetime(now))
+            ).values_list('number', 'held_by', 'held_until', 'is_occupied')
+        }
+        with lot.lock:
+            for number in numbers:
+                hold, parked = lot.holds.get(number), lot.parked.get(number)
+                if hold is not None and not hold[2]:
+                    del lot.holds[number]
+                elif parked is not None and not parked[1]:
+                    del lot.parked[number]
+                else:
+                    # Cambió en memoria mientras se consultaba la BD
+                    continue
+                self._track(lot, number, taken.get(number, (None, None, False)), now)
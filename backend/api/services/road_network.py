@@ -0,0 +1,311 @@
+import heapq
+import math
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from api.services.spatial_index import EARTH_RADIUS_KM, GridSpatialIndex
+
+
+# Velocidades (km/h) por tipo de vía OSM cuando la vía no declara maxspeed
+HIGHWAY_SPEEDS_KMH = {
+    'motorway': 90, 'motorway_link': 50,
+    'trunk': 70, 'trunk_link': 40,
+    'primary': 50, 'primary_link': 35,
+    'secondary': 40, 'secondary_link': 30,
+    'tertiary': 35, 'tertiary_link': 25,
+    'unclassified': 30, 'residential': 25,
+    'living_street': 10, 'service': 15,
+}
+
+# Velocidad del tramo en línea recta entre el punto pedido y el nodo más cercano de la red
+ACCESS_SPEED_KMH = 15
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1)
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlng / 2) ** 2)
+    return 2000 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_m_array(lat, lng, lats, lngs):
+    lats = np.radians(lats)
+    dlat = lats - math.radians(lat)
+    dlng = np.radians(lngs) - math.radians(lng)
+    a = np.sin(dlat / 2) ** 2 + math.cos(math.radians(lat)) * np.cos(lats) * np.sin(dlng / 2) ** 2
+    return 2000 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+class RoadNetwork:
+    """
+    Grafo vial dirigido en formato CSR (compressed sparse row)
+    Las aristas salientes del nodo u son targets[offsets[u]:offsets[u + 1]], con su
+    tiempo de recorrido en segundos y su longitud en metros. Los arreglos son
+    contiguos y compactos, por lo que un extracto de ciudad cabe en pocos MB y
+    se carga desde un .npz sin reconstruir estructuras de Python
+    """
+
+    def __init__(self, latitude, longitude, offsets, targets, seconds, meters):
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        self.seconds = np.asarray(seconds, dtype=np.float32)
+        self.meters = np.asarray(meters, dtype=np.float32)
+
+        # Cota de velocidad para la heurística admisible de A*
+        if len(self.seconds):
+            self.max_speed_mps = float(np.max(self.meters / np.maximum(self.seconds, 1e-6)))
+        else:
+            self.max_speed_mps = 1.0
+
+        # Listas de Python para el bucle de búsqueda (más rápidas que indexar NumPy elemento a elemento)
+        self._lat = self.latitude.tolist()
+        self._lng = self.longitude.tolist()
+        self._offsets = self.offsets.tolist()
+        self._targets = self.targets.tolist()
+        self._seconds = self.seconds.tolist()
+        self._meters = self.meters.tolist()
+
+        self._node_index = GridSpatialIndex(cell_size_deg=0.005)
+        self._node_index.bulk_load(zip(range(len(self.latitude)), self._lat, self._lng))
+        # CSR con las aristas invertidas para travel_times_to(); se arma la primera vez que se usa
+        self._reverse = None
+
+    def __len__(self):
+        return len(self.latitude)
+
+    @property
+    def edge_count(self):
+        return len(self.targets)
+
+    @classmethod
+    def from_edges(cls, latitude, longitude, edges):
+        """Construye el CSR a partir de tuplas (origen, destino, segundos, metros)"""
+        edges = np.array(edges, dtype=np.float64).reshape(-1, 4)
+        sources = edges[:, 0].astype(np.int64)
+        order = np.argsort(sources, kind='stable')
+        counts = np.bincount(sources, minlength=len(latitude))
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return cls(
+            latitude, longitude, offsets,
+            edges[order, 1].astype(np.int32), edges[order, 2], edges[order, 3]
+        )
+
+    @classmethod
+    def from_osm(cls, path, speeds=HIGHWAY_SPEEDS_KMH):
+        """
+        Convierte un extracto OSM XML (.osm) en un grafo CSR
+        Solo se conservan las vías transitables en carro y los nodos que usan
+        """
+        coordinates = {}
+        ways = []
+        for _, element in ET.iterparse(path, events=('end',)):
+            if element.tag == 'node':
+                coordinates[int(element.get('id'))] = (float(element.get('lat')), float(element.get('lon')))
+                element.clear()
+            elif element.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in element.findall('tag')}
+                highway = tags.get('highway')
+                if highway in speeds:
+                    refs = [int(nd.get('ref')) for nd in element.findall('nd')]
+                    speed = _parse_maxspeed(tags.get('maxspeed')) or speeds[highway]
+                    ways.append((refs, speed, tags.get('oneway')))
+                element.clear()
+
+        node_ids = {}
+        latitude, longitude, edges = [], [], []
+
+        def node(osm_id):
+            index = node_ids.get(osm_id)
+            if index is None:
+                index = node_ids[osm_id] = len(latitude)
+                lat, lng = coordinates[osm_id]
+                latitude.append(lat)
+                longitude.append(lng)
+            return index
+
+        for refs, speed_kmh, oneway in ways:
+            refs = [ref for ref in refs if ref in coordinates]
+            if oneway == '-1':
+                refs.reverse()
+            forward_only = oneway in ('yes', 'true', '1', '-1')
+            for a, b in zip(refs, refs[1:]):
+                u, v = node(a), node(b)
+                meters = haversine_m(latitude[u], longitude[u], latitude[v], longitude[v])
+                seconds = meters / (speed_kmh / 3.6)
+                edges.append((u, v, seconds, meters))
+                if not forward_only:
+                    edges.append((v, u, seconds, meters))
+        return cls.from_edges(latitude, longitude, edges)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data['latitude'], data['longitude'], data['offsets'],
+                   data['targets'], data['seconds'], data['meters'])
+
+    def save(self, path):
+        np.savez(path, latitude=self.latitude, longitude=self.longitude, offsets=self.offsets,
+                 targets=self.targets, seconds=self.seconds, meters=self.meters)
+
+    def nearest_node(self, lat, lng):
+        """(nodo, metros) más cercano al punto, o (None, None) si el grafo está vacío"""
+        best, best_m = None, math.inf
+        for ids, min_distance_km in self._node_index.iter_candidates(lat, lng):
+            if min_distance_km * 1000 > best_m:
+                break
+            if not ids:
+                continue
+            ids = np.fromiter(ids, dtype=np.int64, count=len(ids))
+            distances = haversine_m_array(lat, lng, self.latitude[ids], self.longitude[ids])
+            i = int(np.argmin(distances))
+            if distances[i] < best_m:
+                best, best_m = int(ids[i]), float(distances[i])
+        return best, (best_m if best is not None else None)
+
+    def shortest_path(self, source, target):
+        """
+        A* por tiempo de recorrido con heurística admisible (línea recta a la
+        velocidad máxima del grafo). Retorna (nodos, segundos, metros) o None
+        """
+        lat, lng = self._lat, self._lng
+        offsets, targets, seconds, meters = self._offsets, self._targets, self._seconds, self._meters
+        goal_lat, goal_lng = lat[target], lng[target]
+        speed = self.max_speed_mps
+
+        best = {source: 0.0}
+        parent = {source: -1}
+        open_heap = [(haversine_m(lat[source], lng[source], goal_lat, goal_lng) / speed, 0.0, source)]
+        closed = set()
+        while open_heap:
+            _, cost, u = heapq.heappop(open_heap)
+            if u == target:
+                break
+            if u in closed:
+                continue
+            closed.add(u)
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                new_cost = cost + seconds[e]
+                if new_cost < best.get(v, math.inf):
+                    best[v] = new_cost
+                    parent[v] = (u, e)
+                    estimate = new_cost + haversine_m(lat[v], lng[v], goal_lat, goal_lng) / speed
+                    heapq.heappush(open_heap, (estimate, new_cost, v))
+        else:
+            return None
+
+        path, total_m = [target], 0.0
+        node = target
+        while node != source:
+            node, edge = parent[node]
+            total_m += meters[edge]
+            path.append(node)
+        path.reverse()
+        return path, best[target], total_m
+
+    def travel_times(self, source, targets):
+        """
+        Dijkstra uno-a-muchos: segundos desde source a cada nodo de targets
+        (inf si no es alcanzable). Se detiene al asentar todos los destinos
+        """
+        pending = set(targets)
+        offsets, graph_targets, seconds = self._offsets, self._targets, self._seconds
+        best = {source: 0.0}
+        settled = {}
+        heap = [(0.0, source)]
+        while heap and pending:
+            cost, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled[u] = cost
+            pending.discard(u)
+            for e in range(offsets[u], offsets[u + 1]):
+                v = graph_targets[e]
+                new_cost = cost + seconds[e]
+                if new_cost < best.get(v, math.inf):
+                    best[v] = new_cost
+                    heapq.heappush(heap, (new_cost, v))
+        return [settled.get(target, math.inf) for target in targets]
+
+    def _reverse_csr(self):
+        if self._reverse is None:
+            sources = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+            order = np.argsort(self.targets, kind='stable')
+            counts = np.bincount(self.targets, minlength=len(self))
+            offsets = np.concatenate(([0], np.cumsum(counts)))
+            self._reverse = (offsets.tolist(), sources[order].tolist(), self.seconds[order].tolist())
+        return self._reverse
+
+    def travel_times_to(self, target, max_seconds=math.inf):
+        """
+        Dijkstra sobre el grafo invertido: {nodo: segundos hasta target} para los
+        nodos que llegan a target en a lo sumo max_seconds
+        """
+        offsets, sources, seconds = self._reverse_csr()
+        best = {target: 0.0}
+        settled = {}
+        heap = [(0.0, target)]
+        while heap:
+            cost, v = heapq.heappop(heap)
+            if cost > max_seconds:
+                break
+            if v in settled:
+                continue
+            settled[v] = cost
+            for e in range(offsets[v], offsets[v + 1]):
+                u = sources[e]
+                new_cost = cost + seconds[e]
+                if new_cost < best.get(u, math.inf):
+                    best[u] = new_cost
+                    heapq.heappush(heap, (new_cost, u))
+        return settled
+
+    def nearest_items(self, source, items_by_node, k):
+        """
+        Dijkstra uno-a-muchos hacia ítems ubicados en nodos: items_by_node mapea
+        nodo -> [(ítem, segundos_extra)]. Retorna hasta k tuplas (segundos, ítem)
+        ordenadas; se detiene cuando ningún nodo pendiente puede mejorar el k-ésimo
+        """
+        offsets, graph_targets, seconds = self._offsets, self._targets, self._seconds
+        best = {source: 0.0}
+        settled = set()
+        found = []  # max-heap de (-segundos, ítem)
+        heap = [(0.0, source)]
+        while heap:
+            cost, u = heapq.heappop(heap)
+            if len(found) == k and cost >= -found[0][0]:
+                break
+            if u in settled:
+                continue
+            settled.add(u)
+            for item, extra in items_by_node.get(u, ()):
+                total = cost + extra
+                if len(found) < k:
+                    heapq.heappush(found, (-total, item))
+                elif total < -found[0][0]:
+                    heapq.heapreplace(found, (-total, item))
+            for e in range(offsets[u], offsets[u + 1]):
+                v = graph_targets[e]
+                new_cost = cost + seconds[e]
+                if new_cost < best.get(v, math.inf):
+                    best[v] = new_cost
+                    heapq.heappush(heap, (new_cost, v))
+        return sorted((-neg_total, item) for neg_total, item in found)
+
+
+def _parse_maxspeed(value):
+    """'50', '30 mph' -> km/h; None si no es interpretable"""
+    if not value:
+        return None
+    parts = value.split()
+    try:
+        speed = float(parts[0])
+    except ValueError:
+        return None
+    if len(parts) > 1 and parts[1] == 'mph':
+        speed *= 1.609
+    return speed if speed > 0 else None
@@ -0,0 +1,71 @@
+import math
+import sys
+
+from api.services import polyline
+from api.services.cache import LRUCache
+
+# Bytes aproximados de la entrada además de la polilínea (tupla, dict y números)
+ENTRY_OVERHEAD_BYTES = 240
+
+
+class RouteCache:
+    """
+    Caché de rutas indexado por (celda del origen, id del parqueadero destino)
+    Las búsquedas de una misma zona que terminan en el mismo parqueadero
+    comparten la ruta. Los waypoints se guardan como polilínea codificada y la
+    memoria se acota por bytes con expulsión LRU. Una entrada solo se invalida
+    cuando cambian las coordenadas de su parqueadero
+    """
+
+    def __init__(self, cell_size_deg=0.001, max_bytes=16 * 1024 * 1024, max_entries=100_000):
+        self.cell_size_deg = cell_size_deg  # ~110 m
+        self.cache = LRUCache(max_entries=max_entries, ttl_seconds=None, max_bytes=max_bytes)
+
+    def _key(self, origin, parking_id):
+        return (
+            math.floor(origin['lat'] / self.cell_size_deg),
+            math.floor(origin['lng'] / self.cell_size_deg),
+            parking_id
+        )
+
+    def get(self, origin, parking_id):
+        """Ruta en caché desde la celda de origin, con el primer waypoint en origin (None si no hay)"""
+        entry = self.cache.get(self._key(origin, parking_id))
+        if entry is None:
+            return None
+        distance_km, duration_minutes, encoded = entry
+        waypoints = polyline.decode(encoded)
+        if waypoints:
+            waypoints[0] = {'lat': origin['lat'], 'lng': origin['lng']}
+        return {
+            'distance_km': distance_km,
+            'duration_minutes': duration_minutes,
+            'waypoints': waypoints
+        }
+
+    def set(self, origin, parking_id, route):
+        encoded = polyline.encode(route['waypoints'])
+        self.cache.set(
+            self._key(origin, parking_id),
+            (route['distance_km'], route['duration_minutes'], encoded),
+            tags=[parking_id],
+            size=sys.getsizeof(encoded) + ENTRY_OVERHEAD_BYTES
+        )
+
+    def get_or_compute(self, origin, parking_id, compute):
+        route = self.get(origin, parking_id)
+        if route is None:
+            route = compute()
+            if route is not None:
+                self.set(origin, parking_id, route)
+        return route
+
+    def invalidate_parking(self, parking_id):
+        """Descarta las rutas hacia un parqueadero cuyas coordenadas cambiaron"""
+        return self.cache.invalidate_tag(parking_id)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
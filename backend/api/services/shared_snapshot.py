@@ -0,0 +1,212 @@
+from contextlib import contextmanager
+import json
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from api.services.snapshot import ParkingSnapshot
+from api.services.spatial_index import PackedGridSpatialIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos (un solo worker en desarrollo)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class TextColumn:
+    """
+    Columna de textos guardada como un bloque UTF-8 y sus offsets (n + 1): se lee
+    del mmap sin copiarla y cada acceso decodifica solo su fila
+    """
+
+    __slots__ = ('blob', 'offsets', 'decode')
+
+    def __init__(self, blob, offsets, decode=None):
+        self.blob = blob
+        self.offsets = offsets
+        self.decode = decode
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        text = self.blob[self.offsets[row]:self.offsets[row + 1]].tobytes().decode()
+        return self.decode(text) if self.decode is not None else text
+
+    @staticmethod
+    def encode(texts):
+        """(bloque uint8, offsets int64) de una lista de textos"""
+        encoded = [text.encode() for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+class SharedSnapshotStore:
+    """
+    Snapshot de parqueaderos publicado una sola vez para todos los workers de gunicorn
+
+    Cada generación es un directorio con las columnas del snapshot en .npy (nombres y
+    características como bloques UTF-8 con sus offsets), el índice espacial de todos
+    los parqueaderos (PackedGridSpatialIndex) y meta.json. Los workers los abren con mmap
+    sin copiarlos, así la memoria no crece con la cantidad de workers.
+    Un contador de 8 bytes (también mmap) indica la generación vigente: leerlo en cada
+    búsqueda cuesta lo mismo que leer un entero. El worker que publica toma un lock de
+    archivo; los que llegan mientras tanto esperan y abren la generación recién publicada.
+
+    Las columnas que se parchean en sitio (disponibilidad, cierre manual, cupos
+    ocupados) se abren en lectura/escritura: un parche de un worker escribe en el
+    archivo compartido y los demás lo ven en su próxima búsqueda. Por eso el índice
+    no se parchea: incluye también los no disponibles y la búsqueda los descarta con
+    la columna is_available. Los cupos ocupados en memoria se escriben sin lock entre
+    procesos (dos ajustes simultáneos pueden perder uno en pantalla); los deltas de
+    OccupancyCounters siguen llegando completos a la BD y la próxima generación los trae
+    """
+
+    GENERATION_FILE = 'generation'
+    LOCK_FILE = 'publish.lock'
+    META_FILE = 'meta.json'
+    NAMES_FILES = ('names.npy', 'name_offsets.npy')
+    FEATURES_FILES = ('features.npy', 'feature_offsets.npy')
+    # Columnas que ParkingDataManager parchea sin publicar una generación nueva
+    PATCHED_COLUMNS = ('is_available', 'is_closed', 'occupied')
+    # Generaciones que se conservan en disco para los workers que aún las están abriendo
+    KEEP_GENERATIONS = 2
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._counter = None
+        self._thread_lock = threading.Lock()
+        self.publishes = 0
+        self.attaches = 0
+
+    def _generation_path(self, generation):
+        return os.path.join(self.path, f'gen-{generation:08d}')
+
+    @property
+    def generation(self):
+        """Generación vigente (0 si todavía no se ha publicado ninguna)"""
+        counter = self._counter
+        if counter is None:
+            counter_path = os.path.join(self.path, self.GENERATION_FILE)
+            if not os.path.exists(counter_path):
+                return 0
+            counter = self._counter = np.memmap(counter_path, dtype=np.int64, mode='r', shape=(1,))
+        return int(counter[0])
+
+    @contextmanager
+    def publishing(self):
+        """Lock de publicación entre hilos del proceso y entre workers (flock)"""
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.path, self.LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def publish(self, snapshot):
+        """Escribe el snapshot como una generación nueva y la marca vigente (llamar dentro de publishing())"""
+        generation = self.generation + 1
+        final = self._generation_path(generation)
+        staging = final + '.tmp'
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        for name, dtype in ParkingSnapshot.COLUMNS.items():
+            np.save(os.path.join(staging, f'{name}.npy'), np.ascontiguousarray(getattr(snapshot, name), dtype=dtype))
+        features = [json.dumps(value, ensure_ascii=False) for value in snapshot.features]
+        for files, texts in ((self.NAMES_FILES, snapshot.names), (self.FEATURES_FILES, features)):
+            for filename, array in zip(files, TextColumn.encode(texts)):
+                np.save(os.path.join(staging, filename), array)
+        index = PackedGridSpatialIndex()
+        index.bulk_load(snapshot.points())
+        for name in PackedGridSpatialIndex.ARRAYS:
+            np.save(os.path.join(staging, f'index_{name}.npy'), getattr(index, name))
+        with open(os.path.join(staging, self.META_FILE), 'w') as f:
+            json.dump({
+                'generation': generation,
+                'size': len(snapshot),
+                'loaded_at': snapshot.loaded_at,
+                'feature_bits': snapshot.feature_bits,
+                'index_cell_size_deg': index.cell_size_deg,
+            }, f)
+        # El directorio completo aparece de una vez; luego se avanza el contador
+        os.rename(staging, final)
+        counter_path = os.path.join(self.path, self.GENERATION_FILE)
+        mode = 'r+' if os.path.exists(counter_path) else 'w+'
+        counter = np.memmap(counter_path, dtype=np.int64, mode=mode, shape=(1,))
+        counter[0] = generation
+        counter.flush()
+        self.publishes += 1
+        self._cleanup(generation)
+        logger.debug("🗂️ SHARED SNAPSHOT: Generación %s publicada (%s parqueaderos)", generation, len(snapshot))
+        return generation
+
+    def attach(self):
+        """
+        (ParkingSnapshot, PackedGridSpatialIndex) sobre la generación vigente con mmap,
+        de escritura solo en PATCHED_COLUMNS (None si aún no hay ninguna). Si la
+        generación se borra mientras se abre, se reintenta con la siguiente
+        """
+        while True:
+            generation = self.generation
+            if generation == 0:
+                return None
+            try:
+                return self._attach(generation)
+            except FileNotFoundError:
+                if self.generation == generation:
+                    raise
+
+    def _attach(self, generation):
+        path = self._generation_path(generation)
+        with open(os.path.join(path, self.META_FILE)) as f:
+            meta = json.load(f)
+
+        def column(filename, mode='r'):
+            return np.load(os.path.join(path, filename), mmap_mode=mode)
+
+        columns = {
+            name: column(f'{name}.npy', 'r+' if name in self.PATCHED_COLUMNS else 'r')
+            for name in ParkingSnapshot.COLUMNS
+        }
+        snapshot = ParkingSnapshot.from_columns(
+            columns,
+            names=TextColumn(*(column(filename) for filename in self.NAMES_FILES)),
+            features=TextColumn(*(column(filename) for filename in self.FEATURES_FILES), decode=json.loads),
+            feature_bits=meta['feature_bits'],
+            loaded_at=meta['loaded_at'],
+            generation=generation
+        )
+        index = PackedGridSpatialIndex(
+            meta['index_cell_size_deg'],
+            *(column(f'index_{name}.npy') for name in PackedGridSpatialIndex.ARRAYS)
+        )
+        self.attaches += 1
+        logger.debug("🗂️ SHARED SNAPSHOT: Generación %s abierta (%s parqueaderos)", generation, meta['size'])
+        return snapshot, index
+
+    def _cleanup(self, generation):
+        """Borra las generaciones viejas; los workers que aún las tienen abiertas conservan su mmap"""
+        for entry in os.listdir(self.path):
+            if not entry.startswith('gen-') or entry.endswith('.tmp'):
+                continue
+            if int(entry[4:]) <= generation - self.KEEP_GENERATIONS:
+                shutil.rmtree(os.path.join(self.path, entry), ignore_errors=True)
+
+    def stats(self):
+        return {
+            'generation': self.generation,
+            'publishes': self.publishes,
+            'attaches': self.attaches,
+        }
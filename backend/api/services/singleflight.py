@@ -0,0 +1,112 @@
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _AsyncCall:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Deduplicación de llamadas concurrentes (single-flight)
+    Para una misma clave solo hay un cálculo en curso; las llamadas que llegan
+    mientras tanto esperan y comparten su resultado (o su excepción)
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """Ejecuta func una sola vez por clave entre hilos concurrentes"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def do_async(self, key, func, *args, **kwargs):
+        """
+        Versión para corrutinas: las tareas del mismo event loop comparten el resultado
+        El cálculo corre en su propia tarea, así que cancelar a quien lo inició (p. ej.
+        el cliente se desconectó) no cancela a los demás; solo se cancela cuando ya
+        nadie espera su resultado
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        with self._lock:
+            call = self._async_calls.get(flight_key)
+            if call is not None:
+                self.coalesced += 1
+            else:
+                call = self._async_calls[flight_key] = _AsyncCall(
+                    loop.create_task(self._run_async(flight_key, func, args, kwargs))
+                )
+                self.executions += 1
+            call.waiters += 1
+
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            with self._lock:
+                call.waiters -= 1
+                abandoned = call.waiters == 0
+            if abandoned and not call.task.done():
+                call.task.cancel()
+
+    async def _run_async(self, flight_key, func, args, kwargs):
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            with self._lock:
+                del self._async_calls[flight_key]
+
+    def in_flight(self):
+        return len(self._calls) + len(self._async_calls)
+
+    def stats(self):
+        """Cuántos cálculos se ejecutaron y cuántas llamadas se fusionaron con uno en curso"""
+        total = self.executions + self.coalesced
+        return {
+            'in_flight': self.in_flight(),
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'coalesced_rate': round(self.coalesced / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,216 @@
+from decimal import Decimal
+import itertools
+import time
+
+import numpy as np
+
+from api.services.payloads import PayloadFragment
+
+
+# Versión global y monotónica: cada recarga o parche produce una versión nueva
+_versions = itertools.count(1)
+
+MAX_FEATURE_BITS = 64
+
+
+class SortedIdIndex:
+    """
+    id -> fila por búsqueda binaria sobre la columna de ids ordenada: no crea un
+    dict por proceso, así un snapshot compartido (mmap) no ocupa memoria por worker
+    """
+
+    __slots__ = ('ids',)
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def get(self, parking_id, default=None):
+        row = int(np.searchsorted(self.ids, parking_id))
+        if row < len(self.ids) and self.ids[row] == parking_id:
+            return row
+        return default
+
+    def __contains__(self, parking_id):
+        return self.get(parking_id) is not None
+
+    def rows(self, parking_ids):
+        """Filas de los ids presentes, ordenadas por id (como la columna)"""
+        wanted = np.fromiter(parking_ids, dtype=np.int64, count=len(parking_ids))
+        rows = np.searchsorted(self.ids, wanted)
+        found = rows < len(self.ids)
+        rows, wanted = rows[found], wanted[found]
+        return np.sort(rows[self.ids[rows] == wanted]).astype(np.intp, copy=False)
+
+
+class ParkingSnapshot:
+    """
+    Copia en memoria, orientada a columnas, de la tabla de parqueaderos
+    Las columnas numéricas viven en arreglos NumPy compactos para que las
+    búsquedas no hagan I/O de BD; los cambios se aplican en sitio y
+    avanzan la versión para que los caches puedan usarla como clave
+    """
+
+    FIELDS = ('id', 'name', 'latitude', 'longitude', 'price_per_hour',
+              'is_available', 'capacity', 'features', 'occupied_spaces', 'reviews_count', 'is_closed')
+    # Columnas NumPy y su tipo (SharedSnapshotStore las publica tal cual)
+    COLUMNS = {
+        'ids': np.int64, 'latitude': np.float64, 'longitude': np.float64, 'price_per_hour': np.float64,
+        'is_available': np.bool_, 'is_closed': np.bool_, 'capacity': np.int32, 'occupied': np.int32,
+        'reviews_count': np.int32, 'features_mask': np.uint64,
+    }
+
+    def __init__(self, rows=()):
+        rows = list(rows)
+        size = len(rows)
+        self.ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=size)
+        self.names = [r[1] for r in rows]
+        self.latitude = np.fromiter((r[2] for r in rows), dtype=np.float64, count=size)
+        self.longitude = np.fromiter((r[3] for r in rows), dtype=np.float64, count=size)
+        self.price_per_hour = np.fromiter((r[4] for r in rows), dtype=np.float64, count=size)
+        self.is_available = np.fromiter((bool(r[5]) for r in rows), dtype=bool, count=size)
+        self.capacity = np.fromiter((r[6] for r in rows), dtype=np.int32, count=size)
+        self.features = [list(r[7] or []) for r in rows]
+        self.occupied = np.fromiter((r[8] for r in rows), dtype=np.int32, count=size)
+        self.reviews_count = np.fromiter((r[9] for r in rows), dtype=np.int32, count=size)
+        self.is_closed = np.fromiter((bool(r[10]) for r in rows), dtype=bool, count=size)
+
+        # Cada característica ('Techado', 'Vigilancia', ...) recibe un bit
+        self.feature_bits = {}
+        self.features_mask = np.fromiter(
+            (self._features_to_mask(f) for f in self.features), dtype=np.uint64, count=size
+        )
+
+        self._row_by_id = {parking_id: row for row, parking_id in enumerate(self.ids.tolist())}
+        # Fragmentos precompilados de los resultados de búsqueda, por fila
+        self._payloads = {}
+        self.version = next(_versions)
+        self.loaded_at = time.time()
+        # Generación de SharedSnapshotStore de la que se abrió (None: cargado en este proceso)
+        self.generation = None
+
+    @classmethod
+    def load(cls):
+        """Construye el snapshot con una sola consulta a la BD"""
+        from api.models import Parking
+        return cls(Parking.objects.order_by('id').values_list(*cls.FIELDS))
+
+    @classmethod
+    def from_columns(cls, columns, names, features, feature_bits, loaded_at, generation=None):
+        """
+        Snapshot sobre columnas ya construidas (p. ej. arreglos mmap de SharedSnapshotStore)
+        sin copiarlas; los ids deben estar ordenados porque las filas se ubican por búsqueda binaria
+        """
+        snapshot = cls.__new__(cls)
+        for name in cls.COLUMNS:
+            setattr(snapshot, name, columns[name])
+        snapshot.names = names
+        snapshot.features = features
+        snapshot.feature_bits = dict(feature_bits)
+        snapshot._row_by_id = SortedIdIndex(snapshot.ids)
+        snapshot._payloads = {}
+        snapshot.version = next(_versions)
+        snapshot.loaded_at = loaded_at
+        snapshot.generation = generation
+        return snapshot
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, parking_id):
+        return parking_id in self._row_by_id
+
+    def _features_to_mask(self, features, register=True):
+        mask = 0
+        for feature in features:
+            bit = self.feature_bits.get(feature)
+            if bit is None:
+                if not register or len(self.feature_bits) >= MAX_FEATURE_BITS:
+                    continue
+                bit = len(self.feature_bits)
+                self.feature_bits[feature] = bit
+            mask |= 1 << bit
+        return mask
+
+    def feature_mask(self, features):
+        """Máscara de bits para un conjunto de características (None si alguna no existe)"""
+        if any(feature not in self.feature_bits for feature in features):
+            return None
+        return self._features_to_mask(features, register=False)
+
+    def row_of(self, parking_id):
+        return self._row_by_id.get(parking_id)
+
+    def rows_of(self, parking_ids):
+        """Filas de los ids indicados, ordenadas por id"""
+        row_by_id = self._row_by_id
+        if isinstance(row_by_id, SortedIdIndex):
+            return row_by_id.rows(parking_ids)
+        rows = np.array([row_by_id[pid] for pid in parking_ids if pid in row_by_id], dtype=np.intp)
+        return rows[np.argsort(self.ids[rows], kind='stable')]
+
+    def points(self):
+        """(id, lat, lng) de todos los parqueaderos"""
+        return zip(self.ids.tolist(), self.latitude.tolist(), self.longitude.tolist())
+
+    def available_points(self):
+        """(id, lat, lng) de los parqueaderos disponibles, para el índice espacial"""
+        rows = np.flatnonzero(self.is_available)
+        return zip(self.ids[rows].tolist(), self.latitude[rows].tolist(), self.longitude[rows].tolist())
+
+    def columns(self, rows=None):
+        """Columnas para SearchCriteria.compile_mask (todas o solo las filas indicadas)"""
+        if rows is None:
+            rows = slice(None)
+        return {
+            'id': self.ids[rows],
+            'latitude': self.latitude[rows],
+            'longitude': self.longitude[rows],
+            'price_per_hour': self.price_per_hour[rows],
+            'is_available': self.is_available[rows],
+            'capacity': self.capacity[rows],
+            'occupied': self.occupied[rows],
+            'features_mask': self.features_mask[rows],
+        }
+
+    def get_parking(self, row):
+        """Reconstruye una instancia de Parking (sin consultar la BD) para una fila"""
+        from api.models import Parking
+        return Parking(
+            id=int(self.ids[row]),
+            name=self.names[row],
+            latitude=float(self.latitude[row]),
+            longitude=float(self.longitude[row]),
+            price_per_hour=Decimal(f"{self.price_per_hour[row]:.2f}"),
+            is_available=bool(self.is_available[row]),
+            is_closed=bool(self.is_closed[row]),
+            capacity=int(self.capacity[row]),
+            features=self.features[row],
+            occupied_spaces=int(self.occupied[row]),
+            reviews_count=int(self.reviews_count[row]),
+        )
+
+    def payload(self, row):
+        """
+        PayloadFragment de la fila (parte fija del resultado de búsqueda, con su JSON)
+        Se compila la primera vez y se reutiliza hasta que la fila se parchee
+        """
+        fragment = self._payloads.get(row)
+        if fragment is None:
+            version = self.version
+            fragment = PayloadFragment.from_snapshot(self, row)
+            # Un parche concurrente de la fila descarta el fragmento recién compilado
+            if self.version == version:
+                self._payloads[row] = fragment
+        return fragment
+
+    def set_availability(self, parking_id, is_available, is_closed=None):
+        """Parchea en sitio la disponibilidad de un parqueadero (y su cierre manual si se indica)"""
+        row = self._row_by_id.get(parking_id)
+        if row is None:
+            return False
+        self.is_available[row] = bool(is_available)
+        if is_closed is not None:
+            self.is_closed[row] = bool(is_closed)
+        self.version = next(_versions)
+        self._payloads.pop(row, None)
+        return True
@@ -0,0 +1,325 @@
+from abc import ABC, abstractmethod
+from collections import defaultdict
+import math
+
+import numpy as np
+
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    Caja lat/lng que contiene todos los puntos a menos de radius_km del centro.
+    Retorna (min_lat, max_lat, lng_ranges); lng_ranges es una lista de rangos
+    (dos si la caja cruza el antimeridiano) o None si cubre todas las longitudes
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angular)
+    min_lat = lat - dlat
+    max_lat = lat + dlat
+    if min_lat <= -90 or max_lat >= 90 or angular >= math.pi / 2:
+        return max(min_lat, -90.0), min(max_lat, 90.0), None
+
+    dlng = math.degrees(math.asin(min(1.0, math.sin(angular) / math.cos(math.radians(lat)))))
+    min_lng = lng - dlng
+    max_lng = lng + dlng
+    if min_lng < -180:
+        return min_lat, max_lat, [(min_lng + 360, 180.0), (-180.0, max_lng)]
+    if max_lng > 180:
+        return min_lat, max_lat, [(min_lng, 180.0), (-180.0, max_lng - 360)]
+    return min_lat, max_lat, [(min_lng, max_lng)]
+
+
+class SpatialIndex(ABC):
+    """
+    Interfaz para índices espaciales de parqueaderos (lat/lng)
+    Permite a la fachada consultar solo candidatos cercanos al usuario
+    en lugar de recorrer toda la tabla de parqueaderos
+    """
+
+    @abstractmethod
+    def insert(self, item_id, lat, lng):
+        pass
+
+    @abstractmethod
+    def remove(self, item_id):
+        pass
+
+    @abstractmethod
+    def iter_candidates(self, lat, lng):
+        """
+        Genera tuplas (ids, distancia_minima_km) en anillos crecientes alrededor
+        del punto. distancia_minima_km es una cota inferior de la distancia de
+        cualquier id de ese anillo o de los anillos siguientes
+        """
+        pass
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+    @abstractmethod
+    def __contains__(self, item_id):
+        pass
+
+    def bulk_load(self, items):
+        """Carga (id, lat, lng) en el índice"""
+        for item_id, lat, lng in items:
+            self.insert(item_id, lat, lng)
+
+    def query_radius(self, lat, lng, radius_km):
+        """Retorna los ids de los anillos que pueden estar dentro del radio"""
+        result = []
+        for ids, min_distance in self.iter_candidates(lat, lng):
+            if min_distance > radius_km:
+                break
+            result.extend(ids)
+        return result
+
+
+class GridSpatialIndex(SpatialIndex):
+    """
+    Índice espacial basado en una grilla regular de celdas lat/lng
+    Inserción y eliminación O(1); la búsqueda recorre anillos de celdas
+    alrededor del usuario hasta agotar la grilla ocupada
+    """
+
+    def __init__(self, cell_size_deg=0.01):
+        self.cell_size_deg = cell_size_deg  # ~1.1 km en latitud
+        self._cells = defaultdict(set)
+        self._positions = {}
+        # Límites de la grilla ocupada (no se reducen al eliminar: siguen siendo válidos)
+        self._bounds = None
+
+    def _cell(self, lat, lng):
+        return (
+            math.floor(lat / self.cell_size_deg),
+            math.floor(lng / self.cell_size_deg)
+        )
+
+    def insert(self, item_id, lat, lng):
+        if item_id in self._positions:
+            self.remove(item_id)
+        cell = self._cell(lat, lng)
+        self._cells[cell].add(item_id)
+        self._positions[item_id] = (lat, lng, cell)
+
+        row, col = cell
+        if self._bounds is None:
+            self._bounds = [row, row, col, col]
+        else:
+            bounds = self._bounds
+            bounds[0] = min(bounds[0], row)
+            bounds[1] = max(bounds[1], row)
+            bounds[2] = min(bounds[2], col)
+            bounds[3] = max(bounds[3], col)
+
+    def remove(self, item_id):
+        position = self._positions.pop(item_id, None)
+        if position is None:
+            return
+        cell = position[2]
+        bucket = self._cells[cell]
+        bucket.discard(item_id)
+        if not bucket:
+            del self._cells[cell]
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, item_id):
+        return item_id in self._positions
+
+    def _ring_cells(self, row, col, ring):
+        if ring == 0:
+            yield (row, col)
+            return
+        for c in range(col - ring, col + ring + 1):
+            yield (row - ring, c)
+            yield (row + ring, c)
+        for r in range(row - ring + 1, row + ring):
+            yield (r, col - ring)
+            yield (r, col + ring)
+
+    def _ring_lower_bound_km(self, lat, ring):
+        """Cota inferior de la distancia a cualquier punto del anillo indicado"""
+        if ring <= 1:
+            return 0.0
+        gap_deg = (ring - 1) * self.cell_size_deg
+        # En latitud la distancia por grado es constante
+        lat_bound = gap_deg * KM_PER_DEGREE
+        # En longitud se usa el paralelo más extremo alcanzable por el anillo
+        max_abs_lat = min(90.0, abs(lat) + (ring + 1) * self.cell_size_deg)
+        cos_lat = math.cos(math.radians(max_abs_lat))
+        half_gap = math.radians(min(gap_deg, 180.0)) / 2
+        lng_bound = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, cos_lat * math.sin(half_gap)))
+        return min(lat_bound, lng_bound)
+
+    def iter_candidates(self, lat, lng):
+        if not self._positions:
+            return
+        row, col = self._cell(lat, lng)
+        min_row, max_row, min_col, max_col = self._bounds
+        max_ring = max(row - min_row, max_row - row, col - min_col, max_col - col, 0)
+
+        cells = self._cells
+        for ring in range(max_ring + 1):
+            if 8 * ring > len(cells):
+                # El anillo tiene más celdas que la grilla ocupada: se agrupan
+                # las celdas ocupadas restantes por anillo en lugar de recorrerlo
+                yield from self._iter_remaining_rings(lat, row, col, ring)
+                return
+            ids = []
+            for cell in self._ring_cells(row, col, ring):
+                bucket = cells.get(cell)
+                if bucket:
+                    ids.extend(bucket)
+            yield ids, self._ring_lower_bound_km(lat, ring)
+
+    def _iter_remaining_rings(self, lat, row, col, start_ring):
+        rings = defaultdict(list)
+        for (r, c), bucket in list(self._cells.items()):
+            ring = max(abs(r - row), abs(c - col))
+            if ring >= start_ring:
+                rings[ring].extend(bucket)
+        for ring in sorted(rings):
+            yield rings[ring], self._ring_lower_bound_km(lat, ring)
+
+
+# Desplazamiento de la columna en la clave int64 de una celda: (fila << 32) + columna + 2**31
+_COL_OFFSET = 1 << 31
+
+
+def _cell_keys(rows, cols):
+    return (np.asarray(rows, dtype=np.int64) << 32) + (np.asarray(cols, dtype=np.int64) + _COL_OFFSET)
+
+
+class PackedGridSpatialIndex(GridSpatialIndex):
+    """
+    GridSpatialIndex en arreglos NumPy contiguos (claves de celda ordenadas, offsets
+    e ids, al estilo CSR) en lugar de dicts y sets: se construye una vez y se puede
+    guardar en .npy y abrir con mmap desde varios procesos sin copiarlo. Las
+    inserciones y eliminaciones posteriores van a un overlay propio del proceso
+    (las estructuras de GridSpatialIndex y un conjunto de ids eliminados)
+    """
+
+    ARRAYS = ('cell_keys', 'offsets', 'ids', 'sorted_ids')
+
+    def __init__(self, cell_size_deg=0.01, cell_keys=None, offsets=None, ids=None, sorted_ids=None):
+        super().__init__(cell_size_deg)
+        if cell_keys is None:
+            cell_keys, offsets = np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64)
+            ids = sorted_ids = np.empty(0, dtype=np.int64)
+        self._load_arrays(cell_keys, offsets, ids, sorted_ids)
+
+    def _load_arrays(self, cell_keys, offsets, ids, sorted_ids):
+        self.cell_keys = cell_keys
+        self.offsets = offsets
+        self.ids = ids
+        self.sorted_ids = sorted_ids
+        self._cell_rows = cell_keys >> 32
+        self._cell_cols = (cell_keys & 0xFFFFFFFF) - _COL_OFFSET
+        self._packed_bounds = None
+        if len(cell_keys):
+            self._packed_bounds = (int(self._cell_rows.min()), int(self._cell_rows.max()),
+                                   int(self._cell_cols.min()), int(self._cell_cols.max()))
+        self._removed = set()
+
+    def bulk_load(self, items):
+        """Construye los arreglos a partir de (id, lat, lng); reemplaza el contenido del índice"""
+        items = list(items)
+        size = len(items)
+        ids = np.fromiter((item[0] for item in items), dtype=np.int64, count=size)
+        lats = np.fromiter((item[1] for item in items), dtype=np.float64, count=size)
+        lngs = np.fromiter((item[2] for item in items), dtype=np.float64, count=size)
+        keys = _cell_keys(np.floor(lats / self.cell_size_deg), np.floor(lngs / self.cell_size_deg))
+        order = np.lexsort((ids, keys))
+        cell_keys, starts = np.unique(keys[order], return_index=True)
+        super().__init__(self.cell_size_deg)
+        self._load_arrays(cell_keys, np.append(starts, size).astype(np.int64), ids[order], np.sort(ids))
+
+    def _in_packed(self, item_id):
+        position = int(np.searchsorted(self.sorted_ids, item_id))
+        return position < len(self.sorted_ids) and self.sorted_ids[position] == item_id
+
+    def insert(self, item_id, lat, lng):
+        # La posición empaquetada queda descartada; la nueva vive en el overlay
+        if item_id not in self._removed and self._in_packed(item_id):
+            self._removed.add(item_id)
+        super().insert(item_id, lat, lng)
+
+    def remove(self, item_id):
+        if item_id in self._positions:
+            super().remove(item_id)
+        elif self._in_packed(item_id):
+            self._removed.add(item_id)
+
+    def __len__(self):
+        return len(self.ids) - len(self._removed) + len(self._positions)
+
+    def __contains__(self, item_id):
+        return item_id in self._positions or (item_id not in self._removed and self._in_packed(item_id))
+
+    def _packed_ids(self, positions):
+        """Ids de las celdas empaquetadas indicadas, sin los eliminados"""
+        ids = []
+        offsets = self.offsets
+        for position in positions:
+            ids.extend(self.ids[offsets[position]:offsets[position + 1]].tolist())
+        removed = self._removed
+        return [item_id for item_id in ids if item_id not in removed] if removed else ids
+
+    def _ring_keys(self, row, col, ring):
+        if ring == 0:
+            return _cell_keys([row], [col])
+        span = np.arange(col - ring, col + ring + 1)
+        side = np.arange(row - ring + 1, row + ring)
+        rows = np.concatenate((np.full(len(span), row - ring), np.full(len(span), row + ring), side, side))
+        cols = np.concatenate((span, span, np.full(len(side), col - ring), np.full(len(side), col + ring)))
+        return _cell_keys(rows, cols)
+
+    def iter_candidates(self, lat, lng):
+        if not len(self):
+            return
+        row, col = self._cell(lat, lng)
+        bounds = [bound for bound in (self._packed_bounds, self._bounds) if bound is not None]
+        min_row, max_row = min(b[0] for b in bounds), max(b[1] for b in bounds)
+        min_col, max_col = min(b[2] for b in bounds), max(b[3] for b in bounds)
+        max_ring = max(row - min_row, max_row - row, col - min_col, max_col - col, 0)
+
+        occupied = len(self.cell_keys) + len(self._cells)
+        cell_keys = self.cell_keys
+        for ring in range(max_ring + 1):
+            if 8 * ring > occupied:
+                # Igual que GridSpatialIndex: las celdas ocupadas restantes se agrupan por anillo
+                yield from self._iter_remaining_rings(lat, row, col, ring)
+                return
+            ids = []
+            if len(cell_keys):
+                keys = self._ring_keys(row, col, ring)
+                positions = np.minimum(np.searchsorted(cell_keys, keys), len(cell_keys) - 1)
+                ids = self._packed_ids(positions[cell_keys[positions] == keys].tolist())
+            if self._cells:
+                for cell in self._ring_cells(row, col, ring):
+                    bucket = self._cells.get(cell)
+                    if bucket:
+                        ids.extend(bucket)
+            yield ids, self._ring_lower_bound_km(lat, ring)
+
+    def _iter_remaining_rings(self, lat, row, col, start_ring):
+        rings = defaultdict(list)
+        if len(self.cell_keys):
+            cell_rings = np.maximum(np.abs(self._cell_rows - row), np.abs(self._cell_cols - col))
+            positions = np.flatnonzero(cell_rings >= start_ring)
+            if len(positions):
+                positions = positions[np.argsort(cell_rings[positions], kind='stable')]
+                for group in np.split(positions, np.flatnonzero(np.diff(cell_rings[positions])) + 1):
+                    rings[int(cell_rings[group[0]])] = self._packed_ids(group.tolist())
+        for (r, c), bucket in list(self._cells.items()):
+            ring = max(abs(r - row), abs(c - col))
+            if ring >= start_ring:
+                rings[ring].extend(bucket)
+        for ring in sorted(rings):
+            yield rings[ring], self._ring_lower_bound_km(lat, ring)
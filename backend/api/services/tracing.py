@@ -0,0 +1,261 @@
+from collections import deque
+import bisect
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+
+
+trace_logger = logging.getLogger('api.trace')
+
+# Límites superiores (ms) de los buckets de los histogramas de latencia
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current_trace = contextvars.ContextVar('smartpark_trace', default=None)
+_trace_ids = itertools.count(1)
+
+
+class LatencyHistogram:
+    """Histograma de latencias con buckets fijos; percentiles aproximados por bucket"""
+
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, value_ms):
+        self.counts[bisect.bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def percentile(self, fraction):
+        """Límite superior del bucket que contiene el percentil indicado"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total_ms / self.count, 4) if self.count else 0.0,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': round(self.max_ms, 4),
+            'buckets': {
+                **{str(bound): count for bound, count in zip(self.bounds, self.counts)},
+                '+Inf': self.counts[-1],
+            },
+        }
+
+
+class _NoopSpan:
+    """Span compartido cuando el tracing está desactivado o la petición no fue muestreada"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Trace:
+    __slots__ = ('id', 'name', 'started_at', 'stages', 'attributes')
+
+    def __init__(self, name):
+        self.id = next(_trace_ids)
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.stages = {}
+        self.attributes = {}
+
+
+class _Span:
+    __slots__ = ('trace', 'stage', 'started_at')
+
+    def __init__(self, trace, stage):
+        self.trace = trace
+        self.stage = stage
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        # Las etapas repetidas dentro de una misma traza (p. ej. distancia por anillo) se acumulan
+        elapsed_ms = (time.perf_counter() - self.started_at) * 1000
+        stages = self.trace.stages
+        stages[self.stage] = stages.get(self.stage, 0.0) + elapsed_ms
+        return False
+
+    def set(self, **attributes):
+        self.trace.attributes.update(attributes)
+
+
+class _RootSpan(_Span):
+    __slots__ = ('tracer', 'token')
+
+    def __init__(self, tracer, trace):
+        super().__init__(trace, trace.name)
+        self.tracer = tracer
+
+    def __enter__(self):
+        self.token = _current_trace.set(self.trace)
+        return self
+
+    def __exit__(self, *exc):
+        _current_trace.reset(self.token)
+        trace = self.trace
+        self.tracer._emit({
+            'trace_id': trace.id,
+            'name': trace.name,
+            'duration_ms': round((time.perf_counter() - trace.started_at) * 1000, 4),
+            'stages': {stage: round(ms, 4) for stage, ms in trace.stages.items()},
+            'error': exc[0].__name__ if exc and exc[0] is not None else None,
+            **trace.attributes,
+        })
+        return False
+
+
+class Tracer:
+    """
+    Trazas por etapas del camino de búsqueda (proxy, datos, filtros, distancia,
+    ruta, enriquecimiento) con costo casi nulo cuando está desactivado: span()
+    retorna un span compartido que no hace nada.
+
+    Con el tracing activo se muestrea sample_rate de las peticiones. Cada traza
+    terminada se encola en un buffer acotado (sin bloquear la petición) que un hilo
+    en segundo plano vacía hacia el logger 'api.trace' y los histogramas por etapa
+    """
+
+    def __init__(self, enabled=False, sample_rate=1.0, max_pending=10_000, flush_interval=0.5):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+        self._pending = deque()
+        self.max_pending = max_pending
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._worker = None
+        self.traces = 0
+        self.dropped = 0
+
+    def configure(self, enabled=None, sample_rate=None):
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+
+    def trace(self, name):
+        """Span raíz de una petición; decide el muestreo para todas sus etapas"""
+        if not self.enabled or (self.sample_rate < 1.0 and random.random() >= self.sample_rate):
+            return NOOP_SPAN
+        return _RootSpan(self, _Trace(name))
+
+    def traced(self, name):
+        """Decorador que envuelve la función (o corrutina) en trace(name)"""
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.trace(name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.trace(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def span(self, stage):
+        """Span de una etapa dentro de la traza en curso"""
+        if not self.enabled:
+            return NOOP_SPAN
+        trace = _current_trace.get()
+        if trace is None:
+            return NOOP_SPAN
+        return _Span(trace, stage)
+
+    def _emit(self, record):
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append(record)
+        if self._worker is None:
+            self._start_worker()
+
+    def _start_worker(self):
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='trace-sink', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self._drain()
+
+    def _drain(self):
+        """Vacía el buffer hacia los histogramas y el logger de trazas"""
+        log = trace_logger.isEnabledFor(logging.INFO)
+        with self._lock:
+            while self._pending:
+                record = self._pending.popleft()
+                self.traces += 1
+                self._observe(f"total:{record['name']}", record['duration_ms'])
+                for stage, ms in record['stages'].items():
+                    self._observe(stage, ms)
+                if log:
+                    trace_logger.info(json.dumps(record, default=str))
+
+    def _observe(self, stage, ms):
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            histogram = self._histograms[stage] = LatencyHistogram()
+        histogram.observe(ms)
+
+    def reset(self):
+        with self._lock:
+            self._pending.clear()
+            self._histograms.clear()
+            self.traces = 0
+            self.dropped = 0
+
+    def metrics(self):
+        """Histogramas de latencia por etapa y contadores de trazas"""
+        self._drain()
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'sample_rate': self.sample_rate,
+                'traces': self.traces,
+                'dropped': self.dropped,
+                'stages': {stage: histogram.summary() for stage, histogram in sorted(self._histograms.items())},
+            }
+
+
+tracer = Tracer()
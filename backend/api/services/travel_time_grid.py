@@ -0,0 +1,209 @@
+import json
+import math
+import os
+
+import numpy as np
+
+from api.services.road_network import ACCESS_SPEED_KMH, haversine_m_array
+
+
+class TravelTimeGrid:
+    """
+    Tabla precalculada de tiempos de viaje: la ciudad se divide en celdas lat/lng
+    y para cada celda se guardan los K parqueaderos más cercanos por tiempo de
+    viaje desde su centro (ordenados). Una búsqueda pasa a ser una lectura de
+    tabla en lugar de rutas punto a punto.
+
+    En disco es un directorio con meta.json y dos arreglos .npy (ids int64 y
+    minutos float32, K por celda, -1/inf como relleno) que se abren con mmap: los
+    workers comparten las páginas y una actualización incremental escrita por uno
+    es visible para los demás
+    """
+
+    META_FILE = 'meta.json'
+    IDS_FILE = 'parking_ids.npy'
+    MINUTES_FILE = 'minutes.npy'
+
+    def __init__(self, min_lat, min_lng, cell_size_deg, rows, cols, k, parking_ids, minutes, path=None):
+        self.min_lat = min_lat
+        self.min_lng = min_lng
+        self.cell_size_deg = cell_size_deg
+        self.rows = rows
+        self.cols = cols
+        self.k = k
+        self.parking_ids = parking_ids
+        self.minutes = minutes
+        self.path = path
+
+    def __len__(self):
+        return self.rows * self.cols
+
+    @classmethod
+    def create(cls, path, min_lat, min_lng, max_lat, max_lng, cell_size_deg=0.005, k=8):
+        """Crea en disco una tabla vacía que cubre la caja indicada"""
+        rows = max(1, math.ceil((max_lat - min_lat) / cell_size_deg))
+        cols = max(1, math.ceil((max_lng - min_lng) / cell_size_deg))
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, cls.META_FILE), 'w') as f:
+            json.dump({
+                'min_lat': min_lat, 'min_lng': min_lng, 'cell_size_deg': cell_size_deg,
+                'rows': rows, 'cols': cols, 'k': k,
+            }, f)
+        parking_ids = np.lib.format.open_memmap(
+            os.path.join(path, cls.IDS_FILE), mode='w+', dtype=np.int64, shape=(rows * cols, k)
+        )
+        minutes = np.lib.format.open_memmap(
+            os.path.join(path, cls.MINUTES_FILE), mode='w+', dtype=np.float32, shape=(rows * cols, k)
+        )
+        parking_ids[:] = -1
+        minutes[:] = np.inf
+        return cls(min_lat, min_lng, cell_size_deg, rows, cols, k, parking_ids, minutes, path)
+
+    @classmethod
+    def load(cls, path, writable=False):
+        """Abre la tabla con mmap (solo lectura salvo que se pidan actualizaciones)"""
+        with open(os.path.join(path, cls.META_FILE)) as f:
+            meta = json.load(f)
+        mode = 'r+' if writable else 'r'
+        return cls(
+            meta['min_lat'], meta['min_lng'], meta['cell_size_deg'], meta['rows'], meta['cols'], meta['k'],
+            np.load(os.path.join(path, cls.IDS_FILE), mmap_mode=mode),
+            np.load(os.path.join(path, cls.MINUTES_FILE), mmap_mode=mode),
+            path
+        )
+
+    def flush(self):
+        for array in (self.parking_ids, self.minutes):
+            if isinstance(array, np.memmap):
+                array.flush()
+
+    def cell_of(self, lat, lng):
+        """Índice de la celda que contiene el punto, o None si está fuera de la tabla"""
+        row = math.floor((lat - self.min_lat) / self.cell_size_deg)
+        col = math.floor((lng - self.min_lng) / self.cell_size_deg)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return row * self.cols + col
+        return None
+
+    def cell_centers(self, cells=None):
+        """(lats, lngs) de los centros de las celdas indicadas (todas por defecto)"""
+        if cells is None:
+            cells = np.arange(len(self))
+        cells = np.asarray(cells)
+        rows, cols = np.divmod(cells, self.cols)
+        return (self.min_lat + (rows + 0.5) * self.cell_size_deg,
+                self.min_lng + (cols + 0.5) * self.cell_size_deg)
+
+    def lookup(self, lat, lng):
+        """[(parking_id, minutos)] ordenados por tiempo desde la celda del punto ([] si está fuera)"""
+        cell = self.cell_of(lat, lng)
+        if cell is None:
+            return []
+        ids = self.parking_ids[cell]
+        valid = ids >= 0
+        return list(zip(ids[valid].tolist(), self.minutes[cell][valid].tolist()))
+
+    # --- Construcción -------------------------------------------------------
+
+    @staticmethod
+    def _items_by_node(network, parkings, access_mps):
+        """Ubica cada parqueadero (id, lat, lng) en su nodo con el tiempo del tramo de acceso"""
+        items_by_node = {}
+        for parking_id, lat, lng in parkings:
+            node, meters = network.nearest_node(lat, lng)
+            if node is not None:
+                items_by_node.setdefault(node, []).append((parking_id, meters / access_mps))
+        return items_by_node
+
+    def rebuild_cells(self, network, parkings, cells=None, access_speed_kmh=ACCESS_SPEED_KMH, progress=None):
+        """
+        Recalcula las celdas indicadas (todas por defecto) con una búsqueda Dijkstra por celda
+        progress(hechas, total) se llama cada 500 celdas
+        """
+        access_mps = access_speed_kmh / 3.6
+        items_by_node = self._items_by_node(network, parkings, access_mps)
+        if cells is None:
+            cells = range(len(self))
+        cells = list(cells)
+        lats, lngs = self.cell_centers(cells)
+        for done, (cell, lat, lng) in enumerate(zip(cells, lats.tolist(), lngs.tolist()), 1):
+            ids = np.full(self.k, -1, dtype=np.int64)
+            minutes = np.full(self.k, np.inf, dtype=np.float32)
+            node, meters = network.nearest_node(lat, lng)
+            if node is not None:
+                access = meters / access_mps
+                for i, (seconds, parking_id) in enumerate(network.nearest_items(node, items_by_node, self.k)):
+                    ids[i] = parking_id
+                    minutes[i] = (seconds + access) / 60
+            self.parking_ids[cell] = ids
+            self.minutes[cell] = minutes
+            if progress is not None and done % 500 == 0:
+                progress(done, len(cells))
+        self.flush()
+        return len(cells)
+
+    def improved_cells(self, network, lat, lng, access_speed_kmh=ACCESS_SPEED_KMH):
+        """
+        [(celda, minutos)] de las celdas donde un parqueadero en (lat, lng) entra a la
+        lista: su tiempo real desde el centro es menor que el K-ésimo (o la lista no
+        está llena). La cota en línea recta a la velocidad máxima descarta casi todas
+        las celdas; las demás se resuelven con una sola búsqueda hacia el parqueadero
+        """
+        access_mps = access_speed_kmh / 3.6
+        node, meters = network.nearest_node(lat, lng)
+        if node is None:
+            return []
+        # Ningún tramo (acceso o vía) es más rápido que la mayor de las dos velocidades
+        speed = max(network.max_speed_mps, access_mps)
+        center_lats, center_lngs = self.cell_centers()
+        lower_bound_minutes = haversine_m_array(lat, lng, center_lats, center_lngs) / speed / 60
+        kth = np.asarray(self.minutes[:, -1], dtype=np.float64)
+        candidates = np.flatnonzero(lower_bound_minutes < kth)
+        if not len(candidates):
+            return []
+
+        center_lats, center_lngs = self.cell_centers(candidates)
+        centers = [
+            network.nearest_node(center_lat, center_lng)
+            for center_lat, center_lng in zip(center_lats.tolist(), center_lngs.tolist())
+        ]
+        extra = meters / access_mps
+        budget = kth[candidates] * 60 - extra
+        to_parking = network.travel_times_to(node, float(budget.max()))
+        improved = []
+        for cell, (center_node, center_m) in zip(candidates.tolist(), centers):
+            seconds = to_parking.get(center_node)
+            if seconds is None:
+                continue
+            minutes = (seconds + extra + center_m / access_mps) / 60
+            if minutes < kth[cell]:
+                improved.append((cell, minutes))
+        return improved
+
+    def _insert(self, cell, parking_id, minutes):
+        """Agrega el parqueadero a la lista ordenada de la celda, descartando el K-ésimo"""
+        ids = self.parking_ids[cell]
+        valid = ids >= 0
+        entries = list(zip(self.minutes[cell][valid].tolist(), ids[valid].tolist()))
+        entries = sorted(entries + [(minutes, parking_id)])[:self.k]
+        self.minutes[cell, :len(entries)] = [entry[0] for entry in entries]
+        self.parking_ids[cell, :len(entries)] = [entry[1] for entry in entries]
+
+    def update_parking(self, network, parkings, parking_id, lat=None, lng=None, access_speed_kmh=ACCESS_SPEED_KMH):
+        """
+        Actualización incremental tras agregar, mover (lat/lng nuevos) o eliminar un parqueadero
+        Las celdas que ya lo incluían se recalculan (pueden necesitar el siguiente de la
+        lista); en las que su nueva ubicación mejora solo se inserta. Retorna las celdas cambiadas
+        """
+        containing = np.flatnonzero((self.parking_ids == parking_id).any(axis=1)).tolist()
+        if containing:
+            self.rebuild_cells(network, parkings, containing, access_speed_kmh)
+        inserted = 0
+        if lat is not None and lng is not None:
+            skip = set(containing)
+            for cell, minutes in self.improved_cells(network, lat, lng, access_speed_kmh):
+                if cell not in skip:
+                    self._insert(cell, parking_id, minutes)
+                    inserted += 1
+            self.flush()
+        return len(containing) + inserted
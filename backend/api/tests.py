@@ -1,3 +1,1938 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from rest_framework.renderers import JSONRenderer
+
+from api import views
+from api.models import Parking, ParkingSpace, SearchHistory
+from api.patterns.adapter import GPSAdapter, RoadNetworkGPSAdapter
+from api.patterns.composite import (
+    AvailabilityCriteria, CompositeCriteria, DistanceCriteria, MinFreeSpacesCriteria, PriceCriteria
+)
+from api.patterns.facade import ParkingSearchFacade
+from api.patterns.mediator import SearchMediator
+from api.patterns.proxy import ParkingSearchProxy
+from api.patterns.singleton import ParkingDataManager
+from api.renderers import FastJSONRenderer
+from api.services import polyline
+from api.services.availability_stream import AvailabilityBroadcaster, format_sse
+from api.services.availability_updates import apply_availability_updates, parse_timestamp
+from api.services.cache import LRUCache
+from api.services.event_bus import EventBus
+from api.services.history_writer import DROP_NEWEST, DROP_OLDEST, SearchHistoryWriter
+from api.services.occupancy import OccupancyCounters
+from api.services.parking_import import import_parkings, iter_records
+from api.services.payloads import SearchPayload
+from api.services.rate_limit import SQLiteTokenBucketRateLimiter, TokenBucketRateLimiter
+from api.services.reservations import SpaceReservationEngine
+from api.services.road_network import ACCESS_SPEED_KMH, RoadNetwork, haversine_m
+from api.services.route_cache import RouteCache
+from api.services.shared_snapshot import SharedSnapshotStore
+from api.services.singleflight import SingleFlight
+from api.services.snapshot import ParkingSnapshot
+from api.services.spatial_index import GridSpatialIndex, bounding_box
+from api.services.tracing import NOOP_SPAN, Tracer
+from api.services.travel_time_grid import TravelTimeGrid
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def create_parkings(count, seed=7, **fields):
+    """Parqueaderos al azar en ~20 km alrededor de Cali, con precios y capacidades variados"""
+    rng = random.Random(seed)
+    return Parking.objects.bulk_create([
+        Parking(
+            name=f'Parqueadero {i}',
+            latitude=3.45 + rng.uniform(-0.1, 0.1),
+            longitude=-76.53 + rng.uniform(-0.1, 0.1),
+            price_per_hour=rng.choice([2000, 3000, 4000, 5000]),
+            capacity=rng.randint(1, 20),
+            is_available=rng.random() < 0.7,
+            **fields
+        )
+        for i in range(count)
+    ])
+
+
+def brute_force_nearest(parkings, location, k=None, predicate=lambda parking: True):
+    """(distancia, id) ordenados recorriendo todos los parqueaderos, como referencia"""
+    adapter = GPSAdapter()
+    found = sorted(
+        (adapter.get_distance(location['lat'], location['lng'], parking.latitude, parking.longitude), parking.id)
+        for parking in parkings
+        if parking.is_available and predicate(parking)
+    )
+    return found if k is None else found[:k]
+
+
+class GridSpatialIndexTest(SimpleTestCase):
+    """Los anillos del índice y su cota inferior encuentran el mismo más cercano que recorrer todo"""
+
+    def setUp(self):
+        rng = random.Random(1)
+        self.points = {
+            item_id: (3.45 + rng.uniform(-0.3, 0.3), -76.53 + rng.uniform(-0.3, 0.3))
+            for item_id in range(500)
+        }
+        self.index = GridSpatialIndex()
+        self.index.bulk_load((item_id, lat, lng) for item_id, (lat, lng) in self.points.items())
+        self.adapter = GPSAdapter()
+
+    def nearest_from_index(self, lat, lng):
+        best = None
+        for ids, min_distance in self.index.iter_candidates(lat, lng):
+            if best is not None and min_distance > best[0]:
+                break
+            for item_id in ids:
+                candidate = (self.adapter.external_service.compute_distance_km(lat, lng, *self.points[item_id]), item_id)
+                best = min(best, candidate) if best is not None else candidate
+        return best
+
+    def brute_force(self, lat, lng):
+        return min(
+            (self.adapter.external_service.compute_distance_km(lat, lng, *point), item_id)
+            for item_id, point in self.points.items()
+        )
+
+    def test_nearest_matches_brute_force(self):
+        rng = random.Random(2)
+        # Incluye orígenes dentro y fuera de la zona ocupada por la grilla
+        for _ in range(200):
+            lat, lng = 3.45 + rng.uniform(-0.6, 0.6), -76.53 + rng.uniform(-0.6, 0.6)
+            self.assertEqual(self.nearest_from_index(lat, lng), self.brute_force(lat, lng))
+
+    def test_removed_items_are_not_candidates(self):
+        lat, lng = 3.45, -76.53
+        nearest = self.brute_force(lat, lng)[1]
+        self.index.remove(nearest)
+        del self.points[nearest]
+        self.assertNotIn(nearest, self.index)
+        self.assertEqual(self.nearest_from_index(lat, lng), self.brute_force(lat, lng))
+
+        self.index.insert(nearest, lat, lng)
+        self.points[nearest] = (lat, lng)
+        self.assertEqual(self.nearest_from_index(lat, lng), (0.0, nearest))
+        self.assertEqual(len(self.index), 500)
+
+    def test_query_radius_contains_every_point_in_range(self):
+        lat, lng, radius_km = 3.45, -76.53, 5.0
+        inside = {
+            item_id for item_id, point in self.points.items()
+            if self.adapter.external_service.compute_distance_km(lat, lng, *point) <= radius_km
+        }
+        self.assertTrue(inside)
+        self.assertLessEqual(inside, set(self.index.query_radius(lat, lng, radius_km)))
+
+
+class BatchHaversineTest(SimpleTestCase):
+    """Las distancias por lotes coinciden con la fórmula escalar"""
+
+    def setUp(self):
+        rng = np.random.default_rng(4)
+        self.lats = 3.45 + rng.uniform(-1, 1, 200)
+        self.lngs = -76.53 + rng.uniform(-1, 1, 200)
+        self.origins = [{'lat': 3.45 + dlat, 'lng': -76.53 + dlng} for dlat, dlng in rng.uniform(-1, 1, (20, 2))]
+        self.adapter = GPSAdapter()
+
+    def test_vector_matches_scalar(self):
+        service = self.adapter.external_service
+        for origin in self.origins:
+            expected = [
+                service.compute_distance_km(origin['lat'], origin['lng'], lat, lng)
+                for lat, lng in zip(self.lats.tolist(), self.lngs.tolist())
+            ]
+            distances = service.compute_distances_km(origin['lat'], origin['lng'], self.lats, self.lngs)
+            np.testing.assert_allclose(distances, expected, rtol=1e-12)
+
+    def test_matrix_rows_equal_vector_results(self):
+        matrix = self.adapter.get_distance_matrix(self.origins, self.lats, self.lngs)
+        self.assertEqual(matrix.shape, (len(self.origins), len(self.lats)))
+        for origin, row in zip(self.origins, matrix):
+            np.testing.assert_array_equal(row, self.adapter.get_distances(origin, self.lats, self.lngs))
+
+
+class CriteriaCompilationTest(TestCase):
+    """Los filtros Q (con el prefiltro por caja) y las máscaras dan el mismo resultado que matches()"""
+
+    def setUp(self):
+        rng = random.Random(5)
+        self.parkings = create_parkings(200)
+        for parking in self.parkings:
+            parking.occupied_spaces = rng.randint(0, parking.capacity)
+        Parking.objects.bulk_update(self.parkings, ['occupied_spaces'])
+        self.adapter = GPSAdapter()
+        self.location = {'lat': 3.45, 'lng': -76.53}
+
+    def leaves(self):
+        return [
+            AvailabilityCriteria(),
+            PriceCriteria(3000),
+            MinFreeSpacesCriteria(5),
+            DistanceCriteria(4, self.adapter),
+            DistanceCriteria(9, self.adapter),
+        ]
+
+    def random_tree(self, rng, depth=0):
+        if depth == 3 or rng.random() < 0.3:
+            return rng.choice(self.leaves())
+        tree = CompositeCriteria(rng.choice(['AND', 'OR']))
+        for _ in range(rng.randint(1, 3)):
+            tree.add(self.random_tree(rng, depth + 1))
+        return tree
+
+    def expected(self, criteria):
+        return {parking.id for parking in self.parkings if criteria.matches(parking, self.location)}
+
+    def from_q(self, criteria):
+        q, residual = criteria.compile_q(self.location)
+        queryset = Parking.objects.filter(q) if q is not None else Parking.objects.all()
+        return {
+            parking.id for parking in queryset
+            if residual is None or residual.matches(parking, self.location)
+        }
+
+    def from_mask(self, criteria):
+        snapshot = ParkingSnapshot.load()
+        columns = snapshot.columns()
+        columns['distance_km'] = self.adapter.get_distances(self.location, columns['latitude'], columns['longitude'])
+        mask, residual = criteria.compile_mask(columns, self.location)
+        rows = np.flatnonzero(mask) if mask is not None else range(len(snapshot))
+        return {
+            int(snapshot.ids[row]) for row in rows
+            if residual is None or residual.matches(
+                Parking.objects.get(id=int(snapshot.ids[row])), self.location
+            )
+        }
+
+    def test_nested_trees_match(self):
+        rng = random.Random(6)
+        for _ in range(40):
+            criteria = self.random_tree(rng)
+            expected = self.expected(criteria)
+            self.assertEqual(self.from_q(criteria), expected)
+            self.assertEqual(self.from_mask(criteria), expected)
+
+    def test_distance_prefilter_keeps_every_match(self):
+        criteria = DistanceCriteria(4, self.adapter)
+        q, residual = criteria.compile_q(self.location)
+        self.assertIs(residual, criteria)
+        prefiltered = set(Parking.objects.filter(q).values_list('id', flat=True))
+        self.assertLess(len(prefiltered), len(self.parkings))
+        self.assertLessEqual(self.expected(criteria), prefiltered)
+
+    def test_bounding_box_across_the_antimeridian(self):
+        min_lat, max_lat, lng_ranges = bounding_box(0.0, 179.99, 5)
+        self.assertLess(min_lat, 0.0)
+        self.assertGreater(max_lat, 0.0)
+        self.assertEqual(len(lng_ranges), 2)
+        self.assertEqual(lng_ranges[0][1], 180.0)
+        self.assertEqual(lng_ranges[1][0], -180.0)
+        self.assertIsNone(bounding_box(89.99, 0.0, 5)[2])
+
+
+class FakeSearchService:
+    """Servicio real de búsqueda para el proxy: el más cercano de una lista fija, contando llamadas"""
+
+    ranks_by_travel_time = False
+
+    def __init__(self, parkings):
+        self.parkings = parkings  # [(id, lat, lng)]
+        self.calls = 0
+        self.batches = []
+        self.gps = GPSAdapter()
+
+    def find_nearest_parking(self, user_location, filters=None):
+        self.calls += 1
+        distance, parking_id = min(
+            (self.gps.get_distance(user_location['lat'], user_location['lng'], lat, lng), parking_id)
+            for parking_id, lat, lng in self.parkings
+        )
+        return {'id': parking_id, 'distance_km': distance}
+
+    def find_nearest_batch(self, searches):
+        self.batches.append(len(searches))
+        return [self.find_nearest_parking(location, filters) for location, filters in searches]
+
+
+class LRUCacheTest(SimpleTestCase):
+    """Vencimiento por TTL, expulsión LRU e invalidación por etiqueta (id de parqueadero)"""
+
+    def test_entries_expire_after_ttl(self):
+        clock = FakeClock()
+        cache = LRUCache(ttl_seconds=30, clock=clock)
+        cache.set('busqueda', {'id': 1})
+        clock.now += 29
+        self.assertEqual(cache.get('busqueda'), {'id': 1})
+        clock.now += 1
+        self.assertIsNone(cache.get('busqueda'))
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(max_entries=2, clock=FakeClock())
+        cache.set('a', 'A')
+        cache.set('b', 'B')
+        cache.get('a')
+        cache.set('c', 'C')
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), ('A', None, 'C'))
+
+    def test_invalidate_tag_removes_only_tagged_entries(self):
+        cache = LRUCache(ttl_seconds=30, clock=FakeClock())
+        cache.set('a', 'A', tags=[1, 2])
+        cache.set('b', 'B', tags=[2])
+        cache.set('c', 'C', tags=[3])
+
+        self.assertEqual(cache.invalidate_tag(2), 2)
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 'C')
+        # La etiqueta 1 ya no apunta a la entrada expulsada
+        self.assertEqual(cache.invalidate_tag(1), 0)
+
+
+class ProxyInvalidationTest(SimpleTestCase):
+    """Un cambio de disponibilidad solo expulsa los resultados que puede alterar"""
+
+    def setUp(self):
+        self.service = FakeSearchService([(1, 3.45, -76.53), (2, 3.55, -76.53)])
+        self.proxy = ParkingSearchProxy(self.service)
+        self.near_first = {'lat': 3.451, 'lng': -76.53}
+        self.near_second = {'lat': 3.549, 'lng': -76.53}
+
+    def search(self, location):
+        return self.proxy.find_nearest_parking(location)['id']
+
+    def test_repeated_search_is_served_from_cache(self):
+        self.assertEqual([self.search(self.near_first) for _ in range(3)], [1, 1, 1])
+        self.assertEqual(self.service.calls, 1)
+
+    def test_unavailable_parking_evicts_only_its_results(self):
+        self.search(self.near_first)
+        self.search(self.near_second)
+        self.proxy.invalidate_cache(parking_id=1, is_available=False)
+        self.search(self.near_second)
+        self.assertEqual(self.service.calls, 2)
+        self.search(self.near_first)
+        self.assertEqual(self.service.calls, 3)
+
+    def test_available_parking_evicts_results_it_could_improve(self):
+        self.search(self.near_first)
+        self.search(self.near_second)
+        # Un parqueadero nuevo junto al segundo origen: solo ese resultado puede mejorar
+        self.proxy.invalidate_cache(parking_id=3, is_available=True, location={'lat': 3.549, 'lng': -76.531})
+        self.search(self.near_first)
+        self.assertEqual(self.service.calls, 2)
+        self.search(self.near_second)
+        self.assertEqual(self.service.calls, 3)
+
+
+class NearestParkingTest(TestCase):
+    """La fachada retorna el mismo más cercano que un recorrido completo de la tabla"""
+
+    def setUp(self):
+        self.parkings = create_parkings(300)
+        ParkingDataManager().invalidate()
+        self.facade = ParkingSearchFacade()
+
+    def test_nearest_matches_brute_force(self):
+        rng = random.Random(3)
+        for _ in range(50):
+            location = {'lat': 3.45 + rng.uniform(-0.15, 0.15), 'lng': -76.53 + rng.uniform(-0.15, 0.15)}
+            expected = brute_force_nearest(self.parkings, location, k=1)[0]
+            result = self.facade.find_nearest_parking(location)
+            self.assertEqual((result['distance_km'], result['id']), expected)
+
+    def test_filters_match_brute_force(self):
+        location = {'lat': 3.46, 'lng': -76.52}
+        filters = {'max_price': 3000, 'max_distance': 5}
+        expected = brute_force_nearest(self.parkings, location, k=1, predicate=lambda p: p.price_per_hour <= 3000)
+        result = self.facade.find_nearest_parking(location, filters)
+        self.assertEqual((result['distance_km'], result['id']), expected[0])
+        self.assertLessEqual(result['distance_km'], 5)
+
+    def test_no_available_parking(self):
+        Parking.objects.update(is_available=False)
+        ParkingDataManager().invalidate()
+        self.assertIsNone(self.facade.find_nearest_parking({'lat': 3.45, 'lng': -76.53}))
+
+
+class BatchSearchTest(TestCase):
+    """Una búsqueda por lotes da lo mismo que N búsquedas individuales"""
+
+    def setUp(self):
+        self.parkings = create_parkings(300)
+        ParkingDataManager().invalidate()
+        self.facade = ParkingSearchFacade()
+
+    def test_batch_matches_single_searches(self):
+        rng = random.Random(8)
+        filter_choices = [None, {'max_price': 3000}, {'max_distance': 2}, {'min_free_spaces': 10, 'max_price': 4000}]
+        searches = [
+            (
+                {'lat': 3.45 + rng.uniform(-0.15, 0.15), 'lng': -76.53 + rng.uniform(-0.15, 0.15)},
+                rng.choice(filter_choices)
+            )
+            for _ in range(60)
+        ]
+        # Un origen lejano sin ningún parqueadero dentro del radio pedido
+        searches.append(({'lat': 4.6, 'lng': -74.08}, {'max_distance': 1}))
+
+        results = self.facade.find_nearest_batch(searches)
+        # Otra fachada (con su propio caché de rutas) resuelve las mismas búsquedas una a una
+        single = ParkingSearchFacade()
+        self.assertEqual(results, [single.find_nearest_parking(location, filters) for location, filters in searches])
+        self.assertIsNone(results[-1])
+
+    def test_proxy_resolves_only_cache_misses(self):
+        service = FakeSearchService([(1, 3.45, -76.53), (2, 3.55, -76.53)])
+        proxy = ParkingSearchProxy(service)
+        first, second = {'lat': 3.451, 'lng': -76.53}, {'lat': 3.549, 'lng': -76.53}
+
+        self.assertEqual([result['id'] for result in proxy.find_nearest_batch([(first, None)])], [1])
+        results = proxy.find_nearest_batch([(first, None), (second, None), (first, None)])
+        self.assertEqual([result['id'] for result in results], [1, 2, 1])
+        self.assertEqual(service.batches, [1, 1])
+
+
+class SearchHistoryWriterTest(TestCase):
+    """El historial se guarda completo y en orden; con el buffer lleno se aplica la política de descarte"""
+
+    def records(self, count):
+        return [(None, 3.45 + i / 1000, -76.53, None) for i in range(count)]
+
+    def saved_latitudes(self):
+        return list(SearchHistory.objects.order_by('id').values_list('search_latitude', flat=True))
+
+    def test_synchronous_writer_saves_immediately(self):
+        writer = SearchHistoryWriter(batch_size=2, synchronous=True)
+        records = self.records(5)
+        self.assertEqual(writer.record_many(records), 5)
+        self.assertEqual(self.saved_latitudes(), [record[1] for record in records])
+        self.assertEqual(writer.stats()['written'], 5)
+
+    def test_drop_newest_keeps_the_first_records(self):
+        writer = SearchHistoryWriter(max_pending=3, drop_policy=DROP_NEWEST)
+        # Sin hilo en segundo plano: el buffer se llena y flush() lo guarda en este hilo
+        records = self.records(5)
+        accepted = [writer._offer(record) for record in records]
+        self.assertEqual(accepted, [True, True, True, False, False])
+        writer.flush()
+        self.assertEqual(self.saved_latitudes(), [record[1] for record in records[:3]])
+        self.assertEqual(writer.stats()['dropped'], 2)
+
+    def test_drop_oldest_keeps_the_last_records(self):
+        writer = SearchHistoryWriter(max_pending=3, drop_policy=DROP_OLDEST)
+        records = self.records(5)
+        self.assertTrue(all(writer._offer(record) for record in records))
+        writer.flush()
+        self.assertEqual(self.saved_latitudes(), [record[1] for record in records[2:]])
+        self.assertEqual(writer.stats()['dropped'], 2)
+
+    def test_invalid_drop_policy(self):
+        with self.assertRaises(ValueError):
+            SearchHistoryWriter(drop_policy='ignorar')
+
+
+class SearchHistoryWriteBehindTest(TransactionTestCase):
+    """El hilo en segundo plano guarda por lotes y close() no pierde registros"""
+
+    def test_background_writer_saves_every_record_in_order(self):
+        writer = SearchHistoryWriter(batch_size=4, flush_interval=0.05)
+        records = [(None, 3.45 + i / 1000, -76.53, None) for i in range(10)]
+        self.assertEqual(writer.record_many(records), 10)
+        writer.close()
+
+        self.assertEqual(
+            list(SearchHistory.objects.order_by('id').values_list('search_latitude', flat=True)),
+            [record[1] for record in records]
+        )
+        stats = writer.stats()
+        self.assertEqual((stats['written'], stats['dropped'], stats['pending']), (10, 0, 0))
+
+
+class TracerTest(SimpleTestCase):
+    """Las etapas se acumulan en la traza en curso y llegan a los histogramas y al logger"""
+
+    def setUp(self):
+        # El hilo de vaciado no alcanza a despertar: metrics() vacía el buffer en el test
+        self.tracer = Tracer(enabled=True, flush_interval=60)
+        # Las trazas solo se escriben en los tests que las capturan con assertLogs
+        trace_logger = logging.getLogger('api.trace')
+        self.addCleanup(trace_logger.setLevel, trace_logger.level)
+        trace_logger.setLevel(logging.WARNING)
+
+    def test_disabled_tracer_returns_noop_spans(self):
+        tracer = Tracer()
+        with tracer.trace('busqueda') as root:
+            self.assertIs(root, NOOP_SPAN)
+            self.assertIs(tracer.span('distance'), NOOP_SPAN)
+        self.assertEqual(tracer.metrics()['traces'], 0)
+
+    def test_span_outside_a_trace_is_noop(self):
+        self.assertIs(self.tracer.span('distance'), NOOP_SPAN)
+
+    def test_stages_are_recorded_per_trace(self):
+        @self.tracer.traced('busqueda')
+        def search():
+            # Etapas repetidas dentro de la traza se suman en una sola observación
+            for _ in range(3):
+                with self.tracer.span('distance'):
+                    pass
+            with self.tracer.span('routing'):
+                pass
+
+        for _ in range(4):
+            search()
+        metrics = self.tracer.metrics()
+        self.assertEqual(metrics['traces'], 4)
+        self.assertEqual(set(metrics['stages']), {'total:busqueda', 'distance', 'routing'})
+        self.assertEqual(metrics['stages']['distance']['count'], 4)
+        self.assertEqual(sum(metrics['stages']['routing']['buckets'].values()), 4)
+
+    def test_log_record_includes_attributes_and_error(self):
+        with self.assertLogs('api.trace', level='INFO') as logs:
+            with self.assertRaises(ValueError):
+                with self.tracer.trace('busqueda') as root:
+                    root.set(results=0)
+                    raise ValueError('sin datos')
+            self.tracer.metrics()
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['name'], record['error'], record['results']), ('busqueda', 'ValueError', 0))
+
+    def test_concurrent_tasks_keep_separate_traces(self):
+        @self.tracer.traced('async_busqueda')
+        async def search(stage):
+            await asyncio.sleep(0)
+            with self.tracer.span(stage):
+                await asyncio.sleep(0.001)
+
+        async def main():
+            await asyncio.gather(search('a'), search('b'))
+
+        with self.assertLogs('api.trace', level='INFO') as logs:
+            asyncio.run(main())
+            self.tracer.metrics()
+        stages = sorted(tuple(json.loads(log.getMessage())['stages']) for log in logs.records)
+        self.assertEqual(stages, [('a',), ('b',)])
+
+    def test_full_buffer_drops_traces(self):
+        tracer = Tracer(enabled=True, max_pending=2, flush_interval=60)
+        for _ in range(5):
+            with tracer.trace('busqueda'):
+                pass
+        metrics = tracer.metrics()
+        self.assertEqual((metrics['traces'], metrics['dropped']), (2, 3))
+
+
+class SingleFlightTest(SimpleTestCase):
+    """N llamadas concurrentes con la misma clave ejecutan un solo cálculo"""
+
+    CALLERS = 8
+
+    def test_concurrent_threads_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def search():
+            calls.append(1)
+            release.wait(5)
+            return {'id': 1}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do('clave', search)))
+            for _ in range(self.CALLERS)
+        ]
+        for thread in threads:
+            thread.start()
+        # El cálculo no termina hasta que todas las demás llamadas están esperándolo
+        deadline = time.monotonic() + 5
+        while flight.coalesced < self.CALLERS - 1 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'id': 1}] * self.CALLERS)
+        self.assertEqual(flight.stats()['executions'], 1)
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_errors_reach_every_caller(self):
+        flight = SingleFlight()
+
+        async def search():
+            await asyncio.sleep(0.01)
+            raise ValueError('sin conexión')
+
+        async def main():
+            return await asyncio.gather(
+                *(flight.do_async('clave', search) for _ in range(self.CALLERS)), return_exceptions=True
+            )
+
+        errors = asyncio.run(main())
+        self.assertEqual(len(errors), self.CALLERS)
+        self.assertTrue(all(isinstance(error, ValueError) for error in errors))
+        self.assertEqual(flight.executions, 1)
+
+    def test_concurrent_tasks_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def search():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {'id': 1}
+
+        async def main():
+            return await asyncio.gather(*(flight.do_async('clave', search) for _ in range(self.CALLERS)))
+
+        self.assertEqual(asyncio.run(main()), [{'id': 1}] * self.CALLERS)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flight.coalesced, self.CALLERS - 1)
+
+    def test_cancelled_leader_does_not_cancel_followers(self):
+        flight = SingleFlight()
+        finished = []
+
+        async def search():
+            await asyncio.sleep(0.05)
+            finished.append(1)
+            return {'id': 1}
+
+        async def main():
+            leader = asyncio.ensure_future(flight.do_async('clave', search))
+            await asyncio.sleep(0)
+            followers = [asyncio.ensure_future(flight.do_async('clave', search)) for _ in range(3)]
+            await asyncio.sleep(0.01)
+            leader.cancel()  # el cliente que inició la búsqueda se desconecta
+            results = await asyncio.gather(*followers)
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return results
+
+        self.assertEqual(asyncio.run(main()), [{'id': 1}] * 3)
+        self.assertEqual(finished, [1])
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_search_is_cancelled_when_nobody_waits(self):
+        flight = SingleFlight()
+        finished = []
+
+        async def search():
+            await asyncio.sleep(0.05)
+            finished.append(1)
+
+        async def main():
+            callers = [asyncio.ensure_future(flight.do_async('clave', search)) for _ in range(2)]
+            await asyncio.sleep(0.01)
+            for caller in callers:
+                caller.cancel()
+            await asyncio.gather(*callers, return_exceptions=True)
+            await asyncio.sleep(0.06)
+
+        asyncio.run(main())
+        self.assertEqual(finished, [])
+        self.assertEqual(flight.in_flight(), 0)
+
+
+class TokenBucketRateLimiterTest(SimpleTestCase):
+    """Ráfaga de capacity peticiones, rechazo con el tiempo de espera y recarga"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='smartpark-rate-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def limiters(self, clock):
+        yield TokenBucketRateLimiter(capacity=2, refill_per_second=1, clock=clock)
+        yield SQLiteTokenBucketRateLimiter(
+            os.path.join(self.directory, 'rate_limit.sqlite3'), capacity=2, refill_per_second=1, clock=clock
+        )
+
+    def test_rejects_after_burst_and_refills(self):
+        clock = FakeClock()
+        for limiter in self.limiters(clock):
+            with self.subTest(limiter=type(limiter).__name__):
+                self.assertEqual(limiter.acquire('ip:1'), 0)
+                self.assertEqual(limiter.acquire('ip:1'), 0)
+                self.assertAlmostEqual(limiter.acquire('ip:1'), 1.0)
+                # Cada clave tiene su propio bucket
+                self.assertEqual(limiter.acquire('ip:2'), 0)
+
+                clock.now += 0.5
+                self.assertAlmostEqual(limiter.acquire('ip:1'), 0.5)
+                clock.now += 0.5
+                self.assertEqual(limiter.acquire('ip:1'), 0)
+                self.assertGreater(limiter.acquire('ip:1'), 0)
+
+                # Sin uso, el bucket vuelve a estar lleno (y no más que lleno)
+                clock.now += 60
+                self.assertEqual([limiter.acquire('ip:1') for _ in range(2)], [0, 0])
+                self.assertGreater(limiter.acquire('ip:1'), 0)
+
+    def test_proxy_rejects_before_searching(self):
+        service = FakeSearchService([(1, 3.45, -76.53)])
+        proxy = ParkingSearchProxy(
+            service, rate_limiter=TokenBucketRateLimiter(capacity=1, refill_per_second=0.5, clock=FakeClock())
+        )
+        location = {'lat': 3.45, 'lng': -76.53}
+        self.assertEqual(proxy.find_nearest_parking(location, user_id=7)['id'], 1)
+        self.assertEqual(
+            proxy.find_nearest_parking(location, user_id=7), {'error': 'Rate limit exceeded', 'retry_after': 2}
+        )
+        # Otro usuario no comparte el bucket
+        self.assertEqual(proxy.find_nearest_parking(location, user_id=8)['id'], 1)
+        self.assertEqual(service.calls, 1)
+
+
+class KNearestTest(TestCase):
+    """Las páginas por cursor recorren los parqueaderos en el mismo orden que un ordenamiento completo"""
+
+    def setUp(self):
+        self.parkings = create_parkings(150)
+        ParkingDataManager().invalidate()
+        self.facade = ParkingSearchFacade()
+        self.location = {'lat': 3.44, 'lng': -76.54}
+
+    def paginate(self, page_size, filters=None):
+        found, after = [], None
+        while True:
+            page = self.facade.find_k_nearest(self.location, page_size, filters, after)
+            found.extend((result['distance_km'], result['id']) for result in page)
+            if len(page) < page_size:
+                return found
+            after = found[-1]
+
+    def test_first_page_matches_brute_force(self):
+        page = self.facade.find_k_nearest(self.location, 10)
+        self.assertEqual(
+            [(result['distance_km'], result['id']) for result in page],
+            brute_force_nearest(self.parkings, self.location, 10)
+        )
+        # Las rutas se piden aparte (get_route) solo para los resultados que se expanden
+        self.assertTrue(all(result['route'] is None for result in page))
+
+    def test_cursor_pages_cover_every_parking_once(self):
+        for page_size in (1, 7, 50):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.paginate(page_size), brute_force_nearest(self.parkings, self.location))
+
+    def test_cursor_pages_with_filters(self):
+        filters = {'max_price': 3000, 'max_distance': 8}
+        expected = brute_force_nearest(
+            self.parkings, self.location,
+            predicate=lambda p: p.price_per_hour <= 3000 and GPSAdapter().get_distance(
+                self.location['lat'], self.location['lng'], p.latitude, p.longitude) <= 8
+        )
+        self.assertEqual(self.paginate(6, filters), expected)
+
+    def test_route_for_an_expanded_result(self):
+        parking = self.parkings[0]
+        self.assertIsNotNone(self.facade.get_route(self.location, parking.id))
+        self.assertIsNone(self.facade.get_route(self.location, -1))
+
+
+def grid_road_network(size=12, seed=9, spacing_deg=0.002):
+    """Red vial en cuadrícula alrededor de Cali con velocidades al azar y algunas vías de un solo sentido"""
+    rng = random.Random(seed)
+    latitude = [3.44 + (i // size) * spacing_deg for i in range(size * size)]
+    longitude = [-76.54 + (i % size) * spacing_deg for i in range(size * size)]
+    edges = []
+    for u in range(size * size):
+        for v in (u + 1 if (u + 1) % size else None, u + size if u + size < size * size else None):
+            if v is None:
+                continue
+            meters = haversine_m(latitude[u], longitude[u], latitude[v], longitude[v])
+            seconds = meters / (rng.choice([15, 25, 40, 60]) / 3.6)
+            edges.append((u, v, seconds, meters))
+            if rng.random() < 0.85:
+                edges.append((v, u, seconds, meters))
+    return RoadNetwork.from_edges(latitude, longitude, edges)
+
+
+class RoadNetworkTest(SimpleTestCase):
+    """A* y Dijkstra uno-a-muchos coinciden sobre el grafo CSR"""
+
+    def setUp(self):
+        self.network = grid_road_network()
+
+    def test_csr_keeps_every_edge(self):
+        network = RoadNetwork.from_edges([0, 0, 0], [0, 1, 2], [(2, 0, 5, 10), (0, 1, 1, 2), (0, 2, 3, 4)])
+        self.assertEqual(network.edge_count, 3)
+        self.assertEqual(network.offsets.tolist(), [0, 2, 2, 3])
+        self.assertEqual(sorted(network.targets[0:2].tolist()), [1, 2])
+        self.assertEqual(network.targets[2], 0)
+
+    def test_shortest_path_matches_dijkstra(self):
+        rng = random.Random(10)
+        nodes = range(len(self.network))
+        for _ in range(40):
+            source = rng.choice(nodes)
+            targets = rng.sample(nodes, 5)
+            for target, seconds in zip(targets, self.network.travel_times(source, targets)):
+                found = self.network.shortest_path(source, target)
+                if math.isinf(seconds):
+                    self.assertIsNone(found)
+                    continue
+                path, path_seconds, _ = found
+                self.assertAlmostEqual(path_seconds, seconds, places=6)
+                self.assertEqual((path[0], path[-1]), (source, target))
+
+    def test_nearest_items_matches_travel_times(self):
+        rng = random.Random(11)
+        items_by_node = {}
+        for item in range(30):
+            items_by_node.setdefault(rng.randrange(len(self.network)), []).append((item, rng.uniform(0, 60)))
+        nodes = list(items_by_node)
+        for source in rng.sample(range(len(self.network)), 10):
+            seconds = dict(zip(nodes, self.network.travel_times(source, nodes)))
+            expected = sorted(
+                (seconds[node] + extra, item)
+                for node, items in items_by_node.items() for item, extra in items
+                if not math.isinf(seconds[node])
+            )[:5]
+            found = self.network.nearest_items(source, items_by_node, 5)
+            self.assertEqual([item for _, item in found], [item for _, item in expected])
+
+    def test_nearest_node(self):
+        node, meters = self.network.nearest_node(3.4401, -76.5399)
+        self.assertEqual(node, 0)
+        self.assertLess(meters, 20)
+        self.assertEqual(RoadNetwork.from_edges([], [], []).nearest_node(3.44, -76.54), (None, None))
+
+    def test_save_and_load(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'red.npz')
+        self.network.save(path)
+        loaded = RoadNetwork.load(path)
+        self.assertEqual((len(loaded), loaded.edge_count), (len(self.network), self.network.edge_count))
+        self.assertEqual(loaded.shortest_path(0, 50)[1], self.network.shortest_path(0, 50)[1])
+
+    def test_from_osm_honours_oneway_and_maxspeed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'extracto.osm')
+        with open(path, 'w') as f:
+            f.write(
+                '<osm>'
+                '<node id="1" lat="3.44" lon="-76.54"/><node id="2" lat="3.441" lon="-76.54"/>'
+                '<node id="3" lat="3.442" lon="-76.54"/>'
+                '<way id="10"><nd ref="1"/><nd ref="2"/><tag k="highway" v="residential"/></way>'
+                '<way id="11"><nd ref="2"/><nd ref="3"/><tag k="highway" v="primary"/>'
+                '<tag k="oneway" v="yes"/><tag k="maxspeed" v="36"/></way>'
+                '<way id="12"><nd ref="1"/><nd ref="3"/><tag k="highway" v="footway"/></way>'
+                '</osm>'
+            )
+        network = RoadNetwork.from_osm(path)
+        self.assertEqual((len(network), network.edge_count), (3, 3))
+        self.assertIsNone(network.shortest_path(2, 1))
+        path, seconds, meters = network.shortest_path(1, 2)
+        self.assertAlmostEqual(seconds, meters / 10, places=3)
+
+
+class RoadNetworkGPSAdapterTest(SimpleTestCase):
+    """Rutas y tiempos de viaje sobre la red, con tramos de acceso desde los puntos pedidos"""
+
+    def setUp(self):
+        self.network = grid_road_network()
+        self.adapter = RoadNetworkGPSAdapter(self.network)
+        self.origin = {'lat': 3.4402, 'lng': -76.5398}
+        self.destination = {'lat': 3.4598, 'lng': -76.5202}
+
+    def test_route_follows_the_network(self):
+        route = self.adapter.calculate_route(self.origin, self.destination)
+        source, source_m = self.network.nearest_node(self.origin['lat'], self.origin['lng'])
+        target, target_m = self.network.nearest_node(self.destination['lat'], self.destination['lng'])
+        _, seconds, _ = self.network.shortest_path(source, target)
+        expected = (seconds + (source_m + target_m) / self.adapter.access_mps) / 60
+
+        self.assertAlmostEqual(route['duration_minutes'], expected, places=2)
+        self.assertEqual((route['waypoints'][0], route['waypoints'][-1]), (self.origin, self.destination))
+        self.assertAlmostEqual(self.adapter.travel_times(self.origin, [self.destination])[0], expected, places=6)
+
+    def test_unreachable_destination_uses_fallback(self):
+        isolated = RoadNetwork.from_edges([3.44, 3.45], [-76.54, -76.53], [])
+        adapter = RoadNetworkGPSAdapter(isolated)
+        origin, destination = {'lat': 3.44, 'lng': -76.54}, {'lat': 3.45, 'lng': -76.53}
+        self.assertEqual(
+            adapter.calculate_route(origin, destination), GPSAdapter().calculate_route(origin, destination)
+        )
+        self.assertEqual(adapter.travel_times(origin, [destination]), [math.inf])
+
+
+class TravelTimeGridTest(SimpleTestCase):
+    """La tabla guarda los K más cercanos por tiempo y la actualización incremental equivale a reconstruirla"""
+
+    def setUp(self):
+        self.network = grid_road_network()
+        rng = random.Random(12)
+        self.parkings = [
+            (parking_id, 3.44 + rng.uniform(0, 0.022), -76.54 + rng.uniform(0, 0.022))
+            for parking_id in range(1, 21)
+        ]
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def build(self, name, parkings, k=4):
+        grid = TravelTimeGrid.create(
+            os.path.join(self.directory, name), 3.44, -76.54, 3.462, -76.518, cell_size_deg=0.003, k=k
+        )
+        grid.rebuild_cells(self.network, parkings)
+        return grid
+
+    def assertSameGrid(self, grid, expected):
+        np.testing.assert_array_equal(grid.parking_ids, expected.parking_ids)
+        np.testing.assert_allclose(grid.minutes, expected.minutes, rtol=1e-5)
+
+    def test_cells_hold_the_k_fastest_parkings(self):
+        grid = self.build('tabla', self.parkings)
+        access_mps = ACCESS_SPEED_KMH / 3.6
+        placed = [(parking_id, *self.network.nearest_node(lat, lng)) for parking_id, lat, lng in self.parkings]
+        center_lats, center_lngs = grid.cell_centers()
+        for cell in range(0, len(grid), 7):
+            source, source_m = self.network.nearest_node(float(center_lats[cell]), float(center_lngs[cell]))
+            seconds = self.network.travel_times(source, [node for _, node, _ in placed])
+            expected = sorted(
+                ((total + (source_m + meters) / access_mps) / 60, parking_id)
+                for (parking_id, _, meters), total in zip(placed, seconds) if not math.isinf(total)
+            )[:grid.k]
+            center = grid.lookup(float(center_lats[cell]), float(center_lngs[cell]))
+            self.assertEqual([parking_id for parking_id, _ in center], [parking_id for _, parking_id in expected])
+            np.testing.assert_allclose([m for _, m in center], [m for m, _ in expected], rtol=1e-5)
+
+    def test_incremental_updates_match_a_full_rebuild(self):
+        grid = self.build('incremental', self.parkings)
+        # Agregar, mover y eliminar parqueaderos, comparando cada vez con una tabla nueva
+        added = self.parkings + [(21, 3.4505, -76.5295)]
+        changed = grid.update_parking(self.network, added, 21, 3.4505, -76.5295)
+        self.assertSameGrid(grid, self.build('agregado', added))
+        self.assertLess(changed, len(grid))
+
+        moved = [(1, 3.4585, -76.5205)] + added[1:]
+        grid.update_parking(self.network, moved, 1, 3.4585, -76.5205)
+        self.assertSameGrid(grid, self.build('movido', moved))
+
+        removed = moved[:-1]
+        grid.update_parking(self.network, removed, 21)
+        self.assertSameGrid(grid, self.build('eliminado', removed))
+
+    def test_partial_lists_only_change_where_the_parking_is_reachable(self):
+        # Con K mayor que el inventario ninguna lista está llena (K-ésimo infinito)
+        parkings = self.parkings[:3]
+        grid = self.build('parcial', parkings, k=8)
+        added = parkings + [(21, 3.4505, -76.5295)]
+        grid.update_parking(self.network, added, 21, 3.4505, -76.5295)
+        self.assertSameGrid(grid, self.build('parcial_agregado', added, k=8))
+
+
+class TravelTimeUpdateTest(TestCase):
+    """Mover un parqueadero no recalcula la tabla dentro de la petición; lo hace el suscriptor del bus"""
+
+    def setUp(self):
+        self.parkings = [
+            Parking.objects.create(
+                name=f'Parqueadero {i}', latitude=lat, longitude=lng, price_per_hour=3000, capacity=10
+            )
+            for i, (lat, lng) in enumerate([(3.442, -76.538), (3.458, -76.522), (3.45, -76.53)])
+        ]
+        ParkingDataManager().invalidate()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        network = grid_road_network()
+        self.facade = ParkingSearchFacade()
+        self.facade.set_gps_service(RoadNetworkGPSAdapter(network))
+        self.facade.set_travel_time_grid(TravelTimeGrid.create(
+            directory, 3.44, -76.54, 3.462, -76.518, cell_size_deg=0.003, k=2
+        ))
+        self.facade.reload_inventory()
+        self.bus = EventBus(synchronous=True)
+        self.mediator = SearchMediator(self.bus)
+        self.mediator.register_component('facade', self.facade)
+
+    def test_moved_parking_reaches_the_grid_through_the_event_bus(self):
+        grid = self.facade.travel_time_grid
+        moved = self.parkings[0]
+        Parking.objects.filter(id=moved.id).update(latitude=3.4595, longitude=-76.5195)
+
+        before = grid.parking_ids.copy()
+        self.facade.update_parking_location(moved.id, 3.4595, -76.5195)
+        np.testing.assert_array_equal(grid.parking_ids, before)
+
+        self.mediator.notify('admin', 'parking_location_changed', {
+            'parking_id': moved.id, 'latitude': 3.4595, 'longitude': -76.5195
+        })
+        self.assertEqual(grid.lookup(3.4595, -76.5195)[0][0], moved.id)
+        self.assertEqual(self.bus.stats()['subscribers']['travel_time_grid']['delivered'], 1)
+        self.assertEqual(self.facade.find_nearest_parking({'lat': 3.4595, 'lng': -76.5195})['id'], moved.id)
+
+
+class PolylineTest(SimpleTestCase):
+    """La polilínea sigue el formato de Google y conserva 5 decimales"""
+
+    def test_reference_example(self):
+        points = [{'lat': 38.5, 'lng': -120.2}, {'lat': 40.7, 'lng': -120.95}, {'lat': 43.252, 'lng': -126.453}]
+        self.assertEqual(polyline.encode(points), '_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+        self.assertEqual(polyline.decode('_p~iF~ps|U_ulLnnqC_mqNvxq`@'), points)
+
+    def test_round_trip_within_precision(self):
+        rng = random.Random(13)
+        points = [{'lat': rng.uniform(-90, 90), 'lng': rng.uniform(-180, 180)} for _ in range(200)]
+        decoded = polyline.decode(polyline.encode(points))
+        self.assertEqual(len(decoded), len(points))
+        for point, result in zip(points, decoded):
+            self.assertAlmostEqual(point['lat'], result['lat'], delta=0.5e-5)
+            self.assertAlmostEqual(point['lng'], result['lng'], delta=0.5e-5)
+        self.assertEqual(polyline.decode(''), [])
+
+
+class RouteCacheTest(SimpleTestCase):
+    """Los orígenes de una misma celda comparten la ruta hasta que el parqueadero se mueve"""
+
+    def setUp(self):
+        self.cache = RouteCache()
+        self.adapter = GPSAdapter()
+        self.destination = {'lat': 3.46, 'lng': -76.52}
+        self.computed = 0
+
+    def route(self, origin, parking_id=1):
+        def compute():
+            self.computed += 1
+            return self.adapter.calculate_route(origin, self.destination)
+        return self.cache.get_or_compute(origin, parking_id, compute)
+
+    def test_same_cell_reuses_the_route(self):
+        first = self.route({'lat': 3.45012, 'lng': -76.53012})
+        second = self.route({'lat': 3.45088, 'lng': -76.53088})
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(second['duration_minutes'], first['duration_minutes'])
+        # La ruta compartida empieza en el origen de quien la pide
+        self.assertEqual(second['waypoints'][0], {'lat': 3.45088, 'lng': -76.53088})
+        self.assertEqual(second['waypoints'][1:], polyline.decode(polyline.encode(first['waypoints']))[1:])
+
+    def test_other_cell_or_parking_computes_again(self):
+        self.route({'lat': 3.45012, 'lng': -76.53012})
+        self.route({'lat': 3.45112, 'lng': -76.53012})
+        self.route({'lat': 3.45012, 'lng': -76.53012}, parking_id=2)
+        self.assertEqual(self.computed, 3)
+
+    def test_invalidate_parking_drops_only_its_routes(self):
+        origin = {'lat': 3.45012, 'lng': -76.53012}
+        self.route(origin, parking_id=1)
+        self.route(origin, parking_id=2)
+        self.assertEqual(self.cache.invalidate_parking(1), 1)
+        self.assertIsNone(self.cache.get(origin, 1))
+        self.assertIsNotNone(self.cache.get(origin, 2))
+
+    def test_memory_is_bounded_by_bytes(self):
+        cache = RouteCache(max_bytes=4096)
+        for i in range(100):
+            origin = {'lat': 3.40 + i * 0.002, 'lng': -76.53}
+            cache.set(origin, 1, self.adapter.calculate_route(origin, self.destination))
+        stats = cache.stats()
+        self.assertLessEqual(stats['bytes'], 4096)
+        self.assertGreater(stats['evictions'], 0)
+        self.assertIsNotNone(cache.get({'lat': 3.40 + 99 * 0.002, 'lng': -76.53}, 1))
+
+
+class AvailabilityBroadcasterTest(SimpleTestCase):
+    """Cada cliente del stream recibe solo los cambios de sus ids o su área, coalescidos"""
+
+    def setUp(self):
+        locations = {1: {'lat': 3.451, 'lng': -76.531}, 2: {'lat': 3.6, 'lng': -76.3}}
+        self.broadcaster = AvailabilityBroadcaster(max_pending=3, locate=locations.get)
+
+    def publish(self, parking_id, is_available, location=None):
+        data = {'parking_id': parking_id, 'is_available': is_available}
+        if location is not None:
+            data['location'] = location
+        return self.broadcaster.publish(data)
+
+    def test_subscriptions_by_id_and_area(self):
+        by_id = self.broadcaster.subscribe(parking_ids=[2])
+        by_area = self.broadcaster.subscribe(bbox=(3.44, -76.54, 3.46, -76.52))
+        wide = self.broadcaster.subscribe(bbox=(2.0, -78.0, 5.0, -75.0))
+
+        # Sin ubicación en el evento se usa locate(); el 3 queda fuera del área pequeña
+        self.publish(1, False)
+        self.publish(2, False)
+        self.publish(3, True, location={'lat': 3.47, 'lng': -76.53})
+
+        self.assertEqual(by_id.drain(), [{'parking_id': 2, 'is_available': False}])
+        self.assertEqual([event['parking_id'] for event in by_area.drain()], [1])
+        self.assertEqual([event['parking_id'] for event in wide.drain()], [1, 2, 3])
+        self.assertEqual(self.broadcaster.stats()['subscribers'], 3)
+
+    def test_bursts_are_coalesced_to_the_last_state(self):
+        subscription = self.broadcaster.subscribe(parking_ids=[1])
+        for is_available in (False, True, False):
+            self.publish(1, is_available)
+        self.assertEqual(subscription.drain(), [{'parking_id': 1, 'is_available': False}])
+        # Un estado que el cliente ya conoce no se reenvía
+        self.publish(1, True)
+        self.publish(1, False)
+        self.assertEqual(subscription.drain(), [])
+        self.assertEqual(self.broadcaster.stats()['coalesced'], 4)
+
+    def test_slow_client_is_disconnected(self):
+        slow = self.broadcaster.subscribe(bbox=(2.0, -78.0, 5.0, -75.0))
+        with self.assertLogs('api.services.availability_stream', level='WARNING'):
+            for parking_id in range(10, 14):
+                self.publish(parking_id, True, location={'lat': 3.45, 'lng': -76.53})
+        self.assertTrue(slow.overflowed)
+        self.assertTrue(slow.closed)
+        stats = self.broadcaster.stats()
+        self.assertEqual((stats['subscribers'], stats['dropped_clients']), (0, 1))
+
+    def test_events_yields_batches_and_heartbeats(self):
+        async def main():
+            subscription = self.broadcaster.subscribe(parking_ids=[1], loop=asyncio.get_running_loop())
+            stream = self.broadcaster.events(subscription, heartbeat_seconds=0.01)
+            heartbeat = await stream.__anext__()
+            # Publicado desde otro hilo, como lo hace el event bus
+            thread = threading.Thread(target=self.publish, args=(1, False))
+            thread.start()
+            batch = await stream.__anext__()
+            thread.join()
+            self.broadcaster.unsubscribe(subscription)
+            return heartbeat, batch
+
+        heartbeat, batch = asyncio.run(main())
+        self.assertIsNone(heartbeat)
+        self.assertEqual(batch, [{'parking_id': 1, 'is_available': False}])
+
+    def test_format_sse(self):
+        self.assertEqual(
+            format_sse('availability', [{'parking_id': 1}]),
+            'event: availability\ndata: [{"parking_id": 1}]\n\n'
+        )
+
+
+class EventBusTest(SimpleTestCase):
+    """Los suscriptores reciben los eventos fuera de publish(), en orden por key y con reintentos"""
+
+    def setUp(self):
+        self.bus = EventBus(max_retries=2, retry_backoff=0.001)
+        self.addCleanup(self.bus.close)
+
+    def test_events_with_the_same_key_arrive_in_order(self):
+        received = []
+        self.bus.subscribe('cambio', lambda data: received.append((data['parking_id'], data['seq'])), shards=4)
+        for seq in range(50):
+            for parking_id in range(5):
+                self.bus.publish('cambio', {'parking_id': parking_id, 'seq': seq}, key=parking_id)
+        self.bus.flush()
+
+        self.assertEqual(len(received), 250)
+        for parking_id in range(5):
+            self.assertEqual([seq for key, seq in received if key == parking_id], list(range(50)))
+
+    def test_slow_subscriber_does_not_delay_publish(self):
+        release = threading.Event()
+        fast = []
+        self.bus.subscribe('cambio', lambda data: release.wait(5), name='lento')
+        self.bus.subscribe('cambio', fast.append, name='rapido')
+        started = time.monotonic()
+        self.assertEqual(self.bus.publish('cambio', {'parking_id': 1}), 2)
+        self.assertLess(time.monotonic() - started, 1)
+        release.set()
+        self.bus.flush()
+        self.assertEqual(fast, [{'parking_id': 1}])
+
+    def test_failures_are_retried_then_counted(self):
+        attempts = []
+
+        def flaky(data):
+            attempts.append(data)
+            if len(attempts) < 3:
+                raise ConnectionError('webhook caído')
+
+        self.bus.subscribe('cambio', flaky, name='webhook')
+        self.bus.subscribe('cambio', lambda data: 1 / 0, name='roto')
+        with self.assertLogs('api.services.event_bus', level='ERROR'):
+            self.bus.publish('cambio', {'parking_id': 1})
+            self.bus.flush()
+
+        subscribers = self.bus.stats()['subscribers']
+        self.assertEqual((subscribers['webhook']['delivered'], subscribers['webhook']['retried']), (1, 2))
+        self.assertEqual((subscribers['roto']['failed'], subscribers['roto']['retried']), (1, 2))
+
+    def test_full_queue_drops_events(self):
+        bus = EventBus(max_queue=1)
+        self.addCleanup(bus.close)
+        release = threading.Event()
+        started = threading.Event()
+
+        def slow(data):
+            started.set()
+            release.wait(5)
+
+        bus.subscribe('cambio', slow, name='lento')
+        bus.publish('cambio', 1)
+        started.wait(5)
+        self.assertEqual([bus.publish('cambio', n) for n in (2, 3)], [1, 0])
+        release.set()
+        bus.flush()
+        self.assertEqual(bus.stats()['subscribers']['lento']['dropped'], 1)
+
+    def test_synchronous_bus_delivers_inside_publish(self):
+        bus = EventBus(synchronous=True)
+        received = []
+        bus.subscribe('cambio', received.append)
+        bus.publish('cambio', {'parking_id': 1})
+        self.assertEqual(received, [{'parking_id': 1}])
+
+
+class BulkAvailabilityUpdateTest(TestCase):
+    """Un lote de lecturas de sensores se aplica en una transacción; solo cuenta la más reciente"""
+
+    def setUp(self):
+        self.parkings = [
+            Parking.objects.create(
+                name=f'Parqueadero {i}', latitude=3.45 + i * 0.01, longitude=-76.53,
+                price_per_hour=3000, capacity=10, is_available=True
+            )
+            for i in range(3)
+        ]
+        ParkingDataManager().invalidate()
+        self.now = time.time()
+
+    def test_latest_reading_per_parking_wins(self):
+        first, second, closed = self.parkings
+        Parking.objects.filter(id=closed.id).update(is_closed=True, is_available=False)
+
+        def at(seconds):
+            return parse_timestamp(self.now + seconds)
+
+        result = apply_availability_updates([
+            (first.id, False, None, at(2)),
+            (first.id, True, None, at(1)),
+            (second.id, None, 12, at(1)),
+            (closed.id, True, None, at(1)),
+            (999, True, None, at(1)),
+        ])
+
+        self.assertEqual((result['applied'], result['superseded'], result['not_found']), (3, 1, [999]))
+        self.assertEqual(
+            sorted((change['parking_id'], change['is_available']) for change in result['changed']),
+            [(first.id, False), (second.id, False)]
+        )
+        # Los cupos ocupados se acotan a la capacidad y el cerrado sigue sin disponibilidad
+        self.assertEqual(result['occupancy'], [(second.id, 10)])
+        self.assertEqual(
+            list(Parking.objects.order_by('id').values_list('is_available', flat=True)), [False, False, False]
+        )
+
+        # Una lectura anterior a la ya aplicada se descarta
+        stale = apply_availability_updates([(first.id, True, None, at(0))])
+        self.assertEqual((stale['applied'], stale['stale']), (0, 1))
+        self.assertFalse(Parking.objects.get(id=first.id).is_available)
+
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp(0).isoformat(), '1970-01-01T00:00:00+00:00')
+        self.assertEqual(parse_timestamp('2025-01-01T10:00:00').utcoffset().total_seconds(), 0)
+        for invalid in ('ayer', True, None):
+            with self.assertRaises(ValueError):
+                parse_timestamp(invalid)
+
+    def test_endpoint_reports_invalid_readings_and_updates_the_snapshot(self):
+        first = self.parkings[0]
+        response = self.client.post('/api/parking/availability/bulk/', {'updates': [
+            {'parking_id': first.id, 'is_available': False, 'timestamp': self.now},
+            {'parking_id': first.id, 'is_available': 'no', 'timestamp': self.now},
+            {'parking_id': self.parkings[1].id, 'occupied_count': 3},
+        ]}, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['applied'], body['changed']), (1, 1))
+        self.assertEqual([error['index'] for error in body['errors']], [1, 2])
+        # El snapshot de búsqueda se parcha dentro de la petición
+        nearest = views.facade.find_nearest_parking({'lat': first.latitude, 'lng': first.longitude})
+        self.assertEqual(nearest['id'], self.parkings[1].id)
+
+    def test_endpoint_rejects_empty_or_oversized_batches(self):
+        for updates in ([], None, [{}] * (views.BulkAvailabilityUpdateView.MAX_BATCH_SIZE + 1)):
+            response = self.client.post(
+                '/api/parking/availability/bulk/', {'updates': updates}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+
+
+class OccupancyCountersTest(TestCase):
+    """Entradas y salidas en memoria y su delta escrito en la BD"""
+
+    def setUp(self):
+        self.parking = Parking.objects.create(
+            name='Centro', latitude=3.45, longitude=-76.53, price_per_hour=3000, capacity=2
+        )
+        self.data_manager = ParkingDataManager()
+        previous = self.data_manager.occupancy
+        self.addCleanup(setattr, self.data_manager, 'occupancy', previous)
+        self.data_manager.invalidate()
+        self.changes = []
+        self.counters = OccupancyCounters(
+            self.data_manager, on_change=lambda *change: self.changes.append(change), synchronous=True
+        )
+
+    def assertStored(self, occupied, is_available):
+        self.parking.refresh_from_db()
+        self.assertEqual((self.parking.occupied_spaces, self.parking.is_available), (occupied, is_available))
+
+    def test_enter_and_exit_flush_to_the_database(self):
+        self.assertEqual(self.counters.enter(self.parking.id), (1, 2))
+        self.assertStored(1, True)
+        self.assertEqual(self.counters.enter(self.parking.id), (2, 2))
+        self.assertStored(2, False)
+        # Lleno: la copia en memoria no pasa de la capacidad
+        self.assertEqual(self.counters.enter(self.parking.id), (2, 2))
+        self.assertEqual(self.counters.exit(self.parking.id), (1, 2))
+        self.assertStored(1, True)
+        self.assertEqual(
+            self.changes,
+            [(self.parking.id, 1, 2, False), (self.parking.id, 2, 2, True), (self.parking.id, 1, 2, True)]
+        )
+
+    def test_exit_delta_reaches_the_database_when_local_copy_is_behind(self):
+        self.data_manager.get_snapshot()
+        # Otro worker registró dos entradas que este snapshot aún no ve
+        Parking.objects.filter(id=self.parking.id).update(occupied_spaces=2, is_available=False)
+        self.assertEqual(self.counters.exit(self.parking.id), (0, 2))
+        self.assertStored(1, True)
+
+    def test_closed_parking_is_never_reopened(self):
+        Parking.objects.filter(id=self.parking.id).update(is_closed=True, is_available=False)
+        self.counters.enter(self.parking.id)
+        self.counters.exit(self.parking.id)
+        self.assertStored(0, False)
+        self.assertFalse(self.data_manager.get_snapshot().is_available[0])
+
+    def test_pending_deltas_survive_a_reload(self):
+        counters = OccupancyCounters(self.data_manager, flush_interval=3600)
+        counters._worker = threading.current_thread()  # sin hilo de escritura: los deltas quedan pendientes
+        counters.enter(self.parking.id)
+        counters.enter(self.parking.id)
+        self.data_manager.invalidate()
+        snapshot = self.data_manager.get_snapshot()
+        self.assertEqual((int(snapshot.occupied[0]), bool(snapshot.is_available[0])), (2, False))
+        self.assertStored(0, True)
+
+        self.assertEqual(counters.flush(), 1)
+        self.assertStored(2, False)
+        self.assertEqual(counters.flush(), 0)
+
+    def test_set_replaces_pending_deltas(self):
+        counters = OccupancyCounters(self.data_manager, flush_interval=3600)
+        counters._worker = threading.current_thread()
+        counters.enter(self.parking.id)
+        # Lectura absoluta de un sensor ya guardada en la BD: el delta pendiente sobra
+        self.assertEqual(counters.set(self.parking.id, 5), (2, 2))
+        self.assertEqual(int(self.data_manager.get_snapshot().occupied[0]), 2)
+        self.assertEqual(counters.flush(), 0)
+        self.assertIsNone(counters.set(999, 1))
+
+
+class FastJSONRendererTest(TestCase):
+    """El JSON armado con los fragmentos precompilados es idéntico byte a byte al de JSONRenderer"""
+
+    def setUp(self):
+        create_parkings(40, features=['Techado', 'Vigilancia'])
+        # Nombre con caracteres que JSONRenderer escapa de forma especial
+        Parking.objects.create(
+            name='Plaza Ñ "Centro" \\', latitude=3.45, longitude=-76.53,
+            price_per_hour=Decimal('2500.50'), capacity=3, features=['Cubierto ☂']
+        )
+        ParkingDataManager().invalidate()
+        self.facade = ParkingSearchFacade()
+        self.location = {'lat': 3.45, 'lng': -76.53}
+
+    def assertRendersLikeDRF(self, data, renderer_context=None):
+        fast = FastJSONRenderer().render(data, 'application/json', renderer_context)
+        self.assertEqual(fast, JSONRenderer().render(data, 'application/json', renderer_context))
+        return fast
+
+    def test_search_results_match_json_renderer(self):
+        results = self.facade.find_k_nearest(self.location, 10)
+        self.assertTrue(all(isinstance(result, SearchPayload) and result.is_pristine() for result in results))
+        self.assertEqual(results[0]['name'], 'Plaza Ñ "Centro" \\')
+
+        self.assertRendersLikeDRF(results[0])
+        content = self.assertRendersLikeDRF({'results': results, 'next': {'cursor': None}, 'count': len(results)})
+        self.assertEqual(json.loads(content)['results'], json.loads(json.dumps(results)))
+
+    def test_modified_results_are_encoded_in_full(self):
+        result = self.facade.find_nearest_parking(self.location)
+        result['name'] = 'Renombrado'
+        extended = self.facade.find_nearest_parking(self.location)
+        extended['reservation'] = {'token': 'abc'}
+        self.assertFalse(result.is_pristine() or extended.is_pristine())
+
+        self.assertEqual(json.loads(self.assertRendersLikeDRF(result))['name'], 'Renombrado')
+        self.assertEqual(json.loads(self.assertRendersLikeDRF([extended]))[0]['reservation'], {'token': 'abc'})
+
+    def test_indented_and_plain_responses_use_json_renderer(self):
+        results = self.facade.find_k_nearest(self.location, 3)
+        content = self.assertRendersLikeDRF(results, {'indent': 2})
+        self.assertIn(b'\n  ', content)
+        self.assertRendersLikeDRF({'message': 'Sin resultados', 'count': 0})
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_search_endpoint_matches_json_renderer(self):
+        views.proxy.invalidate_cache()
+        views.proxy.rate_limiter.reset()
+        self.addCleanup(setattr, views.history_writer, 'synchronous', views.history_writer.synchronous)
+        views.history_writer.synchronous = True
+        response = self.client.post('/api/search/nearest/', {'latitude': 3.45, 'longitude': -76.53},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+
+class AsyncSearchTest(TestCase):
+    """Las versiones asíncronas de la fachada, el proxy y las vistas responden lo mismo que las síncronas"""
+
+    def setUp(self):
+        create_parkings(200)
+        ParkingDataManager().invalidate()
+        views.proxy.invalidate_cache()
+        views.proxy.rate_limiter.reset()
+        views.reservation_limiter.reset()
+        self.addCleanup(setattr, views, 'reservations', views.reservations)
+        views.reservations = SpaceReservationEngine(ParkingDataManager(), persist=False)
+        self.addCleanup(setattr, views.history_writer, 'synchronous', views.history_writer.synchronous)
+        views.history_writer.synchronous = True
+        self.factory = RequestFactory()
+
+    def locations(self, count, seed=5):
+        rng = random.Random(seed)
+        return [{'lat': 3.45 + rng.uniform(-0.1, 0.1), 'lng': -76.53 + rng.uniform(-0.1, 0.1)} for _ in range(count)]
+
+    def async_request(self, method, path, data=None):
+        request = getattr(self.factory, method)(path, data, content_type='application/json') if data is not None \
+            else getattr(self.factory, method)(path)
+
+        async def auser():
+            return AnonymousUser()
+        request.auser = auser
+        return request
+
+    def test_facade_matches_sync_search(self):
+        searches = [(location, None) for location in self.locations(20)]
+        searches += [(location, {'max_price': 3000, 'max_distance': 3}) for location in self.locations(10, seed=6)]
+        searches.append(({'lat': 4.6, 'lng': -74.08}, {'max_distance': 1}))
+        # La búsqueda síncrona carga el snapshot en este hilo (los hilos del executor no ven la transacción del test)
+        expected = [ParkingSearchFacade().find_nearest_parking(location, filters) for location, filters in searches]
+
+        facade = ParkingSearchFacade()
+
+        async def search_all():
+            return await asyncio.gather(*(facade.afind_nearest_parking(location, filters) for location, filters in searches))
+        self.assertEqual(asyncio.run(search_all()), expected)
+
+    def test_facade_ranks_candidates_by_travel_time(self):
+        network = grid_road_network()
+        locations = [{'lat': 3.44 + 0.022 * i / 10, 'lng': -76.54 + 0.022 * i / 10} for i in range(10)]
+        facades = [ParkingSearchFacade(), ParkingSearchFacade()]
+        for facade in facades:
+            facade.set_gps_service(RoadNetworkGPSAdapter(network), travel_time_candidates=4)
+        expected = [facades[0].find_nearest_parking(location) for location in locations]
+        results = [asyncio.run(facades[1].afind_nearest_parking(location)) for location in locations]
+        self.assertEqual(results, expected)
+
+    def test_proxy_shares_one_search_per_key(self):
+        service = FakeSearchService([(1, 3.45, -76.53), (2, 3.55, -76.53)])
+
+        async def afind_nearest_parking(user_location, filters=None, executor=None):
+            await asyncio.sleep(0.01)
+            return service.find_nearest_parking(user_location, filters)
+        service.afind_nearest_parking = afind_nearest_parking
+        proxy = ParkingSearchProxy(service)
+        location = {'lat': 3.451, 'lng': -76.53}
+
+        async def search_concurrently():
+            return await asyncio.gather(*(proxy.afind_nearest_parking(location) for _ in range(8)))
+        results = asyncio.run(search_concurrently())
+        self.assertEqual([result['id'] for result in results], [1] * 8)
+        self.assertEqual(asyncio.run(proxy.afind_nearest_parking(location))['id'], 1)
+        # Concurrentes: una búsqueda compartida; la siguiente sale del caché
+        self.assertEqual(service.calls, 1)
+
+    async def test_search_view_matches_sync_view(self):
+        location = {'latitude': 3.45, 'longitude': -76.53}
+        expected = await sync_to_async(self.client.post)('/api/search/nearest/', location, content_type='application/json')
+        # Sin cachés la vista asíncrona repite la búsqueda y la ruta
+        views.proxy.invalidate_cache()
+        views.facade.route_cache.clear()
+
+        response = await views.find_nearest_parking_async(self.async_request('post', '/api/search/nearest/', location))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content), expected.json())
+        self.assertEqual(await SearchHistory.objects.acount(), 2)
+
+        response = await views.find_nearest_parking_async(self.async_request(
+            'post', '/api/search/nearest/', {**location, 'reserve': True}
+        ))
+        self.assertEqual(json.loads(response.content)['reservation']['parking_id'], expected.json()['id'])
+        for data, status in (({'latitude': 3.45}, 400), ({**location, 'reserve': 'si'}, 400)):
+            response = await views.find_nearest_parking_async(self.async_request('post', '/api/search/nearest/', data))
+            self.assertEqual(response.status_code, status)
+
+    async def test_history_view_matches_sync_view(self):
+        for location in self.locations(3):
+            await sync_to_async(self.client.post)('/api/search/nearest/', {
+                'latitude': location['lat'], 'longitude': location['lng']
+            }, content_type='application/json')
+        expected = await sync_to_async(self.client.get)('/api/search/history/')
+
+        response = await views.search_history_async(self.async_request('get', '/api/search/history/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)), 3)
+        self.assertEqual(json.loads(response.content), expected.json())
+
+
+class SharedSnapshotStoreTest(TestCase):
+    """Los workers abren la generación vigente y cambian a la siguiente cuando se publica"""
+
+    def setUp(self):
+        self.parking = Parking.objects.create(
+            name='Centro', latitude=3.45, longitude=-76.53, price_per_hour=3000, capacity=5
+        )
+        path = tempfile.mkdtemp(prefix='smartpark-shared-')
+        self.addCleanup(shutil.rmtree, path, ignore_errors=True)
+        # Dos "workers": cada uno con su propio store sobre el mismo directorio
+        self.publisher = SharedSnapshotStore(path)
+        self.worker = SharedSnapshotStore(path)
+        self.data_manager = ParkingDataManager()
+        self.addCleanup(self.data_manager.invalidate)
+        self.addCleanup(self.data_manager.set_shared_store, None)
+
+    def publish(self):
+        with self.publisher.publishing():
+            return self.publisher.publish(ParkingSnapshot.load())
+
+    def test_generation_switch(self):
+        self.assertIsNone(self.worker.attach())
+        self.assertEqual(self.publish(), 1)
+        snapshot, index = self.worker.attach()
+        self.assertEqual((snapshot.generation, len(snapshot), len(index)), (1, 1, 1))
+
+        other = Parking.objects.create(
+            name='Norte', latitude=3.48, longitude=-76.52, price_per_hour=2000, capacity=5
+        )
+        self.assertEqual(self.publish(), 2)
+        self.assertEqual(self.worker.generation, 2)
+        switched, index = self.worker.attach()
+        self.assertEqual(switched.generation, 2)
+        self.assertIsNotNone(switched.row_of(other.id))
+        # Quien aún tiene abierta la generación anterior la sigue leyendo
+        self.assertEqual(snapshot.ids.tolist(), [self.parking.id])
+
+    def test_manager_follows_the_published_generation(self):
+        self.data_manager.set_shared_store(self.worker)
+        self.assertEqual(self.data_manager.get_snapshot().generation, 1)
+
+        Parking.objects.create(name='Norte', latitude=3.48, longitude=-76.52, price_per_hour=2000, capacity=5)
+        self.publish()
+        snapshot = self.data_manager.get_snapshot()
+        self.assertEqual((snapshot.generation, len(snapshot)), (2, 2))
+
+    def test_patches_are_visible_to_other_workers(self):
+        self.publish()
+        first, _ = self.publisher.attach()
+        second, index = self.worker.attach()
+        first.set_availability(self.parking.id, False, is_closed=True)
+        first.occupied[first.row_of(self.parking.id)] = 3
+
+        row = second.row_of(self.parking.id)
+        self.assertEqual((bool(second.is_available[row]), bool(second.is_closed[row])), (False, True))
+        self.assertEqual(int(second.occupied[row]), 3)
+        # El índice compartido incluye también los no disponibles: la búsqueda los filtra por columna
+        self.assertIn(self.parking.id, index)
+
+
+    def test_manager_patches_write_through_to_the_shared_file(self):
+        self.data_manager.set_shared_store(self.worker)
+        self.addCleanup(setattr, self.data_manager, 'occupancy', self.data_manager.occupancy)
+        counters = OccupancyCounters(self.data_manager, synchronous=True)
+        self.assertEqual(counters.adjust(self.parking.id, 2), (2, 5))
+        self.data_manager.update_parking_availability(self.parking.id, False, is_closed=True)
+
+        # Otro worker ve los parches sin recargar ni publicar otra generación
+        snapshot, _ = self.publisher.attach()
+        row = snapshot.row_of(self.parking.id)
+        self.assertEqual(snapshot.generation, 1)
+        self.assertEqual((int(snapshot.occupied[row]), bool(snapshot.is_closed[row])), (2, True))
+        self.parking.refresh_from_db()
+        self.assertEqual(self.parking.occupied_spaces, 2)
+
+
+class SpaceReservationEngineTest(TestCase):
+    """Prueba de estrés: un cupo nunca queda retenido dos veces"""
+
+    def setUp(self):
+        self.parking = Parking.objects.create(
+            name='Centro', latitude=3.45, longitude=-76.53, price_per_hour=3000, capacity=5
+        )
+        self.data_manager = ParkingDataManager()
+        self.data_manager.invalidate()
+        self.data_manager.get_snapshot()
+
+    def test_concurrent_holds_never_share_a_space(self):
+        engine = SpaceReservationEngine(self.data_manager, persist=False)
+        active = {}
+        overlaps = []
+        active_lock = threading.Lock()
+
+        def driver():
+            for _ in range(300):
+                reservation = engine.hold(self.parking.id)
+                if reservation is None:
+                    continue
+                number = reservation['number']
+                with active_lock:
+                    if number in active:
+                        overlaps.append(number)
+                    active[number] = reservation['token']
+                with active_lock:
+                    del active[number]
+                self.assertTrue(engine.release(reservation['token']))
+
+        threads = [threading.Thread(target=driver) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(overlaps, [])
+        stats = engine.stats()
+        self.assertEqual(stats['active_holds'], 0)
+        self.assertEqual(stats['held'], stats['released'])
+        self.assertGreater(stats['held'], 0)
+
+    def test_capacity_is_never_exceeded(self):
+        engine = SpaceReservationEngine(self.data_manager, persist=False)
+        holds = [engine.hold(self.parking.id) for _ in range(8)]
+        numbers = [reservation['number'] for reservation in holds if reservation]
+        self.assertEqual(sorted(numbers), list(range(5)))
+        self.assertEqual(engine.stats()['rejected'], 3)
+
+    def test_workers_cannot_double_book_through_the_database(self):
+        clock = FakeClock()
+        # Dos workers con estado en memoria propio y la misma BD
+        first = SpaceReservationEngine(self.data_manager, clock=clock)
+        second = SpaceReservationEngine(self.data_manager, clock=clock)
+        first.hold(self.parking.id)
+        second.hold(self.parking.id)  # carga la retención del primero desde la BD
+
+        tokens = []
+        for engine in (first, second) * 5:
+            reservation = engine.hold(self.parking.id)
+            if reservation is not None:
+                tokens.append(reservation['token'])
+
+        held = ParkingSpace.objects.filter(parking=self.parking, held_until__isnull=False)
+        self.assertEqual(held.count(), 5)
+        self.assertEqual(len(set(held.values_list('held_by', flat=True))), 5)
+        self.assertGreater(first.stats()['conflicts'] + second.stats()['conflicts'], 0)
+
+        # Lo que libera un worker lo puede retener el otro
+        held_token = held.first().held_by
+        self.assertTrue(first.release(held_token) or second.release(held_token))
+        self.assertIsNotNone(first.hold(self.parking.id) or second.hold(self.parking.id))
+
+    def test_confirmed_space_stays_occupied_until_exit(self):
+        clock = FakeClock()
+        engine = SpaceReservationEngine(self.data_manager, clock=clock)
+        parked = engine.hold(self.parking.id)
+        self.assertTrue(engine.confirm(parked['token']))
+
+        # El cupo ocupado no se reasigna, ni en este worker ni en otro que lo lea de la BD
+        numbers = [engine.hold(self.parking.id)['number'] for _ in range(4)]
+        self.assertNotIn(parked['number'], numbers)
+        self.assertIsNone(engine.hold(self.parking.id))
+        self.assertIsNone(SpaceReservationEngine(self.data_manager, clock=clock).hold(self.parking.id))
+        space = ParkingSpace.objects.get(parking=self.parking, number=parked['number'])
+        self.assertTrue(space.is_occupied)
+        self.assertIsNone(space.held_until)
+
+        # Vencidas las retenciones, el cupo ocupado sigue fuera de la free-list
+        clock.now += engine.ttl_seconds + 1
+        self.assertNotIn(parked['number'], [engine.hold(self.parking.id)['number'] for _ in range(4)])
+        self.assertFalse(engine.release(parked['token']))
+
+        self.assertTrue(engine.vacate(parked['token']))
+        self.assertEqual(engine.hold(self.parking.id)['number'], parked['number'])
+        self.assertIsNone(engine.vacate(parked['token']))
+
+    def test_expired_holds_return_to_the_pool(self):
+        clock = FakeClock()
+        engine = SpaceReservationEngine(self.data_manager, ttl_seconds=60, clock=clock)
+        tokens = [engine.hold(self.parking.id)['token'] for _ in range(5)]
+        self.assertIsNone(engine.hold(self.parking.id))
+
+        clock.now += 61
+        self.assertIsNotNone(engine.hold(self.parking.id))
+        self.assertFalse(engine.release(tokens[0]))
+        self.assertEqual(engine.stats()['expired'], 5)
+
+
+class ReservationEndpointTest(TestCase):
+    """El flag reserve se interpreta de forma estricta y retener cupos tiene su propio rate limit"""
+
+    def setUp(self):
+        self.parking = Parking.objects.create(
+            name='Centro', latitude=3.45, longitude=-76.53, price_per_hour=3000, capacity=10
+        )
+        ParkingDataManager().invalidate()
+        views.proxy.invalidate_cache()
+        views.proxy.rate_limiter.reset()
+        views.reservation_limiter.reset()
+        # Motor y escritura de historial propios del test (sin hilos ni estado de otros tests)
+        self.addCleanup(setattr, views, 'reservations', views.reservations)
+        views.reservations = SpaceReservationEngine(ParkingDataManager(), persist=False)
+        self.addCleanup(setattr, views.history_writer, 'synchronous', views.history_writer.synchronous)
+        views.history_writer.synchronous = True
+
+    def search(self, reserve):
+        return self.client.post('/api/search/nearest/', {
+            'latitude': 3.45, 'longitude': -76.53, 'reserve': reserve
+        }, content_type='application/json')
+
+    def test_reserve_is_parsed_strictly(self):
+        for reserve in (False, 'false', 'False'):
+            response = self.search(reserve)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('reservation', response.json())
+        self.assertEqual(views.reservations.stats()['held'], 0)
+
+        response = self.search('true')
+        self.assertEqual(response.json()['reservation']['parking_id'], self.parking.id)
+        for reserve in ('si', 1, None):
+            self.assertEqual(self.search(reserve).status_code, 400)
+
+    def test_holds_are_rate_limited_per_client(self):
+        url = f'/api/parking/{self.parking.id}/reservations/'
+        responses = [self.client.post(url) for _ in range(4)]
+        self.assertEqual([response.status_code for response in responses], [201, 201, 201, 429])
+        self.assertGreater(responses[-1].json()['retry_after'], 0)
+        # Otra IP tiene su propio bucket
+        self.assertEqual(self.client.post(url, REMOTE_ADDR='10.0.0.2').status_code, 201)
+        self.assertEqual(views.reservations.stats()['held'], 4)
+
+
+class SpaceReservationStressTest(TransactionTestCase):
+    """Con persist=True, dos workers con hilos concurrentes nunca confirman el mismo cupo en la BD"""
+
+    THREADS = 8
+    ROUNDS = 40
+
+    def test_committed_holds_are_unique(self):
+        parking = Parking.objects.create(
+            name='Centro', latitude=3.45, longitude=-76.53, price_per_hour=3000, capacity=6
+        )
+        data_manager = ParkingDataManager()
+        data_manager.invalidate()
+        data_manager.get_snapshot()
+        engines = [SpaceReservationEngine(data_manager), SpaceReservationEngine(data_manager)]
+        active = {}
+        overlaps = []
+        errors = []
+        active_lock = threading.Lock()
+
+        def driver(engine, seed):
+            rng = random.Random(seed)
+            kept = []
+            try:
+                for _ in range(self.ROUNDS):
+                    reservation = engine.hold(parking.id)
+                    if reservation is not None:
+                        with active_lock:
+                            if reservation['number'] in active:
+                                overlaps.append(reservation['number'])
+                            active[reservation['number']] = reservation['token']
+                        kept.append(reservation)
+                    if kept and rng.random() < 0.6:
+                        released = kept.pop(rng.randrange(len(kept)))
+                        with active_lock:
+                            del active[released['number']]
+                        if not engine.release(released['token']):
+                            errors.append(released['token'])
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=driver, args=(engines[i % 2], i)) for i in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual((overlaps, errors), ([], []))
+        held = list(
+            ParkingSpace.objects.filter(parking=parking, held_by__isnull=False).values_list('number', 'held_by')
+        )
+        # Cada cupo retenido en la BD es una retención vigente distinta, y ninguna falta
+        self.assertEqual(len({token for _, token in held}), len(held))
+        self.assertEqual(dict(held), active)
+        self.assertGreater(sum(engine.stats()['held'] for engine in engines), self.THREADS)
+
+
+class ImportParkingsTest(TestCase):
+    """La importación en streaming valida, hace upsert por external_id y recarga el inventario una vez"""
+
+    RECORDS = [
+        {'id': 'P-1', 'nombre': 'Centro', 'lat': 3.45, 'lng': -76.53, 'precio': '3000', 'capacidad': 10,
+         'features': ['Techado', 'Vigilancia']},
+        {'id': 'P-2', 'nombre': 'Norte', 'lat': 3.48, 'lng': -76.52, 'precio': '2500.50', 'capacidad': 4,
+         'ocupados': 4},
+        {'id': 'P-3', 'nombre': 'Sin precio', 'lat': 3.46, 'lng': -76.50, 'capacidad': 8},
+        {'id': 'P-4', 'nombre': 'Fuera', 'lat': 93.0, 'lng': -76.50, 'precio': 2000, 'capacidad': 8},
+    ]
+
+    def setUp(self):
+        ParkingDataManager().invalidate()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, records, file_format):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            if file_format == 'json':
+                json.dump(records, f)
+            elif file_format == 'jsonl':
+                f.writelines(json.dumps(record) + '\n' for record in records)
+            elif file_format == 'geojson':
+                json.dump({'type': 'FeatureCollection', 'features': [
+                    {'type': 'Feature', 'id': record['id'],
+                     'geometry': {'type': 'Point', 'coordinates': [record['lng'], record['lat']]},
+                     'properties': {key: value for key, value in record.items() if key not in ('id', 'lat', 'lng')}}
+                    for record in records
+                ]}, f)
+            else:
+                writer = csv.DictWriter(f, ['id', 'nombre', 'lat', 'lng', 'precio', 'capacidad', 'ocupados', 'features'])
+                writer.writeheader()
+                for record in records:
+                    writer.writerow({**record, 'features': ';'.join(record.get('features', []))})
+        return path
+
+    def run_import(self, path, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_parkings', path, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def imported(self):
+        return list(Parking.objects.order_by('external_id').values_list(
+            'external_id', 'name', 'price_per_hour', 'occupied_spaces', 'is_available', 'features'
+        ))
+
+    def test_every_format_imports_the_same_inventory(self):
+        expected = None
+        for file_format in ('csv', 'json', 'jsonl', 'geojson'):
+            Parking.objects.all().delete()
+            _, stderr = self.run_import(self.write(f'inventario.{file_format}', self.RECORDS, file_format))
+            self.assertEqual(len(stderr.strip().splitlines()), 2, file_format)
+            imported = self.imported()
+            self.assertEqual([row[0] for row in imported], ['P-1', 'P-2'])
+            self.assertEqual(imported[1][2:5], (Decimal('2500.50'), 4, False))
+            expected = expected or imported
+            self.assertEqual(imported, expected, file_format)
+
+    def test_reimport_updates_instead_of_duplicating(self):
+        path = self.write('inventario.jsonl', self.RECORDS[:2], 'jsonl')
+        self.run_import(path)
+        first = Parking.objects.get(external_id='P-1')
+        changed = [{**self.RECORDS[0], 'precio': '3500'}] + self.RECORDS[1:2]
+        self.run_import(self.write('inventario.jsonl', changed, 'jsonl'))
+
+        self.assertEqual(Parking.objects.count(), 2)
+        parking = Parking.objects.get(external_id='P-1')
+        self.assertEqual((parking.id, parking.price_per_hour), (first.id, Decimal('3500')))
+
+    def test_json_array_is_read_across_small_chunks(self):
+        records = [{**self.RECORDS[0], 'id': f'P-{i}', 'nombre': f'Parqueadero "{i}" ]'} for i in range(30)]
+        with open(self.write('inventario.json', records, 'json'), encoding='utf-8') as source:
+            with mock.patch('api.services.parking_import._READ_SIZE', 7):
+                result = import_parkings(iter_records(source, 'json'), batch_size=8)
+        self.assertEqual((result['imported'], result['batches'], result['invalid']), (30, 4, 0))
+        self.assertEqual(Parking.objects.filter(name='Parqueadero "29" ]').count(), 1)
+
+    def test_dry_run_and_max_errors_save_nothing(self):
+        path = self.write('inventario.json', self.RECORDS, 'json')
+        stdout, _ = self.run_import(path, '--dry-run')
+        self.assertIn('2 válidos, 2 inválidos', stdout)
+        with self.assertRaises(CommandError):
+            self.run_import(path, '--max-errors', '1', '--batch-size', '1')
+        # Los lotes ya guardados antes de detenerse se conservan
+        self.assertEqual(Parking.objects.count(), 2)
+
+    def test_import_reloads_the_search_inventory(self):
+        views.facade.find_nearest_parking({'lat': 3.45, 'lng': -76.53})
+        self.run_import(self.write('inventario.csv', self.RECORDS[:1], 'csv'))
+        nearest = views.facade.find_nearest_parking({'lat': 3.45, 'lng': -76.53})
+        self.assertEqual(nearest['id'], Parking.objects.get(external_id='P-1').id)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'los planes se verifican con EXPLAIN QUERY PLAN de SQLite')
+class QueryPlanTest(TestCase):
+    """Regresión: las consultas de búsqueda e historial deben usar sus índices"""
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in index_names), plan)
+        self.assertNotIn('USE TEMP B-TREE', plan)
+
+    def test_available_parkings_use_index(self):
+        # Cualquiera de los dos índices filtra los disponibles sin recorrer la tabla
+        self.assertUsesIndex(
+            ParkingDataManager().get_all_parkings(), 'parking_available_price_idx', 'parking_available_geo_idx'
+        )
+        self.assertUsesIndex(
+            Parking.objects.filter(is_available=True, price_per_hour__lte=5000), 'parking_available_price_idx'
+        )
+
+    def test_bbox_search_uses_partial_index(self):
+        queryset = Parking.objects.filter(
+            is_available=True, latitude__range=(3.4, 3.5), longitude__range=(-76.6, -76.5)
+        )
+        self.assertUsesIndex(queryset, 'parking_available_geo_idx')
+
+    def test_history_uses_composite_index(self):
+        user = User.objects.create_user('conductor')
+        self.assertUsesIndex(
+            SearchHistory.objects.filter(user=user).order_by('-timestamp')[:10], 'history_user_recent_idx'
+        )
+        self.assertUsesIndex(SearchHistory.objects.order_by('-timestamp')[:10], 'history_recent_idx')
+
+    def test_unused_rtree_is_dropped(self):
+        self.assertNotIn('api_parking_rtree', connection.introspection.table_names())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'api_parking_rtree%'")
+            self.assertEqual(cursor.fetchall(), [])
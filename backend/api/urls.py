@@ -1,12 +1,41 @@
+from django.conf import settings
 from django.urls import path
 from api.views import (
     FindNearestParkingView, 
+    BatchSearchView,
+    NearbyParkingsView,
+    ParkingRouteView,
     UpdateParkingAvailabilityView, 
-    SearchHistoryView
+    BulkAvailabilityUpdateView,
+    ParkingOccupancyView,
+    ParkingReservationView,
+    ReservationView,
+    ReservationExitView,
+    SearchHistoryView,
+    MetricsView,
+    availability_stream,
+    find_nearest_parking_async,
+    search_history_async
 )
 
+# Bajo ASGI (uvicorn/daphne) la búsqueda y el historial usan las vistas asíncronas
+if getattr(settings, 'ASYNC_SEARCH_VIEWS', False):
+    find_nearest_view, search_history_view = find_nearest_parking_async, search_history_async
+else:
+    find_nearest_view, search_history_view = FindNearestParkingView.as_view(), SearchHistoryView.as_view()
+
 urlpatterns = [
-    path('search/nearest/', FindNearestParkingView.as_view(), name='find-nearest'),
+    path('search/nearest/', find_nearest_view, name='find-nearest'),
+    path('search/batch/', BatchSearchView.as_view(), name='find-nearest-batch'),
+    path('search/nearby/', NearbyParkingsView.as_view(), name='find-nearby'),
+    path('parking/<int:parking_id>/route/', ParkingRouteView.as_view(), name='parking-route'),
     path('parking/<int:parking_id>/availability/', UpdateParkingAvailabilityView.as_view(), name='update-availability'),
-    path('search/history/', SearchHistoryView.as_view(), name='search-history'),
+    path('parking/<int:parking_id>/occupancy/', ParkingOccupancyView.as_view(), name='parking-occupancy'),
+    path('parking/<int:parking_id>/reservations/', ParkingReservationView.as_view(), name='parking-reservations'),
+    path('reservations/<str:token>/', ReservationView.as_view(), name='reservation'),
+    path('reservations/<str:token>/exit/', ReservationExitView.as_view(), name='reservation-exit'),
+    path('parking/availability/bulk/', BulkAvailabilityUpdateView.as_view(), name='bulk-update-availability'),
+    path('parking/availability/stream/', availability_stream, name='availability-stream'),
+    path('search/history/', search_history_view, name='search-history'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
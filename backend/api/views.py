@@ -1,43 +1,199 @@
+import asyncio
+import base64
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import math
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from api.models import Parking, SearchHistory
 from api.serializers import SearchHistorySerializer
+from api.patterns.adapter import RoadNetworkGPSAdapter
 from api.patterns.facade import ParkingSearchFacade
 from api.patterns.proxy import ParkingSearchProxy
 from api.patterns.mediator import SearchMediator
 from api.patterns.observer import ParkingAvailabilityObserver
+from api.services.availability_stream import AvailabilityBroadcaster, format_sse
+from api.services.availability_updates import apply_availability_updates, parse_timestamp
+from api.services.event_bus import EventBus
+from api.services.history_writer import SearchHistoryWriter
+from api.services.occupancy import OccupancyCounters
+from api.services import payloads
+from api.services.reservations import SpaceReservationEngine
+from api.services.shared_snapshot import SharedSnapshotStore
+from api.services.rate_limit import SQLiteTokenBucketRateLimiter, TokenBucketRateLimiter
+from api.services.road_network import RoadNetwork
+from api.services.travel_time_grid import TravelTimeGrid
+from api.services.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Trazas por etapa: desactivadas por defecto, muestreadas al activarlas
+tracing_settings = getattr(settings, 'SEARCH_TRACING', {})
+tracer.configure(
+    enabled=tracing_settings.get('ENABLED', False),
+    sample_rate=tracing_settings.get('SAMPLE_RATE', 1.0)
+)
 
 # Inicializar patrones (singleton)
-mediator = SearchMediator()
+event_bus_settings = getattr(settings, 'MEDIATOR_EVENT_BUS', {})
+mediator = SearchMediator(EventBus(
+    max_queue=event_bus_settings.get('MAX_QUEUE', 10_000),
+    max_retries=event_bus_settings.get('MAX_RETRIES', 3),
+    retry_backoff=event_bus_settings.get('RETRY_BACKOFF_SECONDS', 0.1),
+    synchronous=event_bus_settings.get('SYNCHRONOUS', False)
+))
 facade = ParkingSearchFacade()
-proxy = ParkingSearchProxy(facade)
+# Con un grafo vial local las rutas son reales y el más cercano se elige por tiempo de viaje
+if getattr(settings, 'ROAD_GRAPH_PATH', None):
+    facade.set_gps_service(
+        RoadNetworkGPSAdapter(RoadNetwork.load(settings.ROAD_GRAPH_PATH)),
+        travel_time_candidates=getattr(settings, 'ROAD_GRAPH_TRAVEL_TIME_CANDIDATES', 5)
+    )
+# Tabla precalculada de tiempos de viaje por celda (mmap; se actualiza si hay grafo vial)
+if getattr(settings, 'TRAVEL_TIME_GRID_PATH', None):
+    facade.set_travel_time_grid(TravelTimeGrid.load(
+        settings.TRAVEL_TIME_GRID_PATH,
+        writable=bool(getattr(settings, 'ROAD_GRAPH_PATH', None))
+    ))
+# Snapshot de parqueaderos compartido entre workers (una copia en memoria para todos)
+if getattr(settings, 'SHARED_SNAPSHOT_PATH', None):
+    facade.data_manager.set_shared_store(SharedSnapshotStore(settings.SHARED_SNAPSHOT_PATH))
+# Con RATE_LIMIT_SHARED_DB todos los workers comparten el límite; si no, es por proceso
+proxy = ParkingSearchProxy(
+    facade,
+    rate_limiter=SQLiteTokenBucketRateLimiter(settings.RATE_LIMIT_SHARED_DB)
+    if getattr(settings, 'RATE_LIMIT_SHARED_DB', None) else None
+)
 observer = ParkingAvailabilityObserver()
+# El historial se guarda por lotes en segundo plano, fuera del camino de la búsqueda
+history_writer = SearchHistoryWriter(
+    synchronous=not getattr(settings, 'SEARCH_HISTORY_WRITE_BEHIND', True)
+)
+
+
+# Hilos para el trabajo bloqueante de las vistas asíncronas (distancias sobre el snapshot, rutas)
+search_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ASYNC_SEARCH_THREADS', 16),
+    thread_name_prefix='async-search'
+)
+
+
+def _locate_parking(parking_id):
+    """Ubicación de un parqueadero según el snapshot ya cargado (None si no está)"""
+    snapshot = facade.data_manager.snapshot
+    row = snapshot.row_of(parking_id) if snapshot is not None else None
+    if row is None:
+        return None
+    return {'lat': float(snapshot.latitude[row]), 'lng': float(snapshot.longitude[row])}
+
+
+# Los cambios de disponibilidad se empujan a los clientes del stream SSE
+stream_settings = getattr(settings, 'AVAILABILITY_STREAM', {})
+availability_broadcaster = AvailabilityBroadcaster(
+    max_pending=stream_settings.get('MAX_PENDING', 256),
+    locate=_locate_parking
+)
+observer.subscribe(availability_broadcaster.publish)
+
+
+def _on_occupancy_change(parking_id, occupied, capacity, availability_changed):
+    mediator.notify('occupancy', 'parking_occupancy_changed', {
+        'parking_id': parking_id,
+        'occupied_spaces': occupied,
+        'capacity': capacity,
+        'availability_changed': availability_changed,
+        'location': _locate_parking(parking_id) if availability_changed else None
+    })
+
+
+# Contadores de cupos en memoria; los deltas se escriben en la BD por lotes
+occupancy = OccupancyCounters(
+    facade.data_manager,
+    on_change=_on_occupancy_change,
+    flush_interval=getattr(settings, 'OCCUPANCY_FLUSH_SECONDS', 1.0)
+)
+# Reservas de cupos con retención temporal y confirmación optimista en la BD
+reservations = SpaceReservationEngine(
+    facade.data_manager,
+    ttl_seconds=getattr(settings, 'RESERVATION_HOLD_SECONDS', 300),
+    occupancy=occupancy
+)
+# Retener cupos tiene su propio bucket por usuario (o IP): una ráfaga no vacía el inventario
+reservation_rate_settings = getattr(settings, 'RESERVATION_RATE_LIMIT', {})
+reservation_rate_options = {
+    'capacity': reservation_rate_settings.get('CAPACITY', 3),
+    'refill_per_second': reservation_rate_settings.get('REFILL_PER_SECOND', 0.05),
+}
+reservation_limiter = (
+    SQLiteTokenBucketRateLimiter(settings.RATE_LIMIT_SHARED_DB, **reservation_rate_options)
+    if getattr(settings, 'RATE_LIMIT_SHARED_DB', None) else TokenBucketRateLimiter(**reservation_rate_options)
+)
 
 # Registrar componentes en el mediator
 mediator.register_component('facade', facade)
 mediator.register_component('proxy', proxy)
 mediator.register_component('observer', observer)
+mediator.register_component('data_manager', facade.data_manager)
+
+
+def _parse_reserve(data):
+    """Flag reserve de la petición: solo true/false (booleano JSON o texto); None si no es válido"""
+    value = data.get('reserve', False)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    return None
+
+
+def _reservation_rate_limit_error(user_id, client_ip):
+    """Respuesta de error si el usuario (o la IP) retiene cupos más rápido que su bucket"""
+    key = f"user:{user_id}" if user_id else f"ip:{client_ip}" if client_ip else None
+    retry_after = reservation_limiter.acquire(key) if key is not None else 0
+    if retry_after:
+        return {'error': 'Rate limit exceeded', 'retry_after': math.ceil(retry_after)}
+    return None
 
 
 class FindNearestParkingView(APIView):
     """API endpoint para buscar el parqueadero más cercano"""
     
+    @tracer.traced('search')
     def post(self, request):
-        print("=" * 60)
-        print("🚀 API REQUEST: Búsqueda de parqueadero iniciada")
-        print("=" * 60)
-        
+        logger.debug("🚀 API REQUEST: Búsqueda de parqueadero iniciada")
+
         # Validar datos de entrada
         latitude = request.data.get('latitude')
         longitude = request.data.get('longitude')
         filters = request.data.get('filters', {})
+        reserve = _parse_reserve(request.data)
         
         if not latitude or not longitude:
             return Response(
                 {'error': 'Se requieren latitude y longitude'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if reserve is None:
+            return Response(
+                {'error': 'reserve debe ser true o false'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if reserve:
+            error = _reservation_rate_limit_error(
+                request.user.id if request.user.is_authenticated else None, request.META.get('REMOTE_ADDR')
+            )
+            if error:
+                return Response(error, status=status.HTTP_429_TOO_MANY_REQUESTS)
         
         user_location = {
             'lat': float(latitude),
@@ -54,7 +210,8 @@ class FindNearestParkingView(APIView):
         result = proxy.find_nearest_parking(
             user_location,
             filters,
-            user_id=request.user.id if request.user.is_authenticated else None
+            user_id=request.user.id if request.user.is_authenticated else None,
+            client_ip=request.META.get('REMOTE_ADDR')
         )
         
         if not result:
@@ -65,13 +222,22 @@ class FindNearestParkingView(APIView):
         
         if 'error' in result:
             return Response(result, status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+        # Con reserve el conductor recibe un cupo retenido solo para él (el resultado en caché no cambia)
+        if reserve:
+            reservation = reservations.hold(result['id'])
+            result = {
+                **result,
+                'space': reservation['space'] if reservation else None,
+                'reservation': reservation
+            }
         
-        # Guardar en historial
-        SearchHistory.objects.create(
-            user=request.user if request.user.is_authenticated else None,
-            search_latitude=latitude,
-            search_longitude=longitude,
-            result_parking_id=result['id']
+        # Guardar en historial (escritura diferida por lotes)
+        history_writer.record(
+            request.user.id if request.user.is_authenticated else None,
+            user_location['lat'],
+            user_location['lng'],
+            result['id']
         )
         
         # PATRÓN MEDIATOR: Notificar ruta calculada
@@ -80,16 +246,184 @@ class FindNearestParkingView(APIView):
             'parking_id': result['id']
         })
         
-        print("=" * 60)
-        print("✅ API RESPONSE: Búsqueda completada exitosamente")
-        print("=" * 60)
-        
+        logger.debug("✅ API RESPONSE: Búsqueda completada exitosamente")
+
         return Response(result, status=status.HTTP_200_OK)
 
 
+class BatchSearchView(APIView):
+    """
+    API endpoint para buscar el parqueadero más cercano a N orígenes en una sola petición
+    (integraciones de flotas y despacho). Cada elemento de la respuesta tiene el status
+    y el cuerpo que retornaría search/nearest/ para ese origen
+    """
+
+    MAX_BATCH_SIZE = 500
+
+    @tracer.traced('search_batch')
+    def post(self, request):
+        searches = request.data.get('searches')
+        default_filters = request.data.get('filters') or {}
+
+        if not isinstance(searches, list) or not searches:
+            return Response(
+                {'error': 'Se requiere una lista searches con latitude y longitude'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(searches) > self.MAX_BATCH_SIZE:
+            return Response(
+                {'error': f'Máximo {self.MAX_BATCH_SIZE} búsquedas por lote'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        items = [None] * len(searches)
+        valid = []
+        for position, search in enumerate(searches):
+            try:
+                latitude = search.get('latitude')
+                longitude = search.get('longitude')
+                if not latitude or not longitude:
+                    raise ValueError
+                user_location = {'lat': float(latitude), 'lng': float(longitude)}
+            except (AttributeError, TypeError, ValueError):
+                items[position] = {
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'data': {'error': 'Se requieren latitude y longitude'}
+                }
+                continue
+            valid.append((position, user_location, search.get('filters', default_filters)))
+
+        user_id = request.user.id if request.user.is_authenticated else None
+        mediator.notify('API', 'search_requested', {
+            'user_id': user_id,
+            'batch_size': len(valid)
+        })
+
+        # PATRÓN PROXY: un solo rate limiting y una sola pasada sobre el snapshot
+        results = proxy.find_nearest_batch(
+            [(user_location, filters) for _, user_location, filters in valid],
+            user_id=user_id,
+            client_ip=request.META.get('REMOTE_ADDR')
+        )
+        if isinstance(results, dict) and 'error' in results:
+            return Response(results, status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+        history = []
+        for (position, user_location, _), result in zip(valid, results):
+            if not result:
+                items[position] = {
+                    'status': status.HTTP_404_NOT_FOUND,
+                    'data': {'message': 'No se encontraron parqueaderos disponibles'}
+                }
+                continue
+            items[position] = {'status': status.HTTP_200_OK, 'data': result}
+            history.append((user_id, user_location['lat'], user_location['lng'], result['id']))
+
+        # Guardar en historial (escritura diferida por lotes)
+        history_writer.record_many(history)
+
+        return Response({'results': items}, status=status.HTTP_200_OK)
+
+
+def _encode_cursor(result):
+    """Cursor opaco con la posición (distancia, id) del último resultado de la página"""
+    position = json.dumps([result['distance_km'], result['id']]).encode()
+    return base64.urlsafe_b64encode(position).decode()
+
+
+def _decode_cursor(cursor):
+    distance, parking_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return float(distance), int(parking_id)
+
+
+class NearbyParkingsView(APIView):
+    """API endpoint para listar parqueaderos cercanos ordenados por distancia, paginados por cursor"""
+
+    DEFAULT_PAGE_SIZE = 10
+    MAX_PAGE_SIZE = 50
+
+    @tracer.traced('search_nearby')
+    def post(self, request):
+        latitude = request.data.get('latitude')
+        longitude = request.data.get('longitude')
+        filters = request.data.get('filters', {})
+
+        if not latitude or not longitude:
+            return Response(
+                {'error': 'Se requieren latitude y longitude'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            page_size = int(request.data.get('page_size', self.DEFAULT_PAGE_SIZE))
+            cursor = request.data.get('cursor')
+            after = _decode_cursor(cursor) if cursor else None
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'page_size o cursor inválido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        page_size = max(1, min(page_size, self.MAX_PAGE_SIZE))
+
+        user_location = {
+            'lat': float(latitude),
+            'lng': float(longitude)
+        }
+
+        # PATRÓN PROXY: las rutas no se calculan aquí, sino en ParkingRouteView
+        # cuando el cliente expande un resultado
+        results = proxy.find_k_nearest(
+            user_location,
+            page_size,
+            filters,
+            after=after,
+            user_id=request.user.id if request.user.is_authenticated else None,
+            client_ip=request.META.get('REMOTE_ADDR')
+        )
+
+        if isinstance(results, dict) and 'error' in results:
+            return Response(results, status=status.HTTP_429_TOO_MANY_REQUESTS)
+
+        return Response({
+            'results': results,
+            'next_cursor': _encode_cursor(results[-1]) if len(results) == page_size else None
+        }, status=status.HTTP_200_OK)
+
+
+class ParkingRouteView(APIView):
+    """API endpoint para calcular la ruta a un parqueadero cuando el cliente expande un resultado"""
+
+    @tracer.traced('route')
+    def get(self, request, parking_id):
+        try:
+            user_location = {
+                'lat': float(request.query_params['latitude']),
+                'lng': float(request.query_params['longitude'])
+            }
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'Se requieren latitude y longitude'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        route = facade.get_route(user_location, parking_id)
+        if route is None:
+            return Response(
+                {'error': 'Parqueadero no encontrado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response({
+            'parking_id': parking_id,
+            'route': route,
+            'estimated_time_minutes': route['duration_minutes']
+        }, status=status.HTTP_200_OK)
+
+
 class UpdateParkingAvailabilityView(APIView):
     """API endpoint para actualizar disponibilidad de parqueadero"""
     
+    @tracer.traced('availability_update')
     def patch(self, request, parking_id):
         try:
             parking = Parking.objects.get(id=parking_id)
@@ -106,38 +440,395 @@ class UpdateParkingAvailabilityView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Actualizar disponibilidad
+        # Actualizar disponibilidad: cerrar es un cierre manual que los contadores de
+        # cupos no reabren; al reabrir vuelve la disponibilidad derivada de los cupos
         old_status = parking.is_available
-        parking.is_available = is_available
-        parking.save()
+        parking.is_closed = not is_available
+        parking.is_available = bool(is_available) and parking.occupied_spaces < parking.capacity
+        parking.availability_updated_at = timezone.now()
+        parking.save(update_fields=['is_available', 'is_closed', 'availability_updated_at', 'updated_at'])
         
-        print(f"📝 Disponibilidad actualizada: Parking {parking_id} -> {is_available}")
+        logger.debug("📝 Disponibilidad actualizada: Parking %s -> %s", parking_id, parking.is_available)
         
         # PATRÓN MEDIATOR + OBSERVER: Notificar cambio
         mediator.notify('API', 'parking_availability_changed', {
             'parking_id': parking_id,
-            'is_available': is_available,
-            'previous_status': old_status
+            'is_available': parking.is_available,
+            'is_closed': parking.is_closed,
+            'previous_status': old_status,
+            'location': {'lat': parking.latitude, 'lng': parking.longitude}
         })
         
         return Response({
             'id': parking.id,
             'name': parking.name,
             'is_available': parking.is_available,
+            'is_closed': parking.is_closed,
             'message': 'Disponibilidad actualizada y notificaciones enviadas'
         }, status=status.HTTP_200_OK)
 
 
+class BulkAvailabilityUpdateView(APIView):
+    """
+    API endpoint para gateways de sensores: aplica miles de lecturas
+    {parking_id, is_available | occupied_count, timestamp} en una sola transacción.
+    Las lecturas más antiguas que la última aplicada se descartan y los cambios
+    se notifican como un único lote (una invalidación de caché)
+    """
+
+    MAX_BATCH_SIZE = 10_000
+
+    @tracer.traced('availability_bulk_update')
+    def post(self, request):
+        updates = request.data.get('updates')
+        if not isinstance(updates, list) or not updates:
+            return Response(
+                {'error': 'Se requiere una lista updates'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(updates) > self.MAX_BATCH_SIZE:
+            return Response(
+                {'error': f'Máximo {self.MAX_BATCH_SIZE} lecturas por lote'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        valid = []
+        errors = []
+        for position, update in enumerate(updates):
+            try:
+                parking_id = int(update['parking_id'])
+                is_available = update.get('is_available')
+                occupied_count = update.get('occupied_count')
+                if is_available is not None:
+                    if not isinstance(is_available, bool):
+                        raise ValueError
+                elif occupied_count is not None:
+                    occupied_count = int(occupied_count)
+                else:
+                    raise ValueError
+                timestamp = parse_timestamp(update['timestamp'])
+            except (AttributeError, KeyError, TypeError, ValueError, OverflowError, OSError):
+                errors.append({
+                    'index': position,
+                    'error': 'Se requieren parking_id, timestamp e is_available u occupied_count'
+                })
+                continue
+            valid.append((parking_id, is_available, occupied_count, timestamp))
+
+        result = apply_availability_updates(valid) if valid else {
+            'applied': 0, 'changed': [], 'occupancy': [], 'stale': 0, 'superseded': 0, 'not_found': []
+        }
+        for parking_id, occupied in result['occupancy']:
+            occupancy.set(parking_id, occupied)
+        logger.debug("📝 Lote de disponibilidad: %s aplicadas, %s cambios", result['applied'], len(result['changed']))
+
+        # PATRÓN MEDIATOR + OBSERVER: un solo evento para todo el lote
+        if result['changed'] or result['occupancy']:
+            mediator.notify('API', 'parking_availability_batch_changed', {
+                'changes': result['changed'],
+                'occupancy_changed': [parking_id for parking_id, _ in result['occupancy']]
+            })
+
+        return Response({
+            'applied': result['applied'],
+            'changed': len(result['changed']),
+            'stale': result['stale'],
+            'superseded': result['superseded'],
+            'not_found': result['not_found'],
+            'errors': errors,
+        }, status=status.HTTP_200_OK)
+
+
+class ParkingOccupancyView(APIView):
+    """
+    API endpoint para registrar entradas y salidas de vehículos
+    Ajusta el contador en memoria (sin consultar la BD); la disponibilidad se
+    deriva de ocupados < capacidad y los contadores se guardan por lotes
+    """
+
+    @tracer.traced('occupancy_update')
+    def post(self, request, parking_id):
+        try:
+            entries = int(request.data.get('entries', 0))
+            exits = int(request.data.get('exits', 0))
+            if entries < 0 or exits < 0 or not (entries or exits):
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'Se requieren entries y/o exits (enteros no negativos)'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        counts = occupancy.adjust(parking_id, entries - exits)
+        if counts is None:
+            return Response(
+                {'error': 'Parqueadero no encontrado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        occupied, capacity = counts
+        return Response({
+            'id': parking_id,
+            'occupied_spaces': occupied,
+            'capacity': capacity,
+            'free_spaces': capacity - occupied,
+            'is_available': occupied < capacity
+        }, status=status.HTTP_200_OK)
+
+
+class ParkingReservationView(APIView):
+    """
+    API endpoint para retener un cupo de un parqueadero por RESERVATION_HOLD_SECONDS
+    Cada usuario (o IP) retiene a lo sumo RESERVATION_RATE_LIMIT cupos por ráfaga
+    """
+
+    @tracer.traced('reservation_hold')
+    def post(self, request, parking_id):
+        error = _reservation_rate_limit_error(
+            request.user.id if request.user.is_authenticated else None, request.META.get('REMOTE_ADDR')
+        )
+        if error:
+            return Response(error, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        reservation = reservations.hold(parking_id)
+        if reservation is None:
+            return Response(
+                {'error': 'No hay cupos disponibles para reservar'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(reservation, status=status.HTTP_201_CREATED)
+
+
+class ReservationView(APIView):
+    """API endpoint para cancelar (DELETE) o confirmar la llegada (POST) de una reserva"""
+
+    def delete(self, request, token):
+        if not reservations.release(token):
+            return Response(
+                {'error': 'Reserva no encontrada o vencida'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def post(self, request, token):
+        counts = reservations.confirm(token)
+        if counts is None:
+            return Response(
+                {'error': 'Reserva no encontrada o vencida'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({'message': 'Llegada confirmada'}, status=status.HTTP_200_OK)
+
+
+class ReservationExitView(APIView):
+    """API endpoint para registrar la salida del conductor de una reserva confirmada (libera el cupo)"""
+
+    def post(self, request, token):
+        counts = reservations.vacate(token)
+        if counts is None:
+            return Response(
+                {'error': 'Reserva no encontrada o sin llegada confirmada'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({'message': 'Salida registrada'}, status=status.HTTP_200_OK)
+
+
 class SearchHistoryView(APIView):
     """API endpoint para obtener historial de búsquedas del usuario"""
     
+    @tracer.traced('history')
     def get(self, request):
         if request.user.is_authenticated:
             history = SearchHistory.objects.filter(
                 user=request.user
-            ).order_by('-timestamp')[:10]
+            ).select_related('result_parking').order_by('-timestamp')[:10]
         else:
-            history = SearchHistory.objects.all().order_by('-timestamp')[:10]
+            history = SearchHistory.objects.select_related('result_parking').order_by('-timestamp')[:10]
         
         serializer = SearchHistorySerializer(history, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """API endpoint con histogramas de latencia por etapa y contadores de los componentes"""
+
+    def get(self, request):
+        shared_store = facade.data_manager.shared_store
+        return Response({
+            'tracing': tracer.metrics(),
+            'cache': proxy.get_cache_stats(),
+            'coalescing': proxy.get_coalescing_stats(),
+            'route_cache': facade.route_cache.stats(),
+            'rate_limit': proxy.get_rate_limit_stats(),
+            'history_writer': history_writer.stats(),
+            'availability_stream': availability_broadcaster.stats(),
+            'event_bus': mediator.event_bus.stats(),
+            'occupancy': occupancy.stats(),
+            'reservations': reservations.stats(),
+            'reservation_rate_limit': reservation_limiter.stats(),
+            'shared_snapshot': shared_store.stats() if shared_store is not None else None,
+        }, status=status.HTTP_200_OK)
+
+
+# Máximo de ids por suscripción al stream
+MAX_STREAM_PARKING_IDS = 1000
+
+
+def _current_availability(parking_ids, bbox):
+    """Estado actual de los parqueaderos suscritos, leído del snapshot"""
+    snapshot = facade.data_manager.get_snapshot()
+    mask = np.isin(snapshot.ids, parking_ids)
+    if bbox is not None:
+        min_lat, min_lng, max_lat, max_lng = bbox
+        mask |= ((snapshot.latitude >= min_lat) & (snapshot.latitude <= max_lat) &
+                 (snapshot.longitude >= min_lng) & (snapshot.longitude <= max_lng))
+    rows = np.flatnonzero(mask)
+    return [
+        {'parking_id': parking_id, 'is_available': is_available}
+        for parking_id, is_available in zip(snapshot.ids[rows].tolist(), snapshot.is_available[rows].tolist())
+    ]
+
+
+@require_GET
+async def availability_stream(request):
+    """
+    Stream Server-Sent Events de cambios de disponibilidad (requiere servidor ASGI)
+    GET ?parking_ids=1,2,3 y/o ?bbox=min_lat,min_lng,max_lat,max_lng
+    Envía primero un evento 'snapshot' con el estado actual y luego eventos
+    'availability' con los cambios; 'resync' si el cliente se quedó atrás
+    """
+    try:
+        parking_ids = [int(value) for value in request.GET.get('parking_ids', '').split(',') if value]
+        bbox = request.GET.get('bbox')
+        bbox = tuple(float(value) for value in bbox.split(',')) if bbox else None
+    except ValueError:
+        return JsonResponse({'error': 'parking_ids y bbox deben ser numéricos'}, status=400)
+    if bbox is not None and (len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3]):
+        return JsonResponse({'error': 'bbox debe ser min_lat,min_lng,max_lat,max_lng'}, status=400)
+    if not parking_ids and bbox is None:
+        return JsonResponse({'error': 'Se requiere parking_ids o bbox'}, status=400)
+    if len(parking_ids) > MAX_STREAM_PARKING_IDS:
+        return JsonResponse(
+            {'error': f'Máximo {MAX_STREAM_PARKING_IDS} parking_ids por suscripción'}, status=400
+        )
+
+    # Suscribirse antes de leer el estado actual: ningún cambio intermedio se pierde
+    subscription = availability_broadcaster.subscribe(parking_ids, bbox, loop=asyncio.get_running_loop())
+    try:
+        current = await sync_to_async(_current_availability)(parking_ids, bbox)
+    except BaseException:
+        availability_broadcaster.unsubscribe(subscription)
+        raise
+    for item in current:
+        subscription.known[item['parking_id']] = item['is_available']
+    heartbeat_seconds = stream_settings.get('HEARTBEAT_SECONDS', 15)
+
+    async def stream():
+        try:
+            yield format_sse('snapshot', current)
+            async for events in availability_broadcaster.events(subscription, heartbeat_seconds):
+                yield ': keep-alive\n\n' if events is None else format_sse('availability', events)
+            if subscription.overflowed:
+                yield format_sse('resync', {'reason': 'slow_consumer'})
+        finally:
+            availability_broadcaster.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _user_id(request):
+    user = await request.auser()
+    return user.id if user.is_authenticated else None
+
+
+@csrf_exempt
+@require_POST
+@tracer.traced('search')
+async def find_nearest_parking_async(request):
+    """
+    Versión asíncrona de FindNearestParkingView para servidores ASGI (ASYNC_SEARCH_VIEWS):
+    mismo contrato JSON; el cálculo de distancias corre en search_executor y las
+    rutas de los candidatos se esperan en paralelo, sin ocupar un hilo por petición
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+    latitude = data.get('latitude')
+    longitude = data.get('longitude')
+    filters = data.get('filters', {})
+    reserve = _parse_reserve(data)
+
+    if not latitude or not longitude:
+        return JsonResponse({'error': 'Se requieren latitude y longitude'}, status=400)
+    if reserve is None:
+        return JsonResponse({'error': 'reserve debe ser true o false'}, status=400)
+
+    user_location = {
+        'lat': float(latitude),
+        'lng': float(longitude)
+    }
+    user_id = await _user_id(request)
+    if reserve:
+        error = _reservation_rate_limit_error(user_id, request.META.get('REMOTE_ADDR'))
+        if error:
+            return JsonResponse(error, status=429)
+
+    # PATRÓN MEDIATOR: Notificar inicio de búsqueda
+    mediator.notify('API', 'search_requested', {
+        'user_id': user_id,
+        'location': user_location
+    })
+
+    # PATRÓN PROXY: mismo caché y rate limiting que la vista síncrona
+    result = await proxy.afind_nearest_parking(
+        user_location,
+        filters,
+        user_id=user_id,
+        client_ip=request.META.get('REMOTE_ADDR'),
+        executor=search_executor
+    )
+
+    if not result:
+        return JsonResponse({'message': 'No se encontraron parqueaderos disponibles'}, status=404)
+
+    if 'error' in result:
+        return JsonResponse(result, status=429)
+
+    if reserve:
+        reservation = await sync_to_async(reservations.hold)(result['id'])
+        result = {
+            **result,
+            'space': reservation['space'] if reservation else None,
+            'reservation': reservation
+        }
+
+    # Con escritura diferida record() solo encola; la escritura síncrona va a un hilo
+    record = (user_id, user_location['lat'], user_location['lng'], result['id'])
+    if history_writer.synchronous:
+        await sync_to_async(history_writer.record)(*record)
+    else:
+        history_writer.record(*record)
+
+    # PATRÓN MEDIATOR: Notificar ruta calculada
+    mediator.notify('API', 'route_calculated', {
+        'distance': result['distance_km'],
+        'parking_id': result['id']
+    })
+
+    return HttpResponse(payloads.render(result), content_type='application/json')
+
+
+@require_GET
+@tracer.traced('history')
+async def search_history_async(request):
+    """Versión asíncrona de SearchHistoryView con el ORM asíncrono de Django"""
+    user = await request.auser()
+    history = SearchHistory.objects.select_related('result_parking').order_by('-timestamp')
+    if user.is_authenticated:
+        history = history.filter(user=user)
+    items = [item async for item in history[:10]]
+    return JsonResponse(SearchHistorySerializer(items, many=True).data, safe=False)
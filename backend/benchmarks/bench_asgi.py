@@ -0,0 +1,206 @@
+"""
+Benchmark: concurrencia de búsqueda e historial bajo WSGI y ASGI con la misma cantidad de workers
+- wsgi: N hilos, cada uno atiende una petición a la vez (gunicorn --threads N) con las vistas DRF
+- asgi: N event loops, cada uno con --concurrency peticiones en curso (N workers de uvicorn)
+  con las vistas asíncronas; el trabajo bloqueante va a su executor (--executor-threads)
+--route-latency-ms simula la espera del servicio de direcciones externo en cada ruta calculada
+y --candidates los candidatos cuyas rutas se consultan por búsqueda.
+Ejecutar desde backend/ con: python -m benchmarks.bench_asgi --parkings 10000 --workers 4 --output asgi.json
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from django.urls import path
+
+from benchmarks.common import benchmark_database, print_table, setup_django, summarize, write_results
+from benchmarks.synthetic import search_trace, seed_parkings
+
+HISTORY_ROWS = 10_000
+
+
+def _urlpatterns():
+    from api import views
+
+    return [
+        path('wsgi/search/nearest/', views.FindNearestParkingView.as_view()),
+        path('wsgi/search/history/', views.SearchHistoryView.as_view()),
+        path('asgi/search/nearest/', views.find_nearest_parking_async),
+        path('asgi/search/history/', views.search_history_async),
+    ]
+
+
+# ROOT_URLCONF del benchmark: ambas variantes de las vistas, sin depender de ASYNC_SEARCH_VIEWS
+urlpatterns = []
+
+
+def _summary(latencies, statuses, elapsed):
+    summary = summarize(latencies, elapsed)
+    summary['status_codes'] = {str(code): count for code, count in sorted(statuses.items())}
+    summary['errors'] = sum(count for code, count in statuses.items() if code >= 500)
+    return summary
+
+
+def drive_wsgi(requests, workers, send):
+    """workers hilos con django.test.Client (WSGIHandler), una petición en curso por hilo"""
+    from django.db import connection
+    from django.test import Client
+
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+
+    def worker(index):
+        client = Client()
+        try:
+            for request in requests[index::workers]:
+                start = time.perf_counter()
+                response = send(client, request)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _summary(latencies, statuses, time.perf_counter() - start)
+
+
+def drive_asgi(requests, workers, concurrency, send):
+    """workers hilos con su event loop y AsyncClient (ASGIHandler), concurrency peticiones en curso por loop"""
+    from django.test import AsyncClient
+
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+
+    async def serve(client, pending):
+        while pending:
+            request = pending.pop()
+            start = time.perf_counter()
+            response = await send(client, request)
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    async def loop(index):
+        client = AsyncClient()
+        pending = list(reversed(requests[index::workers]))
+        await asyncio.gather(*(serve(client, pending) for _ in range(concurrency)))
+
+    threads = [threading.Thread(target=asyncio.run, args=(loop(index),)) for index in range(workers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return _summary(latencies, statuses, time.perf_counter() - start)
+
+
+def _simulate_route_latency(gps_adapter, latency_ms):
+    """Cada ruta calculada espera latency_ms, como una llamada HTTP bloqueante al proveedor"""
+    calculate_route = gps_adapter.calculate_route
+
+    def delayed(origin, destination):
+        time.sleep(latency_ms / 1000)
+        return calculate_route(origin, destination)
+
+    gps_adapter.calculate_route = delayed
+
+
+def _seed_history(parking_ids):
+    from api.models import SearchHistory
+
+    SearchHistory.objects.bulk_create([
+        SearchHistory(
+            search_latitude=3.45, search_longitude=-76.53, result_parking_id=parking_ids[i % len(parking_ids)]
+        )
+        for i in range(HISTORY_ROWS)
+    ], batch_size=5_000)
+
+
+def run(parkings, requests, workers, concurrency, executor_threads, route_latency_ms, candidates, seed):
+    from django.conf import settings
+    from django.urls import clear_url_caches
+    from api import views
+    from api.services.rate_limit import TokenBucketRateLimiter
+
+    urlpatterns[:] = _urlpatterns()
+    settings.ROOT_URLCONF = __name__
+    clear_url_caches()
+
+    parking_ids = seed_parkings(parkings, seed)
+    # Se mide la capacidad del servidor y no la política por usuario
+    views.proxy.rate_limiter = TokenBucketRateLimiter(capacity=10 ** 9, refill_per_second=10 ** 9)
+    views.search_executor = ThreadPoolExecutor(max_workers=executor_threads, thread_name_prefix='async-search')
+    views.facade.travel_time_candidates = candidates
+    if route_latency_ms:
+        _simulate_route_latency(views.facade.gps_adapter, route_latency_ms)
+    _seed_history(parking_ids)
+    views.facade.data_manager.get_snapshot_and_index()
+
+    trace = [
+        {'latitude': search['location']['lat'], 'longitude': search['location']['lng'], 'filters': search['filters']}
+        for search in search_trace(requests, seed)
+    ]
+
+    def reset():
+        # Cada variante empieza sin resultados ni rutas en caché
+        views.proxy.cache.clear()
+        views.facade.route_cache.clear()
+
+    results = {}
+    reset()
+    results['wsgi.search'] = drive_wsgi(trace, workers, lambda client, body: client.post(
+        '/wsgi/search/nearest/', body, content_type='application/json'
+    ))
+    reset()
+    results['asgi.search'] = drive_asgi(trace, workers, concurrency, lambda client, body: client.post(
+        '/asgi/search/nearest/', body, content_type='application/json'
+    ))
+
+    history = list(range(requests))
+    results['wsgi.history'] = drive_wsgi(history, workers, lambda client, _: client.get('/wsgi/search/history/'))
+    results['asgi.history'] = drive_asgi(
+        history, workers, concurrency, lambda client, _: client.get('/asgi/search/history/')
+    )
+
+    views.history_writer.flush()
+    views.mediator.event_bus.flush()
+    views.search_executor.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--parkings', type=int, default=10_000)
+    parser.add_argument('--requests', type=int, default=2_000, help='peticiones por escenario')
+    parser.add_argument('--workers', type=int, default=4, help='hilos WSGI = event loops ASGI')
+    parser.add_argument('--concurrency', type=int, default=8, help='peticiones en curso por event loop')
+    parser.add_argument('--executor-threads', type=int, default=16, help='hilos del executor de las vistas asíncronas')
+    parser.add_argument('--route-latency-ms', type=float, default=20.0)
+    parser.add_argument('--candidates', type=int, default=1, help='candidatos por búsqueda (travel_time_candidates)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='archivo JSON de resultados')
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        results = run(
+            args.parkings, args.requests, args.workers, args.concurrency, args.executor_threads,
+            args.route_latency_ms, args.candidates, args.seed
+        )
+    print_table(results)
+    if args.output:
+        write_results(args.output, 'asgi', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark: Haversine escalar vs. vectorizado (NumPy)
+Ejecutar desde backend/ con: python -m benchmarks.bench_distances
+"""
+import time
+
+import numpy as np
+
+from api.patterns.adapter import GoogleMapsService
+
+SIZES = (1_000, 10_000, 100_000)
+REPEAT = 3
+
+# Centro de Cali y un radio aproximado de 15 km
+ORIGIN = {'lat': 3.4516, 'lng': -76.5320}
+SPREAD_DEG = 0.15
+
+
+def best_of(func, repeat=REPEAT):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    service = GoogleMapsService()
+    rng = np.random.default_rng(42)
+
+    print(f"{'parqueaderos':>12} {'escalar (ms)':>14} {'numpy (ms)':>12} {'speedup':>9} {'error máx (km)':>15}")
+    for size in SIZES:
+        lats = ORIGIN['lat'] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, size)
+        lngs = ORIGIN['lng'] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, size)
+        lat_list = lats.tolist()
+        lng_list = lngs.tolist()
+
+        scalar_time, scalar = best_of(lambda: [
+            service.compute_distance_km(ORIGIN['lat'], ORIGIN['lng'], lat, lng)
+            for lat, lng in zip(lat_list, lng_list)
+        ])
+        batch_time, batch = best_of(lambda: service.compute_distances_km(
+            ORIGIN['lat'], ORIGIN['lng'], lats, lngs
+        ))
+
+        max_error = float(np.max(np.abs(np.asarray(scalar) - batch)))
+        print(f"{size:>12} {scalar_time * 1000:>14.2f} {batch_time * 1000:>12.2f} "
+              f"{scalar_time / batch_time:>8.1f}x {max_error:>15.2e}")
+
+
+if __name__ == '__main__':
+    main()
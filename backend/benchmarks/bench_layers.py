@@ -0,0 +1,89 @@
+"""
+Micro-benchmarks por capa del patrón de búsqueda (adapter, composite, facade, proxy)
+sobre parqueaderos sintéticos en una BD temporal
+Ejecutar desde backend/ con: python -m benchmarks.bench_layers --parkings 10000 --output layers.json
+"""
+import argparse
+
+from benchmarks.common import (
+    benchmark_database, print_table, setup_django, summarize, time_calls, write_results
+)
+from benchmarks.synthetic import search_trace, seed_parkings
+
+
+def run(parkings, searches, seed):
+    from api.patterns.adapter import GPSAdapter
+    from api.patterns.composite import (
+        AvailabilityCriteria, CompositeCriteria, DistanceCriteria, PriceCriteria
+    )
+    from api.patterns.facade import ParkingSearchFacade
+    from api.patterns.proxy import ParkingSearchProxy
+
+    seed_parkings(parkings, seed)
+    trace = search_trace(searches, seed)
+    locations = [search['location'] for search in trace]
+
+    facade = ParkingSearchFacade()
+    snapshot, _ = facade.data_manager.get_snapshot_and_index()
+    columns = snapshot.columns()
+    adapter = GPSAdapter()
+    results = {}
+
+    # ADAPTER: Haversine vectorizado contra todo el snapshot y ruta a un destino
+    results['adapter.distances'] = summarize(time_calls(
+        lambda location: adapter.get_distances(location, snapshot.latitude, snapshot.longitude), locations
+    ))
+    destination = {'lat': float(snapshot.latitude[0]), 'lng': float(snapshot.longitude[0])}
+    results['adapter.route'] = summarize(time_calls(
+        lambda location: adapter.calculate_route(location, destination), locations
+    ))
+
+    # COMPOSITE: máscara de (disponible AND distancia AND precio) sobre todas las filas
+    def compile_mask(location):
+        criteria = CompositeCriteria('AND')
+        criteria.add(AvailabilityCriteria())
+        criteria.add(DistanceCriteria(3, adapter))
+        criteria.add(PriceCriteria(5000))
+        return criteria.compile_mask(columns, location)
+
+    results['criteria.compile_mask'] = summarize(time_calls(compile_mask, locations))
+
+    # FACADE: búsqueda completa sin el caché del proxy
+    results['facade.find_nearest'] = summarize(time_calls(
+        lambda search: facade.find_nearest_parking(search['location'], search['filters']), trace
+    ))
+    results['facade.find_k_nearest_10'] = summarize(time_calls(
+        lambda search: facade.find_k_nearest(search['location'], 10, search['filters']), trace
+    ))
+
+    # PROXY: primera pasada (fallos de caché salvo repeticiones de la traza) y segunda (aciertos)
+    proxy = ParkingSearchProxy(facade)
+    proxy.cache.clear()
+    results['proxy.cold'] = summarize(time_calls(
+        lambda search: proxy.find_nearest_parking(search['location'], search['filters']), trace
+    ))
+    results['proxy.warm'] = summarize(time_calls(
+        lambda search: proxy.find_nearest_parking(search['location'], search['filters']), trace
+    ))
+    results['proxy.warm']['cache'] = proxy.get_cache_stats()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--parkings', type=int, default=10_000)
+    parser.add_argument('--searches', type=int, default=1_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='archivo JSON de resultados')
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        results = run(args.parkings, args.searches, args.seed)
+    print_table(results)
+    if args.output:
+        write_results(args.output, 'layers', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
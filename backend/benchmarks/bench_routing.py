@@ -0,0 +1,163 @@
+"""
+Benchmark: ruteo sobre la red vial local (RoadNetwork) con un grafo sintético en grilla
+- astar: shortest_path (A*) entre un origen y un destino a menos de --radius-km
+- dijkstra: travel_times hacia el mismo destino (Dijkstra sin heurística), como referencia
+- travel_times: Dijkstra uno-a-muchos hacia --candidates destinos (orden por tiempo de viaje)
+- nearest_items: los --candidates parqueaderos más cercanos por tiempo (celda de TravelTimeGrid)
+- adapter.route: RoadNetworkGPSAdapter.calculate_route completo (snap + A* + waypoints)
+El grafo es una grilla de --grid × --grid nodos (~110 m entre nodos) con avenidas cada
+8 cuadras, calles de un sentido y cuadras cerradas al azar.
+Ejecutar desde backend/ con: python -m benchmarks.bench_routing --grid 300 --output routing.json
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from api.services.spatial_index import EARTH_RADIUS_KM
+from benchmarks.common import best_of, print_table, summarize, time_calls, write_results
+from benchmarks.synthetic import CENTER
+
+SPACING_DEG = 0.001
+ARTERIAL_EVERY = 8
+ARTERIAL_KMH, RESIDENTIAL_KMH = 50, 25
+ONEWAY_SHARE = 0.3
+CLOSED_SHARE = 0.05
+
+
+def _meters(lat1, lng1, lat2, lng2):
+    """Haversine en metros elemento a elemento"""
+    lat1, lng1, lat2, lng2 = (np.radians(values) for values in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2000 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+def synthetic_network(size, seed):
+    """RoadNetwork en grilla: avenidas de doble sentido y calles de uno o dos sentidos"""
+    from api.services.road_network import RoadNetwork
+
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(size * size), size)
+    origin_lat = CENTER[0] - size * SPACING_DEG / 2
+    origin_lng = CENTER[1] - size * SPACING_DEG / 2
+    jitter = SPACING_DEG * 0.2
+    latitude = origin_lat + rows * SPACING_DEG + rng.uniform(-jitter, jitter, size * size)
+    longitude = origin_lng + cols * SPACING_DEG + rng.uniform(-jitter, jitter, size * size)
+
+    node = np.arange(size * size).reshape(size, size)
+    edges = []
+    # Tramos horizontales (por fila) y verticales (por columna)
+    for lines in (node, node.T):
+        for line_number, line in enumerate(lines):
+            arterial = line_number % ARTERIAL_EVERY == 0
+            speed = ARTERIAL_KMH if arterial else RESIDENTIAL_KMH
+            oneway = not arterial and rng.random() < ONEWAY_SHARE
+            u, v = line[:-1], line[1:]
+            if oneway and line_number % 2:
+                u, v = v, u
+            open_ = np.ones(len(u), dtype=bool) if arterial else rng.random(len(u)) >= CLOSED_SHARE
+            u, v = u[open_], v[open_]
+            meters = _meters(latitude[u], longitude[u], latitude[v], longitude[v])
+            seconds = meters / (speed / 3.6)
+            edges.extend(zip(u.tolist(), v.tolist(), seconds.tolist(), meters.tolist()))
+            if not oneway:
+                edges.extend(zip(v.tolist(), u.tolist(), seconds.tolist(), meters.tolist()))
+    return RoadNetwork.from_edges(latitude, longitude, edges)
+
+
+def _pairs(network, queries, radius_km, seed):
+    """(origen, destino) en nodos de la red con el destino a menos de radius_km del origen"""
+    rng = np.random.default_rng(seed + 1)
+    spread = radius_km / 111.0
+    pairs = []
+    while len(pairs) < queries:
+        source = int(rng.integers(len(network)))
+        lat = network.latitude[source] + rng.uniform(-spread, spread)
+        lng = network.longitude[source] + rng.uniform(-spread, spread)
+        target, _ = network.nearest_node(lat, lng)
+        if target != source:
+            pairs.append((source, target))
+    return pairs
+
+
+def run(size, queries, candidates, radius_km, seed):
+    from api.patterns.adapter import RoadNetworkGPSAdapter
+    from api.services.road_network import RoadNetwork
+
+    started = time.perf_counter()
+    network = synthetic_network(size, seed)
+    build_seconds = time.perf_counter() - started
+    path = os.path.join(tempfile.mkdtemp(prefix='smartpark-graph-'), 'graph.npz')
+    network.save(path)
+    load_seconds, network = best_of(lambda: RoadNetwork.load(path))
+    print(f"grafo: {len(network)} nodos, {network.edge_count} aristas, "
+          f"{os.path.getsize(path) / 1e6:.1f} MB en disco, construcción {build_seconds:.1f} s, "
+          f"carga {load_seconds * 1000:.0f} ms")
+
+    pairs = _pairs(network, queries, radius_km, seed)
+    rng = np.random.default_rng(seed + 2)
+    # Parqueaderos en nodos al azar (1 por cada 50 nodos) para los destinos uno-a-muchos
+    parking_nodes = rng.choice(len(network), size=max(candidates, len(network) // 50), replace=False).tolist()
+    items_by_node = {}
+    for item, parking_node in enumerate(parking_nodes):
+        items_by_node.setdefault(parking_node, []).append((item, 0.0))
+
+    results = {}
+    results['astar'] = summarize(time_calls(lambda pair: network.shortest_path(*pair), pairs))
+    results['dijkstra'] = summarize(time_calls(lambda pair: network.travel_times(pair[0], [pair[1]]), pairs))
+
+    def nearby_targets(source):
+        lat, lng = network.latitude[source], network.longitude[source]
+        order = np.argsort(np.hypot(network.latitude[parking_nodes] - lat, network.longitude[parking_nodes] - lng))
+        return [parking_nodes[i] for i in order[:candidates].tolist()]
+
+    targets = [(source, nearby_targets(source)) for source, _ in pairs]
+    results[f'travel_times_{candidates}'] = summarize(time_calls(
+        lambda item: network.travel_times(*item), targets
+    ))
+    results[f'nearest_items_{candidates}'] = summarize(time_calls(
+        lambda pair: network.nearest_items(pair[0], items_by_node, candidates), pairs
+    ))
+
+    adapter = RoadNetworkGPSAdapter(network)
+    points = [
+        ({'lat': float(network.latitude[source]), 'lng': float(network.longitude[source])},
+         {'lat': float(network.latitude[target]), 'lng': float(network.longitude[target])})
+        for source, target in pairs
+    ]
+    results['adapter.route'] = summarize(time_calls(lambda pair: adapter.calculate_route(*pair), points))
+
+    found = [network.shortest_path(*pair) for pair in pairs]
+    reachable = [item for item in found if item is not None]
+    print(f"rutas encontradas: {len(reachable)}/{len(pairs)}, "
+          f"mediana {np.median([seconds for _, seconds, _ in reachable]) / 60:.1f} min, "
+          f"{np.median([meters for _, _, meters in reachable]) / 1000:.2f} km")
+    graph = {
+        'nodes': len(network), 'edges': network.edge_count,
+        'build_seconds': round(build_seconds, 2), 'load_ms': round(load_seconds * 1000, 1),
+        'reachable': len(reachable),
+    }
+    return results, graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--grid', type=int, default=300, help='nodos por lado de la grilla')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--candidates', type=int, default=8, help='destinos por búsqueda uno-a-muchos')
+    parser.add_argument('--radius-km', type=float, default=3.0, help='distancia máxima origen-destino')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='archivo JSON de resultados')
+    args = parser.parse_args()
+
+    results, graph = run(args.grid, args.queries, args.candidates, args.radius_km, args.seed)
+    print_table(results)
+    if args.output:
+        # Tamaño del grafo junto a los parámetros: benchmarks.compare solo compara latencias
+        write_results(args.output, 'routing', dict(vars(args), graph=graph), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: serialización de resultados de búsqueda
+- modelo: instancia de Parking por resultado + dict + JSONRenderer de DRF (camino anterior)
+- fragmento: PayloadFragment precompilado + SearchPayload + FastJSONRenderer
+(_cold: la primera vez que se usa cada fragmento, que incluye compilarlo)
+Ejecutar desde backend/ con: python -m benchmarks.bench_serialization --parkings 10000 --output serialization.json
+"""
+import argparse
+import json
+
+from benchmarks.common import (
+    benchmark_database, print_table, setup_django, summarize, time_calls, write_results
+)
+from benchmarks.synthetic import search_trace, seed_parkings
+
+K = 10
+
+
+def model_payload(parking, distance, route):
+    """Resultado armado desde una instancia de Parking, como antes de los fragmentos"""
+    free_spaces = max(0, parking.capacity - parking.occupied_spaces)
+    return {
+        'id': parking.id,
+        'name': parking.name,
+        'latitude': parking.latitude,
+        'longitude': parking.longitude,
+        'location': {'lat': parking.latitude, 'lng': parking.longitude},
+        'distance_km': distance,
+        'price_per_hour': float(parking.price_per_hour),
+        'is_available': parking.is_available,
+        'features': parking.features,
+        'route': route,
+        'space': None,
+        'estimated_time_minutes': route['duration_minutes'] if route else None,
+        'estimated_cost': float(parking.price_per_hour) * 2,
+        'rating': round(4 + (hash(parking.name) % 10) / 10, 1),
+        'capacity': parking.capacity,
+        'occupied_spaces': parking.occupied_spaces,
+        'free_spaces': free_spaces,
+        'reviews_count': parking.reviews_count,
+    }
+
+
+def run(parkings, searches, seed):
+    from rest_framework.renderers import JSONRenderer
+    from api.patterns.facade import ParkingSearchFacade
+    from api.renderers import FastJSONRenderer
+
+    seed_parkings(parkings, seed)
+    facade = ParkingSearchFacade()
+    snapshot = facade.data_manager.get_snapshot()
+    route = facade.gps_adapter.calculate_route(
+        {'lat': 3.45, 'lng': -76.53}, {'lat': 3.46, 'lng': -76.52}
+    )
+    # Filas de los k más cercanos de cada búsqueda: solo se mide la serialización
+    pages = []
+    for search in search_trace(searches, seed):
+        nearest = facade._k_nearest(search['location'], K)
+        pages.append([(distance, snapshot.row_of(parking_id)) for distance, parking_id, _ in nearest])
+
+    drf, fast = JSONRenderer(), FastJSONRenderer()
+
+    # NearbyParkingsView: página de K resultados sin ruta
+    def model_page(page):
+        return drf.render({'results': [
+            model_payload(snapshot.get_parking(row), distance, None) for distance, row in page
+        ], 'next_cursor': None})
+
+    def fragment_page(page):
+        return fast.render({'results': [
+            facade._enrich_parking_data(snapshot.payload(row), distance, None) for distance, row in page
+        ], 'next_cursor': None})
+
+    # FindNearestParkingView: un resultado con su ruta
+    def model_nearest(page):
+        distance, row = page[0]
+        return drf.render(model_payload(snapshot.get_parking(row), distance, route))
+
+    def fragment_nearest(page):
+        distance, row = page[0]
+        return fast.render(facade._enrich_parking_data(snapshot.payload(row), distance, route))
+
+    # Mismo contenido con ambos caminos
+    for page in pages[:50]:
+        assert json.loads(model_page(page)) == json.loads(fragment_page(page))
+        assert json.loads(model_nearest(page)) == json.loads(fragment_nearest(page))
+    snapshot._payloads.clear()
+
+    return {
+        'model.nearby_page': summarize(time_calls(model_page, pages)),
+        'fragment.nearby_page_cold': summarize(time_calls(fragment_page, pages)),
+        'fragment.nearby_page': summarize(time_calls(fragment_page, pages)),
+        'model.nearest': summarize(time_calls(model_nearest, pages)),
+        'fragment.nearest': summarize(time_calls(fragment_nearest, pages)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--parkings', type=int, default=10_000)
+    parser.add_argument('--searches', type=int, default=2_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='archivo JSON de resultados')
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        results = run(args.parkings, args.searches, args.seed)
+    print_table(results)
+    if args.output:
+        write_results(args.output, 'serialization', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark: memoria del snapshot de parqueaderos con N workers (procesos hijos, como gunicorn)
+- local: cada worker carga su propio snapshot desde la BD (sin SHARED_SNAPSHOT_PATH)
+- shared: el primer worker publica el snapshot en SharedSnapshotStore y los demás lo abren con mmap
+Cada worker calienta el snapshot, hace --searches búsquedas y reporta su memoria propia
+(USS) y proporcional (PSS) de /proc/self/smaps_rollup; warmup es la primera búsqueda.
+Requiere Linux (fork y /proc).
+Ejecutar desde backend/ con: python -m benchmarks.bench_shared_snapshot --parkings 100000 --workers 1,2,4,8
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.common import benchmark_database, print_table, setup_django, summarize, write_results
+from benchmarks.synthetic import search_trace, seed_parkings
+
+SMAPS_ROLLUP = '/proc/self/smaps_rollup'
+
+
+def _memory_kb():
+    """(USS, PSS) del proceso en kB"""
+    values = {}
+    with open(SMAPS_ROLLUP) as smaps:
+        for line in smaps:
+            key, _, rest = line.partition(':')
+            if key in ('Pss', 'Private_Clean', 'Private_Dirty'):
+                values[key] = int(rest.split()[0])
+    return values['Private_Clean'] + values['Private_Dirty'], values['Pss']
+
+
+def _worker(shared_path, searches, seed, start, output):
+    from django.db import connection
+    from api.patterns.facade import ParkingSearchFacade
+    from api.services.shared_snapshot import SharedSnapshotStore
+
+    facade = ParkingSearchFacade()
+    if shared_path:
+        facade.data_manager.set_shared_store(SharedSnapshotStore(shared_path))
+    trace = search_trace(searches, seed)
+    # Todos los workers arrancan a la vez, como tras un reinicio de gunicorn
+    start.wait()
+    began = time.perf_counter()
+    facade.find_k_nearest(trace[0]['location'], 10, trace[0]['filters'])
+    warmup = time.perf_counter() - began
+    for search in trace[1:]:
+        facade.find_k_nearest(search['location'], 10, search['filters'])
+    connection.close()
+    output.put((warmup,) + _memory_kb())
+
+
+def run_workers(workers, shared_path, searches, seed):
+    context = multiprocessing.get_context('fork')
+    start = context.Barrier(workers)
+    output = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(shared_path, searches, seed + index, start, output))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [output.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    summary = summarize([warmup for warmup, _, _ in reports])
+    summary['workers'] = workers
+    summary['uss_mb_total'] = round(sum(uss for _, uss, _ in reports) / 1024, 1)
+    summary['pss_mb_total'] = round(sum(pss for _, _, pss in reports) / 1024, 1)
+    return summary
+
+
+def run(parkings, worker_counts, searches, seed):
+    from django.db import connection
+
+    seed_parkings(parkings, seed)
+    # Los hijos abren su propia conexión a la BD
+    connection.close()
+    results = {}
+    for workers in worker_counts:
+        results[f'local.workers_{workers}'] = run_workers(workers, None, searches, seed)
+        results[f'shared.workers_{workers}'] = run_workers(workers, tempfile.mkdtemp(prefix='smartpark-shared-'),
+                                                           searches, seed)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--parkings', type=int, default=100_000)
+    parser.add_argument('--workers', default='1,2,4,8', help='cantidades de workers separadas por coma')
+    parser.add_argument('--searches', type=int, default=200, help='búsquedas por worker')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='archivo JSON de resultados')
+    args = parser.parse_args()
+    if not os.path.exists(SMAPS_ROLLUP):
+        parser.error('se requiere Linux (/proc/self/smaps_rollup)')
+
+    setup_django()
+    with benchmark_database():
+        results = run(args.parkings, [int(value) for value in args.workers.split(',')], args.searches, args.seed)
+    print_table(results)
+    print(f"\n{'workers':<28} {'USS total (MB)':>15} {'PSS total (MB)':>15}")
+    for name, summary in results.items():
+        print(f"{name:<28} {summary['uss_mb_total']:>15.1f} {summary['pss_mb_total']:>15.1f}")
+    if args.output:
+        write_results(args.output, 'shared_snapshot', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
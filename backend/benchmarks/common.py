@@ -0,0 +1,118 @@
+"""
+Utilidades comunes de los benchmarks: arranque de Django, BD aislada,
+percentiles de latencia y resultados en JSON para comparar entre versiones
+"""
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+REPEAT = 3
+
+
+def setup_django():
+    """Configura Django para ejecutar los benchmarks como scripts (python -m benchmarks.x)"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'smartpark.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    """
+    BD SQLite temporal con las migraciones aplicadas (igual que la de los tests);
+    db.sqlite3 no se toca. Es un archivo y no :memory: para que los hilos del
+    generador de carga tengan cada uno su propia conexión
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    directory = tempfile.mkdtemp(prefix='smartpark-bench-')
+    old_name = connection.settings_dict['NAME']
+    connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        os.rmdir(directory)
+
+
+def best_of(func, repeat=REPEAT):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def time_calls(func, inputs):
+    """Latencia (s) de func(x) para cada x de inputs"""
+    samples = []
+    for value in inputs:
+        start = time.perf_counter()
+        func(value)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples, elapsed=None):
+    """Resumen de latencias en ms (media, p50, p95, p99, máx) y rendimiento por segundo"""
+    latencies = np.asarray(samples) * 1000
+    if elapsed is None:
+        elapsed = float(latencies.sum()) / 1000
+    p50, p95, p99 = np.percentile(latencies, (50, 95, 99)) if len(latencies) else (0.0, 0.0, 0.0)
+    return {
+        'count': len(latencies),
+        'throughput_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(float(latencies.mean()), 4) if len(latencies) else 0.0,
+            'p50': round(float(p50), 4),
+            'p95': round(float(p95), 4),
+            'p99': round(float(p99), 4),
+            'max': round(float(latencies.max()), 4) if len(latencies) else 0.0,
+        },
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path, suite, params, results):
+    """Guarda los resultados con el contexto necesario para compararlos (benchmarks.compare)"""
+    document = {
+        'suite': suite,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'params': params,
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as output:
+        json.dump(document, output, indent=2)
+    return document
+
+
+def print_table(results):
+    print(f"{'benchmark':<28} {'n':>7} {'media (ms)':>11} {'p50':>9} {'p95':>9} {'p99':>9} {'por seg':>10}")
+    for name, summary in results.items():
+        latency = summary['latency_ms']
+        print(f"{name:<28} {summary['count']:>7} {latency['mean']:>11.3f} {latency['p50']:>9.3f} "
+              f"{latency['p95']:>9.3f} {latency['p99']:>9.3f} {summary['throughput_per_second']:>10.1f}")
@@ -0,0 +1,52 @@
+"""
+Compara dos resultados JSON de benchmarks (misma suite) y marca las regresiones
+Ejecutar desde backend/ con: python -m benchmarks.compare base.json nuevo.json --metric p95 --threshold 0.10
+Retorna código de salida 1 si algún benchmark empeoró más que el umbral
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding='utf-8') as source:
+        return json.load(source)
+
+
+def compare(baseline, current, metric='p95', threshold=0.10):
+    """[(nombre, base_ms, actual_ms, cambio relativo, regresión)] de los benchmarks comunes"""
+    rows = []
+    for name, summary in current['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        before = previous['latency_ms'][metric]
+        after = summary['latency_ms'][metric]
+        change = (after - before) / before if before else 0.0
+        rows.append((name, before, after, change, change > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--metric', default='p95', choices=['mean', 'p50', 'p95', 'p99', 'max'])
+    parser.add_argument('--threshold', type=float, default=0.10, help='empeoramiento relativo tolerado')
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    if baseline['suite'] != current['suite']:
+        sys.exit(f"Suites distintas: {baseline['suite']} vs {current['suite']}")
+
+    rows = compare(baseline, current, args.metric, args.threshold)
+    print(f"{baseline['git_commit']} -> {current['git_commit']} ({args.metric}, umbral {args.threshold:.0%})")
+    print(f"{'benchmark':<28} {'base (ms)':>11} {'actual (ms)':>12} {'cambio':>9}")
+    for name, before, after, change, regressed in rows:
+        flag = '  REGRESIÓN' if regressed else ''
+        print(f"{name:<28} {before:>11.3f} {after:>12.3f} {change:>+9.1%}{flag}")
+    sys.exit(1 if any(row[4] for row in rows) else 0)
+
+
+if __name__ == '__main__':
+    main()
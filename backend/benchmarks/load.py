@@ -0,0 +1,140 @@
+"""
+Generador de carga en proceso: hilos que llaman a la API (APIClient, pila completa
+de Django/DRF sin red) y reportan latencia p50/p95/p99 y peticiones por segundo
+para búsqueda, actualización de disponibilidad e historial
+Ejecutar desde backend/ con: python -m benchmarks.load --parkings 10000 --requests 2000 --threads 8 --output load.json
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.common import benchmark_database, print_table, setup_django, summarize, write_results
+from benchmarks.synthetic import availability_trace, search_trace, seed_parkings
+
+HISTORY_USERS = 50
+HISTORY_ROWS_PER_USER = 200
+
+
+def _drive(requests, threads, send):
+    """Reparte requests entre threads hilos; retorna (latencias, códigos de estado, segundos)"""
+    from django.db import connection
+    from rest_framework.test import APIClient
+
+    latencies = [[] for _ in range(threads)]
+    statuses = [{} for _ in range(threads)]
+
+    def worker(index):
+        client = APIClient()
+        try:
+            for request in requests[index::threads]:
+                start = time.perf_counter()
+                response = send(client, request)
+                latencies[index].append(time.perf_counter() - start)
+                statuses[index][response.status_code] = statuses[index].get(response.status_code, 0) + 1
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    merged = {}
+    for counts in statuses:
+        for code, count in counts.items():
+            merged[code] = merged.get(code, 0) + count
+    return [sample for samples in latencies for sample in samples], merged, elapsed
+
+
+def _scenario(requests, threads, send):
+    samples, statuses, elapsed = _drive(requests, threads, send)
+    summary = summarize(samples, elapsed)
+    summary['status_codes'] = {str(code): count for code, count in sorted(statuses.items())}
+    summary['errors'] = sum(count for code, count in statuses.items() if code >= 500)
+    summary['throttled'] = statuses.get(429, 0)
+    return summary
+
+
+def _seed_history(parking_ids):
+    from django.contrib.auth.models import User
+    from api.models import SearchHistory
+
+    User.objects.bulk_create([User(username=f'bench{i}') for i in range(HISTORY_USERS)])
+    users = list(User.objects.filter(username__startswith='bench'))
+    SearchHistory.objects.bulk_create([
+        SearchHistory(
+            user=user, search_latitude=3.45, search_longitude=-76.53,
+            result_parking_id=parking_ids[(i * HISTORY_USERS + j) % len(parking_ids)]
+        )
+        for j, user in enumerate(users) for i in range(HISTORY_ROWS_PER_USER)
+    ], batch_size=5_000)
+    return users
+
+
+def run(parkings, requests, threads, seed, rate_limit):
+    from api import views
+    from api.services.rate_limit import TokenBucketRateLimiter
+
+    parking_ids = seed_parkings(parkings, seed)
+    if not rate_limit:
+        # Sin rate limit se mide la capacidad del servidor y no la política por usuario
+        views.proxy.rate_limiter = TokenBucketRateLimiter(capacity=10 ** 9, refill_per_second=10 ** 9)
+    views.proxy.cache.clear()
+    results = {}
+
+    # Búsqueda: cada usuario de la traza llega con su propia IP (rate limit por IP)
+    def search(client, request):
+        return client.post('/api/search/nearest/', {
+            'latitude': request['location']['lat'],
+            'longitude': request['location']['lng'],
+            'filters': request['filters'],
+        }, format='json', REMOTE_ADDR=f"10.0.{request['user'] // 256 % 256}.{request['user'] % 256}")
+
+    results['search'] = _scenario(search_trace(requests, seed), threads, search)
+
+    def update_availability(client, change):
+        parking_id, is_available = change
+        return client.patch(
+            f'/api/parking/{parking_id}/availability/', {'is_available': is_available}, format='json'
+        )
+
+    results['availability_update'] = _scenario(
+        availability_trace(parking_ids, requests, seed), threads, update_availability
+    )
+
+    users = _seed_history(parking_ids)
+
+    def history(client, user):
+        client.force_authenticate(user)
+        return client.get('/api/search/history/')
+
+    results['history'] = _scenario([users[i % len(users)] for i in range(requests)], threads, history)
+
+    views.history_writer.flush()
+    views.mediator.event_bus.flush()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--parkings', type=int, default=10_000)
+    parser.add_argument('--requests', type=int, default=2_000, help='peticiones por escenario')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--rate-limit', action='store_true', help='mantener el rate limit por IP del proxy')
+    parser.add_argument('--output', help='archivo JSON de resultados')
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        results = run(args.parkings, args.requests, args.threads, args.seed, args.rate_limit)
+    print_table(results)
+    if args.output:
+        write_results(args.output, 'load', vars(args), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+Datos sintéticos reproducibles (semilla fija) para los benchmarks
+- Parqueaderos: 10k a 1M alrededor de Cali, concentrados en zonas de alta demanda
+- Trazas de búsqueda: orígenes cerca de esas zonas, ubicaciones repetidas (para
+  medir el caché del proxy), mezcla de filtros y usuarios
+- Trazas de disponibilidad: cambios sobre parqueaderos existentes
+"""
+import numpy as np
+
+# Centro de Cali y radio aproximado de 15 km
+CENTER = (3.4516, -76.5320)
+SPREAD_DEG = 0.15
+
+# Zonas de alta demanda (centro, norte, sur, unicentro, chipichape)
+HOTSPOTS = np.array([
+    (3.4516, -76.5320),
+    (3.4680, -76.5150),
+    (3.3720, -76.5400),
+    (3.3740, -76.5390),
+    (3.4760, -76.5270),
+])
+HOTSPOT_SPREAD_DEG = 0.02
+# Fracción de parqueaderos y búsquedas en las zonas de alta demanda
+HOTSPOT_SHARE = 0.6
+
+FEATURES = ['Techado', 'Vigilancia 24/7', 'Cámaras', 'Iluminación LED', 'Carga eléctrica', 'Lavado']
+
+
+def _points(rng, count):
+    """count coordenadas: HOTSPOT_SHARE en las zonas calientes y el resto uniforme en la ciudad"""
+    in_hotspot = rng.random(count) < HOTSPOT_SHARE
+    hotspot = HOTSPOTS[rng.integers(0, len(HOTSPOTS), count)]
+    lats = np.where(
+        in_hotspot,
+        hotspot[:, 0] + rng.normal(0, HOTSPOT_SPREAD_DEG, count),
+        CENTER[0] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, count)
+    )
+    lngs = np.where(
+        in_hotspot,
+        hotspot[:, 1] + rng.normal(0, HOTSPOT_SPREAD_DEG, count),
+        CENTER[1] + rng.uniform(-SPREAD_DEG, SPREAD_DEG, count)
+    )
+    return lats, lngs
+
+
+def generate_parkings(count, seed=42, chunk_size=10_000):
+    """Genera por bloques dicts con los campos de Parking (memoria constante)"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, count, chunk_size):
+        size = min(chunk_size, count - start)
+        lats, lngs = _points(rng, size)
+        prices = rng.integers(4, 20, size) * 500
+        capacities = rng.integers(10, 300, size)
+        occupied = (capacities * rng.beta(5, 2, size)).astype(int)
+        feature_masks = rng.integers(0, 2 ** len(FEATURES), size)
+        for i in range(size):
+            yield {
+                'name': f'Parqueadero sintético {start + i + 1}',
+                'latitude': round(float(lats[i]), 6),
+                'longitude': round(float(lngs[i]), 6),
+                'price_per_hour': int(prices[i]),
+                'is_available': bool(occupied[i] < capacities[i]),
+                'capacity': int(capacities[i]),
+                'occupied_spaces': int(occupied[i]),
+                'features': [feature for bit, feature in enumerate(FEATURES) if feature_masks[i] >> bit & 1],
+            }
+
+
+def seed_parkings(count, seed=42, batch_size=5_000):
+    """Inserta count parqueaderos sintéticos con bulk_create por lotes; retorna sus ids"""
+    from api.models import Parking
+    from api.patterns.singleton import ParkingDataManager
+
+    batch = []
+    for data in generate_parkings(count, seed):
+        batch.append(Parking(**data))
+        if len(batch) == batch_size:
+            Parking.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Parking.objects.bulk_create(batch)
+    ParkingDataManager().invalidate()
+    return list(Parking.objects.order_by('id').values_list('id', flat=True))
+
+
+def search_trace(count, seed=7, users=2_000, repeat_share=0.3):
+    """
+    Trazas de búsqueda [{'location', 'filters', 'user'}]
+    repeat_share de las búsquedas repite una ubicación popular (aciertos de caché);
+    los usuarios siguen una distribución de Zipf (pocos usuarios muy activos)
+    """
+    rng = np.random.default_rng(seed)
+    lats, lngs = _points(rng, count)
+    # Ubicaciones populares: se redondean a 4 decimales como la clave del proxy
+    popular = rng.integers(0, max(1, count // 50), count)
+    repeat = rng.random(count) < repeat_share
+    user_ids = np.minimum(rng.zipf(1.3, count), users)
+    searches = []
+    for i in range(count):
+        source = popular[i] if repeat[i] else i
+        filters = {}
+        draw = rng.random()
+        if draw < 0.35:
+            filters['max_distance'] = float(rng.choice([1, 2, 3, 5]))
+        if 0.25 < draw < 0.55:
+            filters['max_price'] = int(rng.choice([3000, 4000, 5000, 7000]))
+        if draw > 0.95:
+            filters['min_free_spaces'] = int(rng.choice([1, 2, 5]))
+        searches.append({
+            'location': {'lat': round(float(lats[source]), 4), 'lng': round(float(lngs[source]), 4)},
+            'filters': filters,
+            'user': int(user_ids[i]),
+        })
+    return searches
+
+
+def availability_trace(parking_ids, count, seed=11):
+    """Cambios de disponibilidad [(parking_id, is_available)] concentrados en pocos parqueaderos"""
+    rng = np.random.default_rng(seed)
+    ids = np.asarray(parking_ids)
+    # El 20% de los parqueaderos recibe el 80% de los cambios
+    hot = ids[:max(1, len(ids) // 5)]
+    chosen = np.where(rng.random(count) < 0.8, rng.choice(hot, count), rng.choice(ids, count))
+    states = rng.random(count) < 0.7
+    return [(int(parking_id), bool(state)) for parking_id, state in zip(chosen, states)]
@@ -80,6 +80,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Base de pruebas en archivo y no en memoria: los tests con hilos (reservas
+        # concurrentes) escriben en paralelo y SQLite en memoria bloquea la tabla
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -133,4 +138,90 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Para desarrollo
     ],
-}
\ No newline at end of file
+    # Los resultados de búsqueda se serializan con fragmentos JSON precompilados
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Archivo SQLite local para compartir el rate limiting entre workers de gunicorn
+# (None: cada proceso aplica su propio límite en memoria)
+RATE_LIMIT_SHARED_DB = None
+
+# Historial de búsquedas en segundo plano con bulk_create (False: escritura síncrona)
+SEARCH_HISTORY_WRITE_BEHIND = True
+
+# Grafo vial local (.npz generado con `manage.py build_road_graph extracto.osm salida.npz`)
+# para rutas reales; None usa la ruta simulada en línea recta
+ROAD_GRAPH_PATH = None
+# Candidatos más cercanos en línea recta que se reordenan por tiempo de viaje
+ROAD_GRAPH_TRAVEL_TIME_CANDIDATES = 5
+# Tabla de tiempos de viaje por celda (`manage.py build_travel_time_grid salida/`);
+# None calcula los tiempos en cada búsqueda
+TRAVEL_TIME_GRID_PATH = None
+
+# Directorio (idealmente en /dev/shm) donde un worker publica el snapshot de parqueaderos
+# y los demás lo abren con mmap sin copiarlo; None: cada proceso carga el suyo desde la BD
+SHARED_SNAPSHOT_PATH = None
+
+# Segundos entre escrituras a la BD de los contadores de cupos ocupados
+OCCUPANCY_FLUSH_SECONDS = 1.0
+
+# Segundos que un cupo queda retenido para el conductor que lo reservó
+RESERVATION_HOLD_SECONDS = 300
+# Reservas por usuario (o IP si es anónimo): ráfaga máxima y fichas recuperadas por segundo
+RESERVATION_RATE_LIMIT = {
+    'CAPACITY': 3,
+    'REFILL_PER_SECOND': 0.05,
+}
+
+# Bus de eventos del mediator: los suscriptores se ejecutan en segundo plano con
+# reintentos (SYNCHRONOUS=True los ejecuta dentro de la petición, útil en tests)
+MEDIATOR_EVENT_BUS = {
+    'SYNCHRONOUS': False,
+    'MAX_QUEUE': 10_000,
+    'MAX_RETRIES': 3,
+    'RETRY_BACKOFF_SECONDS': 0.1,
+}
+
+# Búsqueda e historial con vistas asíncronas (activar al servir con ASGI: uvicorn/daphne);
+# hilos para el cálculo de distancias y rutas fuera del event loop
+ASYNC_SEARCH_VIEWS = False
+ASYNC_SEARCH_THREADS = 16
+
+# Stream SSE de disponibilidad (/api/parking/availability/stream/, requiere servidor ASGI):
+# cambios sin leer por cliente antes de desconectarlo y segundos entre latidos
+AVAILABILITY_STREAM = {
+    'MAX_PENDING': 256,
+    'HEARTBEAT_SECONDS': 15,
+}
+
+# Trazas por etapa del camino de búsqueda (expuestas en /api/metrics/)
+SEARCH_TRACING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.01,
+}
+
+# Los mensajes de depuración de los patrones se emiten en nivel DEBUG;
+# cambiar el nivel de 'api' a DEBUG para ver el detalle de cada búsqueda
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+        'api.trace': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
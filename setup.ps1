@@ -16,7 +16,7 @@ Write-Host ""
 cd backend
 
 Write-Host "  📦 Verificando instalación de dependencias..." -ForegroundColor Yellow
-python -m pip install --quiet django djangorestframework django-cors-headers
+python -m pip install --quiet django djangorestframework django-cors-headers numpy
 
 Write-Host "  🗄️  Aplicando migraciones..." -ForegroundColor Yellow
 python manage.py migrate